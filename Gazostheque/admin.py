@@ -1,5 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.http import HttpResponse
 
 from .models.user_model import CustomUsers
 from .forms import CustomUserCreationForm, CustomUserChangeForm
@@ -7,6 +8,8 @@ from .forms import CustomUserCreationForm, CustomUserChangeForm
 from Gazostheque.models.owner_model import Owners
 from Gazostheque.models.material_model import Materials
 from Gazostheque.models.notification_model import Notifications
+from Gazostheque.models.outbound_email_model import OutboundEmail
+from Gazostheque.controllers.labels_controller import render_label_sheet
 
 
 # Override the default UserAdmin to customize the admin interface for user management
@@ -80,6 +83,17 @@ class MaterialsAdmin(admin.ModelAdmin):
         "tags",
     )
 
+    # Bulk action to print the qrcode labels of the selected materials
+    actions = ("print_labels",)
+
+    def print_labels(self, request, queryset):
+        sheet, page_count = render_label_sheet(list(queryset.values_list('material_id', flat=True)))
+        response = HttpResponse(sheet, content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename="labels.pdf"'
+        return response
+
+    print_labels.short_description = 'Print qrcode labels'
+
     def get_tags(self, obj):
         return ", ".join(o for o in obj.tags.names())
 
@@ -98,8 +112,15 @@ class NotificationsAdmin(admin.ModelAdmin):
     # Set a custom description for the owner field in the admin interface
     readonly_fields = ('created_at',)
 
+class OutboundEmailAdmin(admin.ModelAdmin):
+    # Lets the staff follow the outbox and spot the emails that could not be sent
+    list_display = ("subject", "to", "status", "attempts", "next_attempt_at", "sent_at",)
+    list_filter = ("status",)
+    readonly_fields = ('created_at', 'sent_at', 'last_error',)
+
 # Register your models here.
 admin.site.register(CustomUsers, CustomUserAdmin)
 admin.site.register(Owners, OwnersAdmin)
 admin.site.register(Materials, MaterialsAdmin)
-admin.site.register(Notifications, NotificationsAdmin)
\ No newline at end of file
+admin.site.register(Notifications, NotificationsAdmin)
+admin.site.register(OutboundEmail, OutboundEmailAdmin)
\ No newline at end of file
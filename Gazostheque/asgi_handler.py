@@ -0,0 +1,39 @@
+# File that defines the ASGI handler serving the notification streams
+# Django 4.2 does not watch for the client disconnecting while a response streams:
+# an endless event stream would then never end, nor release its broker queue.
+import asyncio
+
+from django.core.handlers.asgi import ASGIHandler
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGIHandler cancelling the response of a client once it disconnects.
+    The streamed generator is closed, so its cleanup (e.g. broker.unsubscribe) runs.
+    """
+
+    async def handle(self, scope, receive, send):
+        # Django reads the request body from this queue, while the real channel is watched here
+        messages = asyncio.Queue()
+        response = asyncio.ensure_future(super().handle(scope, messages.get, send))
+        disconnected = False
+
+        async def watch_disconnect():
+            nonlocal disconnected
+            while True:
+                message = await receive()
+                await messages.put(message)
+                if message['type'] == 'http.disconnect':
+                    disconnected = True
+                    response.cancel()
+                    return
+
+        watcher = asyncio.ensure_future(watch_disconnect())
+        try:
+            await response
+        except asyncio.CancelledError:
+            # Re-raised when the server itself cancels the request
+            if not disconnected:
+                raise
+        finally:
+            watcher.cancel()
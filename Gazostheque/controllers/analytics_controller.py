@@ -0,0 +1,146 @@
+# This file is for managing the grouped material analytics
+from datetime import datetime, time, timedelta
+
+from django.db.models import BooleanField, Case, Count, Value, When
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from Gazostheque.models.material_model import Materials
+
+# Dimensions the materials can be grouped by: the columns selected for each one
+GROUP_BY_FIELDS = {
+    'lab_destination': ['lab_destination'],
+    'team': ['team'],
+    'origin': ['origin'],
+    'levRisk': ['levRisk'],
+    'owner': ['owner_id', 'owner__user__first_name', 'owner__user__last_name'],
+}
+
+# Time buckets the creation dates can be truncated to
+BUCKET_FUNCTIONS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+# Period covered when no start date is given
+DEFAULT_PERIOD = timedelta(days=365)
+
+
+def parse_period(start, end):
+    """
+    Function to turn the `start` / `end` query parameters into an aware datetime range.
+
+    Args:
+        start (str): (optional) first day of the period, 'YYYY-MM-DD'
+        end (str): (optional) last day of the period (included), 'YYYY-MM-DD'
+
+    Returns:
+        (datetime, datetime): the start (included) and end (excluded) of the period.
+
+    Raises:
+        ValueError: If a date is malformed or the period is empty.
+    """
+    def to_datetime(value):
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"Invalid date '{value}', expected YYYY-MM-DD")
+        return timezone.make_aware(datetime.combine(day, time.min))
+
+    today = timezone.localtime().date()
+    period_end = to_datetime(end) + timedelta(days=1) if end else timezone.make_aware(datetime.combine(today + timedelta(days=1), time.min))
+    period_start = to_datetime(start) if start else period_end - DEFAULT_PERIOD
+    if period_start >= period_end:
+        raise ValueError("The start date must be before the end date")
+    return period_start, period_end
+
+
+def get_group_label(row, group_by):
+    """
+    Function to return the display name of the group of a result row.
+    """
+    if group_by == 'owner':
+        if row['owner_id'] is None:
+            return None
+        return f"{row['owner__user__first_name']} {row['owner__user__last_name']}".strip()
+    return row[group_by]
+
+
+def get_grouped_analytics(group_by, bucket, period_start, period_end, compare=False):
+    """
+    Function to count materials per group and per time bucket over a period.
+
+    Everything comes from a single GROUP BY query filtered on a created_at range
+    (so the created_at index is usable), which is then pivoted in one pass.
+
+    Args:
+        group_by (str): a key of GROUP_BY_FIELDS
+        bucket (str): a key of BUCKET_FUNCTIONS
+        period_start (datetime): the start of the period (included)
+        period_end (datetime): the end of the period (excluded)
+        compare (bool): also count the previous period of the same length
+
+    Returns:
+        dict: the buckets, one series per group and the totals (plus the previous period if compare).
+    """
+    group_fields = GROUP_BY_FIELDS[group_by]
+    previous_start = period_start - (period_end - period_start)
+    query_start = previous_start if compare else period_start
+
+    rows = Materials.objects.filter(
+        created_at__gte=query_start,
+        created_at__lt=period_end,
+    ).annotate(
+        bucket=BUCKET_FUNCTIONS[bucket]('created_at', tzinfo=timezone.get_current_timezone()),
+        # A bucket can straddle the start of the period, so the period is part of the grouping
+        is_previous=Case(
+            When(created_at__lt=period_start, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    ).values('bucket', 'is_previous', *group_fields).annotate(
+        count=Count('material_id')
+    ).order_by()
+
+    counts = {}
+    group_totals = {}
+    previous_totals = {}
+    buckets = set()
+    for row in rows:
+        group = get_group_label(row, group_by)
+        if row['is_previous']:
+            previous_totals[group] = previous_totals.get(group, 0) + row['count']
+            continue
+        buckets.add(row['bucket'])
+        counts[(row['bucket'], group)] = counts.get((row['bucket'], group), 0) + row['count']
+        group_totals[group] = group_totals.get(group, 0) + row['count']
+
+    buckets = sorted(buckets)
+    groups = sorted(group_totals, key=lambda group: (group is None, group or ''))
+    total = sum(group_totals.values())
+
+    result = {
+        'group_by': group_by,
+        'bucket': bucket,
+        'start': period_start.date().isoformat(),
+        'end': (period_end - timedelta(days=1)).date().isoformat(),
+        'buckets': [value.date().isoformat() for value in buckets],
+        'series': [
+            {'name': group, 'data': [counts.get((value, group), 0) for value in buckets], 'total': group_totals[group]}
+            for group in groups
+        ],
+        'total': total,
+    }
+
+    if compare:
+        previous_total = sum(previous_totals.values())
+        result['previous'] = {
+            'start': previous_start.date().isoformat(),
+            'end': (period_start - timedelta(days=1)).date().isoformat(),
+            'total': previous_total,
+            'totals': [{'name': group, 'total': count} for group, count in previous_totals.items()],
+        }
+        result['percentage_diff'] = round((total - previous_total) / previous_total * 100, 1) if previous_total else 0
+    return result
@@ -0,0 +1,94 @@
+# This file is for managing the content-addressed blob store
+# Files are named after the sha256 of their content, so a stored file never changes
+# and identical content is only written once.
+import hashlib, os, shutil, tempfile
+
+from django.conf import settings
+
+# Folder of MEDIA_ROOT holding the blob store
+BLOB_FOLDER = 'blobs'
+
+
+def get_blob_path(namespace, digest, extension):
+    """
+    Function to return the location on disk of a blob.
+
+    Args:
+        namespace (str): the kind of blob (e.g. 'qrcodes'), used as top-level folder
+        digest (str): the sha256 hex digest of the content
+        extension (str): the file extension without the dot
+
+    Returns:
+        str: the absolute path of the blob, fanned out on the first two hex digits.
+    """
+    return os.path.join(settings.MEDIA_ROOT, BLOB_FOLDER, namespace, digest[:2], f'{digest}.{extension}')
+
+
+def blob_exists(namespace, digest, extension):
+    """
+    Function to check whether a blob has already been stored.
+    """
+    return os.path.exists(get_blob_path(namespace, digest, extension))
+
+
+def store_blob(namespace, data, extension):
+    """
+    Function to store some bytes in the blob store.
+
+    Args:
+        namespace (str): the kind of blob (e.g. 'qrcodes')
+        data (bytes): the content to store
+        extension (str): the file extension without the dot
+
+    Returns:
+        str: the sha256 hex digest identifying the blob.
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    write_blob(namespace, digest, data, extension)
+    return digest
+
+
+def get_uploaded_digest(uploaded_file):
+    """
+    Function to return the sha256 hex digest of an uploaded file.
+    The digest computed by HashingFileUploadHandler while receiving the file is used when present.
+    """
+    digest = getattr(uploaded_file, 'sha256', None)
+    if digest is None:
+        hasher = hashlib.sha256()
+        for chunk in uploaded_file.chunks():
+            hasher.update(chunk)
+        digest = hasher.hexdigest()
+        uploaded_file.seek(0)
+    return digest
+
+
+def write_blob(namespace, digest, data, extension):
+    """
+    Function to write some bytes (or the content of a file object) under a given digest, unless already stored.
+
+    Besides the content hash used by store_blob, the digest can be the hash of
+    everything the content is derived from (e.g. rendered labels), which is
+    just as immutable.
+    The file is written to a temporary file first and renamed into place, so
+    concurrent writers of the same content never expose a partial file.
+    """
+    path = get_blob_path(namespace, digest, extension)
+    if os.path.exists(path):
+        return path
+
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as destination:
+            if hasattr(data, 'read'):
+                shutil.copyfileobj(data, destination)
+            else:
+                destination.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return path
@@ -0,0 +1,119 @@
+# This file is for managing the cache of the hot read endpoints
+# Entries are deleted by signals (see signals.py) whenever the underlying rows change.
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from Gazostheque.controllers.invalidation_controller import register_handler, publish
+
+# Entries are also expired after this delay, as a safety net
+CACHE_TIMEOUT = 60 * 60
+
+MATERIAL_LIST = 'material_list'
+MATERIAL_DETAIL = 'material_detail'
+OWNER_LITE_LIST = 'owner_lite_list'
+TAG_LIST = 'tag_list'
+DASHBOARD = 'dashboard'
+USER = 'user'
+
+# Topic of the invalidation bus carrying the deleted keys
+CACHE_TOPIC = 'cache'
+# A local-memory cache lives in each worker, so the other workers must be told about deletions
+IS_LOCAL_CACHE = settings.CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache'
+
+# The cached entry families, for which hits and misses are counted
+CACHE_FAMILIES = (MATERIAL_LIST, MATERIAL_DETAIL, OWNER_LITE_LIST, TAG_LIST, DASHBOARD, USER)
+
+
+def material_detail_key(pk):
+    """
+    Function to return the cache key of the detailed payload of a material.
+    """
+    return f'{MATERIAL_DETAIL}:{pk}'
+
+
+def user_key(pk):
+    """
+    Function to return the cache key of a user instance, as resolved from the session on each request.
+    """
+    return f'{USER}:{pk}'
+
+
+def _count(family, outcome):
+    counter = f'cache-stats:{family}:{outcome}'
+    # add() is a no-op when the counter exists; incr() is atomic on Redis
+    cache.add(counter, 0, timeout=None)
+    try:
+        cache.incr(counter)
+    except ValueError:
+        # The counter was evicted in between, losing one count is fine
+        pass
+
+
+def get_or_build(key, builder, family=None):
+    """
+    Function to return a cached value, building and caching it on a miss.
+
+    Args:
+        key (str): the cache key
+        builder (callable): computes the value (never None) when it is not cached
+        family (str): (optional) the family the hit / miss is counted for, the key by default
+
+    Returns:
+        the cached or freshly built value.
+    """
+    value = cache.get(key)
+    if value is not None:
+        _count(family or key, 'hits')
+        return value
+
+    _count(family or key, 'misses')
+    value = builder()
+    cache.set(key, value, CACHE_TIMEOUT)
+    return value
+
+
+def invalidate(*keys):
+    """
+    Function to delete some cache entries, now and once the current transaction commits.
+
+    Deleting again after the commit prevents a concurrent request from caching
+    rows read before the commit.
+    """
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+    if IS_LOCAL_CACHE:
+        publish(CACHE_TOPIC, keys)
+
+
+def evict_local_keys(keys):
+    """
+    Function to delete the cache entries deleted by another worker (all of them if keys is None).
+    """
+    if keys is None:
+        cache.clear()
+    else:
+        cache.delete_many(keys)
+
+
+register_handler(CACHE_TOPIC, evict_local_keys)
+
+
+def get_cache_stats():
+    """
+    Function to return the hits, misses and hit ratio of each cached entry family.
+    """
+    counters = cache.get_many([f'cache-stats:{family}:{outcome}' for family in CACHE_FAMILIES for outcome in ('hits', 'misses')])
+    stats = {}
+    for family in CACHE_FAMILIES:
+        hits = counters.get(f'cache-stats:{family}:hits', 0)
+        misses = counters.get(f'cache-stats:{family}:misses', 0)
+        stats[family] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+        }
+    return stats
@@ -0,0 +1,119 @@
+# This file is for managing the validation of the CAS tickets and the provisioning of the CAS users
+import hashlib
+from xml.etree import ElementTree
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+CAS_NAMESPACES = {'cas': 'http://www.yale.edu/tp/cas'}
+CAS_ATTRIBUTES = ('sn', 'givenName', 'mail')
+# (connect, read) timeouts in seconds: a slow CAS server must not pin a worker thread
+CAS_TIMEOUT = (3.05, 5)
+# Seconds a presented ticket is remembered as consumed (longer than the CAS ticket lifetime)
+USED_TICKET_TIMEOUT = 5 * 60
+
+_cas_session = None
+
+
+def get_cas_session():
+    """
+    Function to return the HTTP session used to talk to the CAS server, created once per worker.
+    Connections are kept alive and pooled, and failed requests are retried with a short backoff.
+    """
+    global _cas_session
+    if _cas_session is None:
+        retries = Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+        session = requests.Session()
+        session.mount('https://', HTTPAdapter(pool_maxsize=10, max_retries=retries))
+        session.mount('http://', HTTPAdapter(pool_maxsize=10, max_retries=retries))
+        _cas_session = session
+    return _cas_session
+
+
+def parse_cas_response(content):
+    """
+    Function to read the attributes of the user from a serviceValidate response.
+
+    Returns:
+        dict: the CAS_ATTRIBUTES found, or None if the ticket was not validated.
+    """
+    try:
+        tree = ElementTree.fromstring(content)
+    except ElementTree.ParseError:
+        return None
+    if tree.find('.//cas:authenticationSuccess', namespaces=CAS_NAMESPACES) is None:
+        return None
+
+    attributes = {}
+    for attribute in tree.findall('.//cas:attributes/*', namespaces=CAS_NAMESPACES):
+        local_tag = attribute.tag.split('}')[-1]
+        if local_tag in CAS_ATTRIBUTES:
+            attributes[local_tag] = attribute.text
+    return attributes if attributes.get('mail') else None
+
+
+def validate_ticket(ticket, service_url):
+    """
+    Function to validate a CAS ticket against the CAS server.
+    Service tickets are single-use: a ticket presented again (e.g. replayed from a log or a
+    Referer header) is rejected without being validated, the CAS server rejecting it anyway.
+
+    Args:
+        ticket (str): the ticket passed to the service url by the CAS server
+        service_url (str): the service url the ticket was issued for
+
+    Returns:
+        dict: the attributes of the user, or None if the ticket is invalid or the server unavailable.
+    """
+    if not ticket:
+        return None
+    # Marks the ticket as consumed; add() fails if it was already presented
+    cache_key = 'cas-ticket:' + hashlib.sha256(f'{service_url}|{ticket}'.encode('utf-8')).hexdigest()
+    if not cache.add(cache_key, True, USED_TICKET_TIMEOUT):
+        return None
+
+    try:
+        response = get_cas_session().get(
+            f'{settings.CAS_SERVER_URL}/p3/serviceValidate',
+            params={'ticket': ticket, 'service': service_url},
+            timeout=CAS_TIMEOUT,
+        )
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+
+    return parse_cas_response(response.content)
+
+
+def provision_user(attributes):
+    """
+    Function to get the user matching validated CAS attributes, creating it on first login.
+    The user is loaded together with its owner record, so a returning user costs a single query.
+
+    Returns:
+        (user, created): the user instance and whether it was just created.
+    """
+    users = get_user_model().objects.select_related('owner_profile')
+    email = attributes['mail'].lower()
+    try:
+        return users.get(email=email), False
+    except get_user_model().DoesNotExist:
+        pass
+    try:
+        with transaction.atomic():
+            user = get_user_model().objects.create(
+                email=email,
+                first_name=attributes.get('givenName') or '',
+                last_name=attributes.get('sn') or '',
+            )
+        return user, True
+    except IntegrityError:
+        # Created in between by a concurrent login
+        return users.get(email=email), False
@@ -1,17 +1,91 @@
 # This file is for managing email-related functionality 
+from itertools import groupby
 from django.core.mail import BadHeaderError, send_mail, EmailMessage
 from django.http import HttpResponse, HttpResponseRedirect
-from django.template.loader import render_to_string
+from django.template.loader import render_to_string, get_template
+from django.utils import timezone
 from django.utils.html import strip_tags
 from django.conf import settings
+from django.db import transaction
+from Gazostheque.controllers.outbox_controller import enqueue_email
+from Gazostheque.models.notification_model import Notifications
+from Gazostheque.models.outbound_email_model import OutboundEmail
+
+# Number of digests queued (and notifications marked as emailed) per transaction
+DIGEST_BATCH_SIZE = 100
 
 # Function to send a registration email to the user passed in argument
+# The email is queued in the outbox, so the login does not wait for the SMTP server
 def send_registration_email(user):
     context = {'user': user} # passing the argument used in the html file
     html_message = render_to_string('emails/signup_email.html', context)
     plain_message = strip_tags(html_message)
-    # Send the email
+    # Queue the email
     subject = 'Bienvenue à Gazostheque'
     from_email = settings.EMAIL_HOST_USER
     to_email = user['email']
-    send_mail(subject, plain_message, from_email, [to_email], html_message=html_message)
\ No newline at end of file
+    enqueue_email(subject, plain_message, [to_email], html_body=html_message, from_email=from_email)
+
+def get_pending_digest_rows():
+    """
+    Function to list the unread notifications not emailed yet, grouped by user (single query).
+    """
+    return (
+        Notifications.objects.filter(emailed_at__isnull=True, read_flag=False)
+        .order_by('user', 'created_at')
+        .values('notif_id', 'title', 'description', 'priority', 'created_at', 'user', 'user__email', 'user__first_name')
+    )
+
+
+def send_notification_digests(batch_size=DIGEST_BATCH_SIZE):
+    """
+    Function to queue for each user a digest of their pending notifications.
+    The template is compiled once, and the digests are sent by the outbox worker
+    (`send_outbound_emails`), over one SMTP connection and with its retries.
+    A batch of digests is queued in the same transaction that marks its notifications
+    as emailed, so no digest is queued twice nor lost.
+
+    Args:
+        batch_size (int): the number of digests queued together
+
+    Returns:
+        int: the number of digests queued.
+    """
+    template = get_template('emails/notification_digest.html')
+    subject = 'Gazostheque : vos nouvelles notifications'
+    from_email = settings.EMAIL_HOST_USER
+    queued = 0
+
+    emails, notification_ids = [], []
+    for user_id, rows in groupby(get_pending_digest_rows().iterator(), key=lambda row: row['user']):
+        rows = list(rows)
+        user = {'email': rows[0]['user__email'], 'first_name': rows[0]['user__first_name']}
+        html_message = template.render({'user': user, 'notifications': rows})
+        emails.append(OutboundEmail(subject=subject, body=strip_tags(html_message), html_body=html_message, from_email=from_email, to=[user['email']]))
+        notification_ids.extend(row['notif_id'] for row in rows)
+
+        if len(emails) == batch_size:
+            queued += _queue_digest_batch(emails, notification_ids)
+            emails, notification_ids = [], []
+    queued += _queue_digest_batch(emails, notification_ids)
+    return queued
+
+
+def start_notification_digests():
+    """
+    Function to start the digests from now on: the notifications already pending are marked as emailed,
+    so the first digest does not send each user their whole history of unread notifications.
+
+    Returns:
+        int: the number of notifications left out of the digests.
+    """
+    return Notifications.objects.filter(emailed_at__isnull=True).update(emailed_at=timezone.now())
+
+
+def _queue_digest_batch(emails, notification_ids):
+    if not emails:
+        return 0
+    with transaction.atomic():
+        OutboundEmail.objects.bulk_create(emails)
+        Notifications.objects.filter(notif_id__in=notification_ids).update(emailed_at=timezone.now())
+    return len(emails)
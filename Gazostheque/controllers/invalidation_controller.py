@@ -0,0 +1,142 @@
+# This file is for managing the invalidation bus between the server workers
+# Every worker keeps some caches in its own memory (tag index, local-memory cache).
+# Change events are published over PostgreSQL NOTIFY, and a LISTEN thread in each
+# worker applies the events published by the other workers.
+import json, logging, os, select, socket, threading, time
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, connections
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'gazostheque_invalidate'
+# NOTIFY payloads are limited to 8000 bytes; bigger events are sent as a reset
+MAX_PAYLOAD_SIZE = 7900
+# Seconds between two checks of the listening connection
+LISTEN_TIMEOUT = 60
+
+# topic -> functions called with the payload of each event (None meaning "drop everything")
+_handlers = {}
+_listener = None
+
+
+def register_handler(topic, handler):
+    """
+    Function to subscribe a local cache to the events of a topic.
+
+    Args:
+        topic (str): the name of the topic
+        handler (callable): called with the payload of each event, or with None
+            when events may have been lost and the cache must be dropped entirely
+    """
+    _handlers.setdefault(topic, []).append(handler)
+
+
+def get_origin():
+    """
+    Function to identify the current worker process (computed on each call to stay correct after a fork).
+    """
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def publish(topic, payload=None):
+    """
+    Function to send an event to the other workers.
+
+    Inside a transaction, PostgreSQL only delivers the notification on commit
+    (and drops it on rollback). Other databases have no bus, so nothing is sent.
+
+    Args:
+        topic (str): the name of the topic
+        payload: any value serializable by DjangoJSONEncoder (dates become ISO strings)
+    """
+    if connection.vendor != 'postgresql':
+        return
+
+    message = json.dumps({'origin': get_origin(), 'topic': topic, 'payload': payload}, cls=DjangoJSONEncoder)
+    if len(message.encode('utf-8')) > MAX_PAYLOAD_SIZE:
+        message = json.dumps({'origin': get_origin(), 'topic': topic, 'payload': None})
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, message])
+
+
+def broadcast(topic, payload=None):
+    """
+    Function to apply an event to the caches of this worker and send it to the other workers.
+    """
+    _dispatch(topic, payload)
+    publish(topic, payload)
+
+
+def _dispatch(topic, payload):
+    for handler in _handlers.get(topic, []):
+        try:
+            handler(payload)
+        except Exception:
+            logger.exception("Invalidation handler failed for topic %s", topic)
+
+
+def _dispatch_reset():
+    for topic in _handlers:
+        _dispatch(topic, None)
+
+
+def dispatch_notification(message):
+    """
+    Function to apply an event received from the bus, unless it was sent by this worker.
+    """
+    try:
+        event = json.loads(message)
+    except ValueError:
+        logger.warning("Ignoring malformed invalidation event: %r", message)
+        return
+    if event.get('origin') != get_origin():
+        _dispatch(event.get('topic'), event.get('payload'))
+
+
+def _listen():
+    import psycopg2
+    from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+    backoff = 1
+    reconnecting = False
+    while True:
+        listen_connection = None
+        try:
+            # A dedicated connection: the ones of Django belong to the request threads
+            listen_connection = psycopg2.connect(**connections['default'].get_connection_params())
+            listen_connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with listen_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN {CHANNEL}')
+            if reconnecting:
+                # Events sent while disconnected are lost: drop the caches
+                _dispatch_reset()
+            backoff = 1
+
+            while True:
+                if select.select([listen_connection], [], [], LISTEN_TIMEOUT) == ([], [], []):
+                    continue
+                listen_connection.poll()
+                while listen_connection.notifies:
+                    dispatch_notification(listen_connection.notifies.pop(0).payload)
+        except Exception:
+            logger.exception("Invalidation listener disconnected, retrying in %s s", backoff)
+            reconnecting = True
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60)
+        finally:
+            if listen_connection is not None:
+                listen_connection.close()
+
+
+def start_listener():
+    """
+    Function to start the LISTEN thread of the current worker (once per process).
+    Called from the gunicorn post_worker_init hook.
+    """
+    global _listener
+    if connections['default'].vendor != 'postgresql':
+        return
+    if _listener is None or not _listener.is_alive():
+        _listener = threading.Thread(target=_listen, name='invalidation-listener', daemon=True)
+        _listener.start()
@@ -0,0 +1,166 @@
+# This file is for managing the printable qrcode label sheets
+import hashlib, io, json
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.controllers.blob_controller import get_blob_path, blob_exists, write_blob
+from Gazostheque.controllers.materials_controller import render_qrcode, get_public_link
+
+# Folder of the blob store holding the rendered labels
+LABEL_NAMESPACE = 'labels'
+# Bump when the label drawing changes, so that cached labels are rendered again
+LABEL_LAYOUT_VERSION = 1
+
+# A4 page at 150 dpi, holding 2 columns of 7 labels
+PAGE_SIZE = (1240, 1754)
+PAGE_MARGIN = 40
+LABEL_COLUMNS, LABEL_ROWS = 2, 7
+LABEL_SIZE = (
+    (PAGE_SIZE[0] - 2 * PAGE_MARGIN) // LABEL_COLUMNS,
+    (PAGE_SIZE[1] - 2 * PAGE_MARGIN) // LABEL_ROWS,
+)
+
+SHEET_FORMATS = {
+    'pdf': 'application/pdf',
+    'png': 'image/png',
+}
+MAX_LABELS_PER_SHEET = 1000
+
+
+def get_label_specs(material_ids):
+    """
+    Function to return what is printed on the label of each material, in the requested order.
+
+    Args:
+        material_ids (list of int): the materials to print
+
+    Returns:
+        list of dict: one entry per existing material.
+    """
+    rows = Materials.objects.filter(pk__in=material_ids).values(
+        'material_id', 'material_title', 'codeBarres', 'lab_destination'
+    )
+    specs = {row['material_id']: dict(row, link=get_public_link(row['material_id'])) for row in rows}
+    return [specs[pk] for pk in dict.fromkeys(material_ids) if pk in specs]
+
+
+def get_label_key(spec):
+    """
+    Function to return the cache key of a label.
+
+    The key hashes everything drawn on the label, so editing a material (or the
+    layout) naturally produces a new key while unchanged labels are reused.
+    """
+    payload = json.dumps([LABEL_LAYOUT_VERSION, spec], sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def render_label(spec):
+    """
+    Function to draw a single label: the qrcode on the left, the details on the right.
+
+    This is a top-level function so that it can run in the processes of `generate_labels`.
+
+    Args:
+        spec (dict): an entry returned by get_label_specs
+
+    Returns:
+        bytes: the label as a PNG image.
+    """
+    width, height = LABEL_SIZE
+    label = Image.new('RGB', LABEL_SIZE, 'white')
+    draw = ImageDraw.Draw(label)
+    draw.rectangle([0, 0, width - 1, height - 1], outline='black', width=2)
+
+    # The wide quiet zone of the stored qrcode is trimmed, the label border is enough
+    qr_size = height - 30
+    qr_img = Image.open(io.BytesIO(render_qrcode(spec['link']))).convert('L')
+    qr_img = qr_img.crop(ImageOps.invert(qr_img).getbbox())
+    label.paste(qr_img.resize((qr_size, qr_size), Image.NEAREST), (15, 15))
+
+    title_font = ImageFont.load_default(size=30)
+    text_font = ImageFont.load_default(size=22)
+    text_x = qr_size + 35
+    lines = [
+        (f"Gazotheque-{spec['material_id']:03d}", title_font),
+        (spec['material_title'] or '', text_font),
+        (f"Code barres : {spec['codeBarres'] or '-'}", text_font),
+        (f"Laboratoire : {spec['lab_destination'] or '-'}", text_font),
+    ]
+    y = 30
+    for text, font in lines:
+        # Long titles are cut to the width of the label
+        while text and draw.textlength(text, font=font) > width - text_x - 10:
+            text = text[:-1]
+        draw.text((text_x, y), text, fill='black', font=font)
+        y += font.size + 18
+
+    output = io.BytesIO()
+    label.save(output, format='PNG')
+    return output.getvalue()
+
+
+def get_rendered_labels(specs, pool=None):
+    """
+    Function to return the path of the rendered label of each spec, rendering the missing ones.
+
+    Labels are cached in the blob store under their key. The missing ones are
+    rendered inline (requests must not fork processes from a threaded worker),
+    or over the process pool given by the `generate_labels` command.
+
+    Args:
+        specs (list of dict): entries returned by get_label_specs
+        pool (Executor): optional pool rendering the missing labels
+
+    Returns:
+        list of str: the path of each label.
+    """
+    keys = [get_label_key(spec) for spec in specs]
+    missing = {key: spec for key, spec in zip(keys, specs) if not blob_exists(LABEL_NAMESPACE, key, 'png')}
+
+    if pool is not None:
+        rendered = pool.map(render_label, missing.values(), chunksize=8)
+    else:
+        rendered = map(render_label, missing.values())
+    for key, png in zip(missing, rendered):
+        write_blob(LABEL_NAMESPACE, key, png, 'png')
+
+    return [get_blob_path(LABEL_NAMESPACE, key, 'png') for key in keys]
+
+
+def render_label_sheet(material_ids, sheet_format='pdf', page=None):
+    """
+    Function to lay out the labels of a list of materials on A4 pages.
+
+    Args:
+        material_ids (list of int): the materials to print
+        sheet_format (str): 'pdf' for a multi-page document, 'png' for a single page image
+        page (int): (png only) the 1-based page to return
+
+    Returns:
+        (bytes, int): the sheet and the total number of pages.
+    """
+    label_paths = get_rendered_labels(get_label_specs(material_ids))
+    per_page = LABEL_COLUMNS * LABEL_ROWS
+    page_count = max(1, -(-len(label_paths) // per_page))
+
+    page_indexes = range(page_count)
+    if sheet_format == 'png':
+        page_indexes = [min(max((page or 1), 1), page_count) - 1]
+
+    pages = []
+    for page_index in page_indexes:
+        sheet = Image.new('RGB', PAGE_SIZE, 'white')
+        for position, path in enumerate(label_paths[page_index * per_page:(page_index + 1) * per_page]):
+            row, column = divmod(position, LABEL_COLUMNS)
+            with Image.open(path) as label:
+                sheet.paste(label, (PAGE_MARGIN + column * LABEL_SIZE[0], PAGE_MARGIN + row * LABEL_SIZE[1]))
+        pages.append(sheet)
+
+    output = io.BytesIO()
+    if sheet_format == 'png':
+        pages[0].save(output, format='PNG')
+    else:
+        pages[0].save(output, format='PDF', save_all=True, append_images=pages[1:], resolution=150)
+    return output.getvalue(), page_count
@@ -1,18 +1,43 @@
 from datetime import datetime
+from functools import lru_cache
 import qrcode, io, os, json, base64, uuid
 
 from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F, Q
 from django.http.response import JsonResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.contrib.postgres.aggregates import ArrayAgg
 
 from Gazostheque.models.material_model import Materials
 from Gazostheque.serializers import MaterialSerializer
+from Gazostheque.controllers.blob_controller import store_blob, blob_exists
+from Gazostheque.controllers.version_controller import bump_versions, material_key, owner_key, INVENTORY
+from Gazostheque.controllers.cache_controller import invalidate, material_detail_key, MATERIAL_LIST
 
 from rest_framework import status
 
 from django.utils.dateparse import parse_datetime
 
+# Supported output formats for the streamed inventory and the number of rows
+# fetched from the server-side cursor (and written to the socket) at a time
+STREAM_FORMATS = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+STREAM_CHUNK_SIZE = 500
 
+# Compact projection returned to the handheld scanners, and the maximum number
+# of scanned codes resolved by a single batch request
+CODE_LOOKUP_FIELDS = (
+    'material_id', 'material_title', 'codeBarres', 'codeCommande', 'lab_destination',
+    'levRisk', 'date_arrivee', 'date_depart', 'owner_id', 'qrcode_url',
+)
+MAX_CODES_PER_LOOKUP = 500
+
+# Folder of the blob store holding the qrcode images
+QRCODE_NAMESPACE = 'qrcodes'
 
 def get_material(pk):
     """
@@ -20,6 +45,39 @@ def get_material(pk):
     """
     return Materials.objects.get(pk=pk)
 
+def get_public_link(device_id):
+    """
+    Function to return the public page of a material, the content of its qrcode.
+    """
+    return f"{settings.QRCODE_BASE_URL}{device_id}"
+
+@lru_cache(maxsize=settings.QRCODE_CACHE_SIZE)
+def render_qrcode(webpage_link):
+    """
+    Function to render the qrcode of a link as PNG bytes.
+
+    The result only depends on the link, so the last rendered images are kept
+    in a bounded LRU. Being a plain top-level function it can also be run in
+    the worker processes of the `generate_qrcodes` command.
+
+    Args:
+        webpage_link (str): the link encoded in the qrcode
+
+    Returns:
+        bytes: the PNG image.
+    """
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=20, border=14)
+    qr.add_data(webpage_link)
+    qr.make(fit=True)
+
+    # Converting to an image
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+
+    # Save QR code image to a BytesIO object
+    qr_img_bytes = io.BytesIO()
+    qr_img.save(qr_img_bytes, format='PNG')
+    return qr_img_bytes.getvalue()
+
 def generate_qrcode(device_id, device_name, team):
     """
     Function to generate material qrcode.
@@ -32,25 +90,70 @@ def generate_qrcode(device_id, device_name, team):
     Returns:
         qr_img_bytes: returns generated bytes representing the blob of the qrcode to be stored.
     """
+    return io.BytesIO(render_qrcode(get_public_link(device_id)))
 
-    # Create a link to a web page with the material details
-    webpage_link = f"https://liphy-gazotheque.univ-grenoble-alpes.fr/gazostheque/public/{device_id}"
+def store_qrcode(png):
+    """
+    Function to store a rendered qrcode in the blob store.
 
-    # Generate the qrcode with the link
-    # qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=14)
-    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=20, border=14)
-    qr.add_data(webpage_link)  
-    qr.make(fit=True)
-    
-    # Converting to an image
-    qr_img = qr.make_image(fill_color="black", back_color="white")
+    Args:
+        png (bytes): the PNG returned by render_qrcode
 
-    # Save QR code image to a BytesIO object
-    qr_img_bytes = io.BytesIO()
-    qr_img.save(qr_img_bytes, format='PNG')
-    qr_img_bytes.seek(0)
+    Returns:
+        str: the immutable url the qrcode is served from.
+    """
+    digest = store_blob(QRCODE_NAMESPACE, png, 'png')
+    return get_qrcode_url(digest)
+
+def get_material_qrcode_url(material):
+    """
+    Function to return the qrcode url of a material, generating the qrcode on first use.
+
+    The blob store acts as the on-disk cache: once stored, only the url saved on
+    the material is needed to serve the image.
+
+    Args:
+        material (obj): a material instance (only material_id and qrcode_url are used)
 
-    return qr_img_bytes
+    Returns:
+        str: the immutable url of the qrcode.
+    """
+    if material.qrcode_url and blob_exists(QRCODE_NAMESPACE, get_qrcode_digest(material.qrcode_url), 'png'):
+        return material.qrcode_url
+
+    url = store_qrcode(render_qrcode(get_public_link(material.material_id)))
+    save_qrcode_urls({material.material_id: url})
+    material.qrcode_url = url
+    return url
+
+def save_qrcode_urls(urls):
+    """
+    Function to save the qrcode urls of some materials with a single UPDATE.
+
+    Updating the single column avoids a full save (and its signals), so the
+    resource versions and the cached payloads of the materials are updated here.
+
+    Args:
+        urls (dict): the new qrcode url of each material id
+    """
+    if not urls:
+        return
+    Materials.objects.bulk_update([Materials(material_id=pk, qrcode_url=url) for pk, url in urls.items()], ['qrcode_url'])
+    owner_ids = set(Materials.objects.filter(pk__in=urls).values_list('owner_id', flat=True))
+    bump_versions([INVENTORY, *map(material_key, urls), *map(owner_key, owner_ids)])
+    invalidate(MATERIAL_LIST, *map(material_detail_key, urls))
+
+def get_qrcode_digest(qrcode_url):
+    """
+    Function to return the content hash embedded in a qrcode url.
+    """
+    return os.path.splitext(os.path.basename(qrcode_url))[0]
+
+def get_qrcode_url(digest):
+    """
+    Function to return the url of a stored qrcode given its content hash.
+    """
+    return reverse('qrcode_image', args=[digest])
 
 def on_create_material(request):
     """
@@ -77,24 +180,12 @@ def on_create_material(request):
             created_instance = material_serializer.save() # saving instance
         except Exception as e:
             print(e)
-        
-        # Qrcode generation with the created instance, needed in this order to access the new id
-        img = generate_qrcode(
-            created_instance.material_id,
-            created_instance.material_title,
-            created_instance.team
-        )
-        
-        # Assigning the qrcode to the instance and saving
-        encoded_img =  base64.b64encode(img.getvalue()).decode('utf-8')
-        created_instance.qrcode = encoded_img
-        created_instance.save()
 
-        # Re-serialize after updating with QR code
-        updated_serializer = MaterialSerializer(created_instance)
+        # The qrcode is generated on its first request (see get_material_qrcode_url)
+        created_serializer = MaterialSerializer(created_instance)
         
         # Returning the created material data
-        return JsonResponse(updated_serializer.data, status=status.HTTP_201_CREATED) 
+        return JsonResponse(created_serializer.data, status=status.HTTP_201_CREATED) 
     
     print(material_serializer.errors)
     # Returning an error when the serialized data is not valid
@@ -130,4 +221,97 @@ def get_detailed_material(pk):
     # Include tags in the response
     detailed_materials['tags'] = list(material.tags.names())
 
-    return detailed_materials
\ No newline at end of file
+    return detailed_materials
+
+
+def get_inventory_values(materials):
+    """
+    Function to project a materials queryset onto the fields shown in the inventory table.
+
+    Args:
+        materials (QuerySet) : The materials to list
+
+    Returns:
+       (QuerySet): a `values()` queryset with the owner details and the list of tag names.
+    """
+    return materials.values(
+        'material_id',
+        'material_title',
+        'team',
+        'origin',
+        'size',
+        'codeBarres',
+        'date_arrivee',
+        'date_depart',
+        'created_at',
+        owner_first_name=F('owner__user__first_name'),
+        owner_last_name=F('owner__user__last_name'),
+        owner_email=F('owner__user__email'),
+        owner_profil=F('owner__user__profil_pic')
+    ).annotate(
+        tags=ArrayAgg('tags__name', distinct=True)  # This adds all tag names as an array
+    )
+
+def stream_inventory(inventory, stream_format):
+    """
+    Function to serialize an inventory queryset chunk by chunk.
+
+    Rows are read through a server-side cursor (`iterator()`), so neither the
+    queryset nor the response body is ever held in memory as a whole.
+
+    Args:
+        inventory (QuerySet) : A queryset returned by get_inventory_values
+        stream_format (str) : 'json' for a JSON array, 'ndjson' for one object per line
+
+    Yields:
+       (str): pieces of the response body.
+    """
+    rows = inventory.order_by('created_at', 'material_id').iterator(chunk_size=STREAM_CHUNK_SIZE)
+
+    if stream_format == 'ndjson':
+        for chunk in _chunked(rows, STREAM_CHUNK_SIZE):
+            yield ''.join(json.dumps(row, cls=DjangoJSONEncoder) + '\n' for row in chunk)
+        return
+
+    yield '['
+    for index, chunk in enumerate(_chunked(rows, STREAM_CHUNK_SIZE)):
+        body = ','.join(json.dumps(row, cls=DjangoJSONEncoder) for row in chunk)
+        yield body if index == 0 else ',' + body
+    yield ']'
+
+def _chunked(rows, size):
+    """
+    Function to group an iterator of rows into lists of at most `size` rows.
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def lookup_materials_by_codes(codes):
+    """
+    Function to resolve scanned barcodes / order codes to materials with a single indexed query.
+
+    Args:
+        codes (list of str): the scanned codes
+
+    Returns:
+        dict: for each code, the list of materials whose barcode or order code matches it.
+    """
+    codes = list(dict.fromkeys(code for code in codes if code))
+    matches = {code: [] for code in codes}
+    if not codes:
+        return matches
+
+    rows = Materials.objects.filter(
+        Q(codeBarres__in=codes) | Q(codeCommande__in=codes)
+    ).values(*CODE_LOOKUP_FIELDS).order_by('material_id')
+    for row in rows:
+        for code in {row['codeBarres'], row['codeCommande']}:
+            if code in matches:
+                matches[code].append(row)
+    return matches
@@ -0,0 +1,263 @@
+# This file is for managing the notifications
+import uuid
+from collections import Counter
+from datetime import timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F, Q, Count
+from django.utils import timezone
+
+from Gazostheque.models.notification_model import Notifications
+from Gazostheque.models.notification_counters_model import NotificationCounters
+from Gazostheque.models.owner_model import Owners
+from Gazostheque.controllers.invalidation_controller import broadcast
+from Gazostheque.controllers.push_controller import get_notification_event, NOTIFICATION_TOPIC
+
+# The priorities of the notifications shown in the "important" view
+IMPORTANT_PRIORITIES = ('High', 'Critical')
+
+# The flag set by each bulk action
+BULK_ACTIONS = {
+    'read': 'read_flag',
+    'resolve': 'resolved_flag',
+}
+
+
+def get_important_notifications(user_id):
+    """
+    Function to return the unresolved High / Critical notifications of a user.
+    The filter matches the condition of the notif_user_important_idx partial index.
+    """
+    return Notifications.objects.filter(user=user_id, resolved_flag=False, priority__in=IMPORTANT_PRIORITIES)
+
+
+def get_notification_values(notifications):
+    """
+    Function to project notifications into the rows returned by the feeds,
+    the title of the related material being joined in the same query.
+
+    Args:
+        notifications (QuerySet): the notifications to return
+
+    Returns:
+        QuerySet: a values() queryset, to paginate with paginate_by_keyset.
+    """
+    return notifications.values(
+        'notif_id',
+        'type',
+        'priority',
+        'description',
+        'title',
+        'resolved_flag',
+        'read_flag',
+        'created_at',
+        'updated_at',
+        'user',
+        'material',
+        material_title=F('material__material_title'),
+    )
+
+
+def create_notifications(notifications):
+    """
+    Function to insert many notifications with a single INSERT, skipping the ones whose
+    (user, dedupe_key) was already notified. bulk_create() sends no signal, so the
+    counters of the users are adjusted once and the new rows pushed after the commit.
+
+    Args:
+        notifications (list): unsaved Notifications instances
+
+    Returns:
+        list: the notifications actually created.
+    """
+    if not notifications:
+        return []
+    # The rows inserted by this call are told apart from the skipped ones by a token of the call
+    batch_id = uuid.uuid4()
+    for notification in notifications:
+        notification.batch_id = batch_id
+    user_ids = {notification.user_id for notification in notifications}
+
+    with transaction.atomic():
+        Notifications.objects.bulk_create(notifications, ignore_conflicts=True)
+        created = list(Notifications.objects.filter(user__in=user_ids, batch_id=batch_id).select_related('material'))
+        unread, important = Counter(), Counter()
+        for notification in created:
+            contribution = get_counter_contribution(notification)
+            unread[notification.user_id] += contribution[0]
+            important[notification.user_id] += contribution[1]
+        for user_id in unread | important:
+            adjust_notification_counters(user_id, unread[user_id], important[user_id])
+        events = [get_notification_event(notification) for notification in created]
+        transaction.on_commit(lambda: [broadcast(NOTIFICATION_TOPIC, event) for event in events])
+    return created
+
+
+def get_departure_dedupe_key(material):
+    """
+    Function to identify the departure of a material: a new departure date is a new event.
+    The date is normalized to UTC, the same instant given with another offset being the same departure.
+    """
+    return f'departure:{material.material_id}:{timezone.localtime(material.date_depart, dt_timezone.utc).isoformat()}'
+
+
+def notify_departures(materials):
+    """
+    Function to notify the owners of some materials that they are ready for departure,
+    once per (material, departure date). Usable for single saves as well as bulk edits and imports.
+
+    Args:
+        materials (list): Materials instances with a date_depart
+
+    Returns:
+        list: the notifications created.
+    """
+    materials = [material for material in materials if material.date_depart and material.owner_id]
+    owner_users = dict(Owners.objects.filter(pk__in={material.owner_id for material in materials}).values_list('pk', 'user'))
+    return create_notifications([
+        Notifications(
+            type='Event',
+            title='Material Ready for Departure',
+            priority='Medium',
+            description=f"The material '{material.material_title}' is marked ready for departure.",
+            user_id=owner_users[material.owner_id],
+            material=material,
+            dedupe_key=get_departure_dedupe_key(material),
+        )
+        for material in materials if material.owner_id in owner_users
+    ])
+
+
+def select_user_notifications(user_id, ids=None, before=None):
+    """
+    Function to select some notifications of a user.
+
+    Args:
+        user_id (int): the user the notifications belong to
+        ids (list): (optional) only these notifications
+        before (datetime): (optional) only the notifications created up to this date
+    """
+    notifications = Notifications.objects.filter(user=user_id)
+    if ids is not None:
+        notifications = notifications.filter(notif_id__in=ids)
+    if before is not None:
+        notifications = notifications.filter(created_at__lte=before)
+    return notifications
+
+
+def bulk_flag_notifications(user_id, action, ids=None, before=None):
+    """
+    Function to mark many notifications of a user read or resolved with a single UPDATE.
+    Like save(update_fields=...), only the flag and the update date are written.
+
+    Args:
+        user_id (int): the user the notifications belong to
+        action (str): one of BULK_ACTIONS
+        ids (list): (optional) only these notifications
+        before (datetime): (optional) only the notifications created up to this date
+
+    Returns:
+        int: the number of notifications changed.
+    """
+    flag = BULK_ACTIONS[action]
+    with transaction.atomic():
+        count = select_user_notifications(user_id, ids, before).filter(**{flag: False}).update(**{flag: True, 'updated_at': timezone.now()})
+        # update() sends no signal, the counters are recomputed once instead
+        if count:
+            rebuild_notification_counters([user_id])
+    return count
+
+
+def delete_resolved_notifications(user_id, ids=None, before=None):
+    """
+    Function to delete the resolved notifications of a user with a single DELETE.
+
+    Returns:
+        int: the number of notifications deleted.
+    """
+    with transaction.atomic():
+        notifications = select_user_notifications(user_id, ids, before).filter(resolved_flag=True)
+        # queryset.delete() would load every row, delete them by batches and send one post_delete
+        # signal (one counters UPDATE) per row; nothing references notifications, so the rows
+        # are deleted directly and the counters recomputed once
+        count = notifications._raw_delete(notifications.db)
+        if count:
+            rebuild_notification_counters([user_id])
+    return count
+
+
+def get_counter_contribution(notification):
+    """
+    Function to return what a notification adds to the counters of its user.
+
+    Returns:
+        (unread, important): each 0 or 1.
+    """
+    unread = 0 if notification.read_flag else 1
+    important = 1 if not notification.resolved_flag and notification.priority in IMPORTANT_PRIORITIES else 0
+    return unread, important
+
+
+def adjust_notification_counters(user_id, unread, important, rebuild_missing=True):
+    """
+    Function to add some deltas to the counters of a user, in a single UPDATE.
+    The counters are rebuilt when the user has no counters row yet (unless rebuild_missing is False,
+    e.g. while the user is being deleted).
+    """
+    if not unread and not important:
+        return
+    updated = NotificationCounters.objects.filter(user=user_id).update(
+        unread=F('unread') + unread,
+        important=F('important') + important,
+    )
+    if not updated and rebuild_missing:
+        # Counted from the table, which already includes the current change
+        rebuild_notification_counters([user_id])
+
+
+def rebuild_notification_counters(user_ids=None):
+    """
+    Function to recompute the counters of some users (all of them by default) from the Notifications table.
+
+    Args:
+        user_ids (list): (optional) the users to rebuild the counters of
+
+    Returns:
+        int: the number of counters rows written.
+    """
+    notifications = Notifications.objects.all()
+    if user_ids is not None:
+        notifications = notifications.filter(user__in=user_ids)
+    counts = {
+        row['user']: row
+        for row in notifications.values('user').annotate(
+            unread=Count('notif_id', filter=Q(read_flag=False)),
+            important=Count('notif_id', filter=Q(resolved_flag=False, priority__in=IMPORTANT_PRIORITIES)),
+        ).order_by()
+    }
+    if user_ids is None:
+        NotificationCounters.objects.exclude(user__in=list(counts)).delete()
+        user_ids = list(counts)
+
+    for user_id in user_ids:
+        row = counts.get(user_id, {'unread': 0, 'important': 0})
+        NotificationCounters.objects.update_or_create(
+            user_id=user_id,
+            defaults={'unread': row['unread'], 'important': row['important']},
+        )
+    return len(user_ids)
+
+
+def get_notification_counts(user_id):
+    """
+    Function to return the notification counts of a user, with a single primary key lookup.
+    Missing or inconsistent counters are rebuilt on the fly.
+
+    Returns:
+        dict: {'unread': int, 'important': int}
+    """
+    counts = NotificationCounters.objects.filter(user=user_id).values('unread', 'important').first()
+    if counts is None or counts['unread'] < 0 or counts['important'] < 0:
+        rebuild_notification_counters([user_id])
+        counts = NotificationCounters.objects.filter(user=user_id).values('unread', 'important').first()
+    return counts
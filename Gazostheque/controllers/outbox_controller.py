@@ -0,0 +1,123 @@
+# This file is for managing the outbox of the emails
+# Emails are stored by the requests and sent by the `send_outbound_emails` worker,
+# so a slow or unreachable SMTP server never delays a request.
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from Gazostheque.models.outbound_email_model import OutboundEmail
+
+BATCH_SIZE = 50
+# Attempts before an email is marked as failed
+MAX_ATTEMPTS = 8
+# Delay before the first retry, doubled on each attempt, in seconds
+RETRY_BASE_DELAY = 60
+RETRY_MAX_DELAY = 6 * 60 * 60
+# Time a worker holds the emails it claimed; past it they are due again (e.g. after a crash)
+CLAIM_DURATION = timedelta(minutes=15)
+
+
+def enqueue_email(subject, body, to, html_body=None, from_email=None):
+    """
+    Function to queue an email, sent later by the outbox worker.
+
+    Args:
+        subject (str): the subject
+        body (str): the plain text body
+        to (list): the recipients
+        html_body (str): (optional) the HTML alternative
+        from_email (str): (optional) the sender, DEFAULT_FROM_EMAIL by default
+
+    Returns:
+        OutboundEmail: the queued email.
+    """
+    return OutboundEmail.objects.create(subject=subject, body=body, html_body=html_body, from_email=from_email, to=list(to))
+
+
+def get_retry_delay(attempts):
+    """
+    Function to return the delay before the next attempt of an email that failed `attempts` times.
+    """
+    return timedelta(seconds=min(RETRY_BASE_DELAY * 2 ** (attempts - 1), RETRY_MAX_DELAY))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(email.subject, email.body, email.from_email or settings.DEFAULT_FROM_EMAIL, email.to, connection=connection)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def _record_failure(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= MAX_ATTEMPTS:
+        email.status = OutboundEmail.FAILED
+    else:
+        email.next_attempt_at = now + get_retry_delay(email.attempts)
+
+
+def claim_due_emails(batch_size, now):
+    """
+    Function to reserve a batch of due emails for the current worker, in a short transaction.
+    Rows are locked with SKIP LOCKED and pushed back by CLAIM_DURATION, so several workers
+    can run side by side and no lock is held while talking to the SMTP server.
+
+    Returns:
+        list: the claimed OutboundEmail instances.
+    """
+    with transaction.atomic():
+        emails = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status=OutboundEmail.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[email.pk for email in emails]).update(next_attempt_at=now + CLAIM_DURATION)
+    return emails
+
+
+def send_pending_emails(batch_size=BATCH_SIZE, now=None):
+    """
+    Function to send a batch of due emails over a single SMTP connection (bounded by EMAIL_TIMEOUT).
+
+    Args:
+        batch_size (int): the maximum number of emails sent
+        now (datetime): (optional) the reference date, now by default
+
+    Returns:
+        (sent, failed): the number of emails sent and of failed attempts.
+    """
+    now = now or timezone.now()
+    sent = failed = 0
+    emails = claim_due_emails(batch_size, now)
+    if not emails:
+        return sent, failed
+
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        # The server is unreachable: every email of the batch is retried later
+        for email in emails:
+            _record_failure(email, e, now)
+        OutboundEmail.objects.bulk_update(emails, ['attempts', 'last_error', 'status', 'next_attempt_at'])
+        return sent, len(emails)
+
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as e:
+                _record_failure(email, e, now)
+                failed += 1
+            else:
+                email.status = OutboundEmail.SENT
+                email.sent_at = timezone.now()
+                sent += 1
+    finally:
+        connection.close()
+        OutboundEmail.objects.bulk_update(emails, ['attempts', 'last_error', 'status', 'next_attempt_at', 'sent_at'])
+    return sent, failed
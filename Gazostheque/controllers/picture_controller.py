@@ -0,0 +1,212 @@
+# This file is for managing the profile pictures
+# Uploaded pictures are kept in a private folder (they may hold EXIF metadata, e.g. GPS), then
+# turned off the request path into fixed-size JPEG / WebP variants without metadata, stored under
+# names hashed from the upload so they never change once served. The originals are deleted afterwards.
+import hashlib, io, json, logging, os, tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.move import file_move_safe
+from django.db import connections, transaction
+
+from django.utils import timezone
+
+from Gazostheque.controllers.blob_controller import write_blob, blob_exists, get_blob_path
+from Gazostheque.custom_exception import InvalidPictureError
+
+logger = logging.getLogger(__name__)
+
+PICTURE_NAMESPACE = 'avatars'
+# The stored variants, in the order of the profil_pic list: the display one first
+# (the frontend shows profil_pic[0]), the thumbnails for the lists of users / materials
+PICTURE_VARIANTS = (
+    ('display', 256, 'webp'),
+    ('display', 256, 'jpeg'),
+    ('thumb', 64, 'webp'),
+    ('thumb', 64, 'jpeg'),
+)
+EXTENSIONS = {'webp': 'webp', 'jpeg': 'jpg'}
+PICTURE_QUALITY = 85
+# Part of the names of the variants: to bump when the rendering changes
+PICTURE_RENDER_VERSION = 1
+# Uploads larger than this many pixels are refused (decompression bombs)
+MAX_PIXELS = 40_000_000
+
+_executor = None
+
+
+def open_picture(source, verify=False):
+    """
+    Function to open and check a picture.
+
+    Args:
+        source: the path or file object of the picture
+        verify (bool): (optional) only check the file, without decoding the pixels
+
+    Raises:
+        InvalidPictureError: If the file is not a supported image.
+    """
+    try:
+        image = Image.open(source)
+        if image.width * image.height > MAX_PIXELS:
+            raise InvalidPictureError("Picture too large")
+        if verify:
+            image.verify()
+        else:
+            image.load()
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidPictureError(f"Invalid picture: {e}")
+    return image
+
+
+def store_original_picture(uploaded_file):
+    """
+    Function to check an uploaded picture and keep it in PROFILE_PICTURE_UPLOAD_DIR,
+    outside MEDIA_ROOT, until process_profile_picture renders and deletes it.
+
+    Returns:
+        str: the path of the stored picture.
+
+    Raises:
+        InvalidPictureError: If the file is not a supported image.
+    """
+    extension = open_picture(uploaded_file, verify=True).format.lower()
+    os.makedirs(settings.PROFILE_PICTURE_UPLOAD_DIR, exist_ok=True)
+    # A unique name per upload: the job of an identical upload may delete its own copy meanwhile
+    fd, path = tempfile.mkstemp(dir=settings.PROFILE_PICTURE_UPLOAD_DIR, suffix=f'.{extension}')
+    if hasattr(uploaded_file, 'temporary_file_path'):
+        # Streamed to disk by HashingFileUploadHandler: the temporary file is moved, not copied
+        os.close(fd)
+        file_move_safe(uploaded_file.temporary_file_path(), path, allow_overwrite=True)
+    else:
+        with os.fdopen(fd, 'wb') as destination:
+            for chunk in uploaded_file.chunks():
+                destination.write(chunk)
+    return path
+
+
+def get_variant_key(digest, variant):
+    """
+    Function to return the name of a variant of an uploaded picture.
+
+    The key hashes the sha256 of the upload and the rendering settings, so the
+    variants of an identical upload are found without rendering it again.
+
+    Args:
+        digest (str): the sha256 hex digest of the uploaded picture
+        variant (tuple): an entry of PICTURE_VARIANTS
+    """
+    payload = json.dumps([PICTURE_RENDER_VERSION, PICTURE_QUALITY, digest, variant])
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_variant_paths(digest):
+    """
+    Function to return the paths of the variants of an uploaded picture.
+
+    Returns:
+        list: the paths relative to MEDIA_ROOT, as stored in profil_pic, in the order of PICTURE_VARIANTS.
+    """
+    return [
+        os.path.relpath(get_blob_path(PICTURE_NAMESPACE, get_variant_key(digest, variant), EXTENSIONS[variant[2]]), settings.MEDIA_ROOT)
+        for variant in PICTURE_VARIANTS
+    ]
+
+
+def find_stored_variants(digest):
+    """
+    Function to return the paths of the variants of an uploaded picture when they are all stored already.
+
+    Returns:
+        list: the paths of the variants, or None if the picture has to be rendered.
+    """
+    if all(blob_exists(PICTURE_NAMESPACE, get_variant_key(digest, variant), EXTENSIONS[variant[2]]) for variant in PICTURE_VARIANTS):
+        return get_variant_paths(digest)
+    return None
+
+
+def render_variants(path):
+    """
+    Function to render the variants of a picture: square crops, orientation fixed.
+    Only the pixels are saved, the metadata of the original (EXIF, GPS) is dropped.
+
+    Returns:
+        list: (bytes, extension) pairs, in the order of PICTURE_VARIANTS.
+    """
+    image = ImageOps.exif_transpose(open_picture(path)).convert('RGB')
+    variants = []
+    for name, size, image_format in PICTURE_VARIANTS:
+        buffer = io.BytesIO()
+        ImageOps.fit(image, (size, size), Image.LANCZOS).save(buffer, format=image_format.upper(), quality=PICTURE_QUALITY)
+        variants.append((buffer.getvalue(), EXTENSIONS[image_format]))
+    return variants
+
+
+def store_variants(path, digest):
+    """
+    Function to render and store the variants of a picture.
+
+    Args:
+        path (str): the stored picture
+        digest (str): the sha256 hex digest of the uploaded picture
+
+    Returns:
+        list: the paths of the variants relative to MEDIA_ROOT, as stored in profil_pic.
+    """
+    for (content, extension), variant in zip(render_variants(path), PICTURE_VARIANTS):
+        write_blob(PICTURE_NAMESPACE, get_variant_key(digest, variant), content, extension)
+    return get_variant_paths(digest)
+
+
+def set_profile_picture(user_id, paths):
+    """
+    Function to set the variants of a picture as the user picture.
+    Saving with update_fields sends the signals refreshing the caches of the user.
+    """
+    user = get_user_model().objects.get(pk=user_id)
+    user.profil_pic = json.dumps(paths)
+    user.updated_at = timezone.now()
+    user.save(update_fields=['profil_pic', 'updated_at'])
+
+
+def process_profile_picture(user_id, path, digest):
+    """
+    Function to generate the variants of a profile picture and set them as the user picture,
+    then delete the original.
+    """
+    try:
+        paths = store_variants(path, digest)
+        set_profile_picture(user_id, paths)
+    except Exception:
+        logger.exception("Could not process the profile picture of user %s", user_id)
+        raise
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        if settings.PROFILE_PICTURE_WORKERS:
+            # Pool threads are reused: do not keep their connection between jobs
+            connections.close_all()
+    return paths
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.PROFILE_PICTURE_WORKERS, thread_name_prefix='profile-pictures')
+    return _executor
+
+
+def schedule_profile_picture(user_id, path, digest):
+    """
+    Function to process a stored picture once the current transaction commits,
+    in the pool of the worker (inline if PROFILE_PICTURE_WORKERS is 0).
+    """
+    if settings.PROFILE_PICTURE_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(process_profile_picture, user_id, path, digest))
+    else:
+        process_profile_picture(user_id, path, digest)
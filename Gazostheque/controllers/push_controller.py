@@ -0,0 +1,162 @@
+# This file is for managing the real-time push of new notifications (Server-Sent Events)
+# Each open stream waits on an asyncio queue of its worker, fed by the in-process broker.
+# Notifications created by the other workers are relayed by the invalidation bus.
+import asyncio, json, threading
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection
+
+from Gazostheque.controllers.invalidation_controller import register_handler
+
+# Topic of the invalidation bus carrying the new notifications
+NOTIFICATION_TOPIC = 'notifications'
+# Seconds between two keep-alive comments, so proxies do not close idle streams
+HEARTBEAT_INTERVAL = 15
+# Milliseconds the browser waits before reconnecting a closed stream
+RECONNECT_DELAY = 5000
+# Events waiting for a slow client; beyond that the client is asked to resync
+QUEUE_SIZE = 100
+
+
+class NotificationBroker:
+    """
+    In-process fan-out of the notification events to the open streams of the worker.
+    Events may be published from any thread; each stream consumes them on its event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # user_id -> set of (event loop, queue) of the open streams
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        """
+        Function to open a queue receiving the events of a user, on the running event loop.
+        """
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add((asyncio.get_running_loop(), queue))
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        with self._lock:
+            streams = self._subscribers.get(user_id, set())
+            streams.difference_update([stream for stream in streams if stream[1] is queue])
+            if not streams:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, event):
+        """
+        Function to send an event to every open stream of a user (all users if user_id is None).
+        """
+        with self._lock:
+            if user_id is None:
+                streams = [stream for streams in self._subscribers.values() for stream in streams]
+            else:
+                streams = list(self._subscribers.get(user_id, ()))
+        for loop, queue in streams:
+            loop.call_soon_threadsafe(_enqueue, queue, event)
+
+    def stream_count(self):
+        with self._lock:
+            return sum(len(streams) for streams in self._subscribers.values())
+
+
+def _enqueue(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # The client is too slow: drop its backlog and let it fetch its feed again
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait({'event': 'resync'})
+
+
+# The broker of the current worker
+broker = NotificationBroker()
+
+
+def get_notification_event(notification):
+    """
+    Function to build the pushed event of a notification, with the same fields as the feed rows.
+    """
+    return {
+        'event': 'notification',
+        'user': notification.user_id,
+        'data': {
+            'notif_id': notification.notif_id,
+            'type': notification.type,
+            'priority': notification.priority,
+            'description': notification.description,
+            'title': notification.title,
+            'resolved_flag': notification.resolved_flag,
+            'read_flag': notification.read_flag,
+            'created_at': notification.created_at,
+            'updated_at': notification.updated_at,
+            'user': notification.user_id,
+            'material': notification.material_id,
+            'material_title': notification.material.material_title if notification.material_id else None,
+        },
+    }
+
+
+def relay_event(event):
+    """
+    Function to hand an event of the invalidation bus to the local streams.
+    A None event means some events may have been lost: every stream is asked to resync.
+    """
+    if event is None:
+        broker.publish(None, {'event': 'resync'})
+    else:
+        broker.publish(event['user'], event)
+
+
+register_handler(NOTIFICATION_TOPIC, relay_event)
+
+
+def format_event(event):
+    """
+    Function to serialize an event in the text/event-stream format.
+    """
+    lines = [f"event: {event['event']}"]
+    if 'data' in event:
+        if 'notif_id' in event['data']:
+            lines.append(f"id: {event['data']['notif_id']}")
+        lines.append(f"data: {json.dumps(event['data'], cls=DjangoJSONEncoder)}")
+    else:
+        lines.append('data: {}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def get_stream_user_id(request):
+    """
+    Function to authenticate the user opening a stream (synchronous, the session and user are usually cached).
+    The database connection is then released, so open streams do not hold one each.
+
+    Returns:
+        int: the primary key of the user, or None if not authenticated.
+    """
+    try:
+        user = request.user
+        return user.pk if user.is_authenticated else None
+    finally:
+        if not connection.in_atomic_block:
+            connection.close()
+
+
+async def notification_events(user_id, heartbeat=HEARTBEAT_INTERVAL):
+    """
+    Asynchronous generator of the text/event-stream of a user, running until the client disconnects.
+    """
+    queue = broker.subscribe(user_id)
+    try:
+        yield f'retry: {RECONNECT_DELAY}\n\n'
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), heartbeat)
+            except asyncio.TimeoutError:
+                yield ': keep-alive\n\n'
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(user_id, queue)
@@ -0,0 +1,86 @@
+# This file is for managing the reminders sent to the owners before the departure / arrival of their materials
+# Run periodically by the `send_reminders` command; each reminder is sent once thanks to its dedupe key.
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.models.notification_model import Notifications
+from Gazostheque.controllers.notification_controller import create_notifications
+
+DEFAULT_LAB = 'default'
+BATCH_SIZE = 500
+
+# event -> (date field, title, description template)
+REMINDER_EVENTS = {
+    'departure': ('date_depart', 'Upcoming Material Departure', "The material '{title}' leaves on {date:%d/%m/%Y}."),
+    'arrival': ('date_arrivee', 'Upcoming Material Arrival', "The material '{title}' arrives on {date:%d/%m/%Y}."),
+}
+
+
+def get_reminder_windows(event):
+    """
+    Function to list the materials to scan for an event, one entry per lab configuration.
+
+    Returns:
+        list: (queryset filter on the lab, lead days) pairs.
+    """
+    default_days = settings.REMINDER_LEAD_DAYS.get(DEFAULT_LAB, {}).get(event)
+    explicit_labs = [lab for lab in settings.REMINDER_LEAD_DAYS if lab != DEFAULT_LAB]
+    windows = []
+    if default_days:
+        windows.append((Materials.objects.exclude(lab_destination__in=explicit_labs), default_days))
+    for lab in explicit_labs:
+        # A lab only overrides the events it lists
+        days = settings.REMINDER_LEAD_DAYS[lab].get(event, default_days)
+        if days:
+            windows.append((Materials.objects.filter(lab_destination=lab), days))
+    return windows
+
+
+def get_reminder_dedupe_key(event, material_id, date):
+    """
+    Function to identify a reminder: a new date is a new reminder.
+    """
+    return f'reminder:{event}:{material_id}:{date.isoformat()}'
+
+
+def send_due_reminders(now=None, batch_size=BATCH_SIZE):
+    """
+    Function to remind the owners of the materials leaving or arriving within the lead time of their lab.
+    Each window is a range scan on the indexed date column, the notifications are inserted by batches
+    and the ones already sent are skipped, so the job can run as often as wanted.
+
+    Args:
+        now (datetime): (optional) the reference date, now by default
+        batch_size (int): the number of notifications inserted per query
+
+    Returns:
+        int: the number of reminders created.
+    """
+    now = now or timezone.now()
+    created = 0
+    for event, (field, title, description) in REMINDER_EVENTS.items():
+        for materials, days in get_reminder_windows(event):
+            rows = materials.filter(
+                **{f'{field}__gt': now, f'{field}__lte': now + timedelta(days=days)},
+                owner__isnull=False,
+            ).values_list('material_id', 'material_title', 'owner__user', field).iterator(chunk_size=batch_size)
+
+            batch = []
+            for material_id, material_title, user_id, date in rows:
+                batch.append(Notifications(
+                    type='Event',
+                    title=title,
+                    priority='Medium',
+                    description=description.format(title=material_title, date=timezone.localtime(date)),
+                    user_id=user_id,
+                    material_id=material_id,
+                    dedupe_key=get_reminder_dedupe_key(event, material_id, date),
+                ))
+                if len(batch) == batch_size:
+                    created += len(create_notifications(batch))
+                    batch = []
+            created += len(create_notifications(batch))
+    return created
@@ -0,0 +1,105 @@
+# This file is for managing the full-text search over materials
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector, TrigramSimilarity
+from django.db import connection
+from django.db.models import F, Q, Value, OuterRef, Subquery
+from django.db.models.functions import Greatest, Concat
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.models.owner_model import Owners
+
+# Text search configuration: no stemming, titles and codes are not prose
+SEARCH_CONFIG = 'simple'
+# Minimum trigram similarity for a typo-tolerant match
+TRIGRAM_THRESHOLD = 0.3
+# Columns matched with trigrams when the full-text search finds nothing
+TRIGRAM_FIELDS = ['material_title', 'team', 'origin', 'codeCommande', 'codeBarres']
+# Columns of a material the search document is built from (the owner gives the owner names)
+SEARCH_DOCUMENT_FIELDS = ('material_title', 'codeCommande', 'codeBarres', 'team', 'origin', 'owner_id')
+
+# Indexes backing the search, created by the `rebuild_search_index` command
+SEARCH_INDEXES_SQL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS materials_search_vector_idx ON "Materials" USING gin (search_vector)',
+] + [
+    f'CREATE INDEX IF NOT EXISTS materials_{field.lower()}_trgm_idx ON "Materials" USING gin ("{field}" gin_trgm_ops)'
+    for field in TRIGRAM_FIELDS
+]
+
+
+def is_full_text_available():
+    """
+    Function to check whether the database supports the PostgreSQL search (not the case of SQLite test runs).
+    """
+    return connection.vendor == 'postgresql'
+
+
+def get_search_document(material):
+    """
+    Function to return the values of a material its search vector is built from,
+    to tell whether a save changed them.
+    """
+    return tuple(getattr(material, field) for field in SEARCH_DOCUMENT_FIELDS)
+
+
+def refresh_search_vectors(materials):
+    """
+    Function to recompute the stored search vector of some materials with a single UPDATE.
+
+    Titles and codes weigh more than the team, origin and owner names.
+
+    Args:
+        materials (QuerySet): the materials to refresh
+    """
+    if not is_full_text_available():
+        return
+
+    # The owner names come from other tables, which an UPDATE cannot join: they are read by a subquery
+    owner_names = Owners.objects.filter(pk=OuterRef('owner_id')).values(
+        name=Concat('user__first_name', Value(' '), 'user__last_name')
+    )[:1]
+    materials.update(search_vector=(
+        SearchVector('material_title', 'codeCommande', 'codeBarres', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('team', 'origin', weight='B', config=SEARCH_CONFIG) +
+        SearchVector(Subquery(owner_names), weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def search_material_ids(query, limit, offset=0):
+    """
+    Function to return the ids of the materials matching a search, best matches first.
+
+    On PostgreSQL, materials are ranked by full-text relevance; if no material
+    matches, a trigram similarity search tolerates typos. Other databases fall
+    back to case-insensitive substring matching.
+
+    Args:
+        query (str): the text typed by the user
+        limit (int): the maximum number of ids to return
+        offset (int): the number of ids to skip
+
+    Returns:
+        list of int: the ids of the matching materials.
+    """
+    if not is_full_text_available():
+        condition = Q()
+        for field in TRIGRAM_FIELDS + ['owner__user__first_name', 'owner__user__last_name']:
+            condition |= Q(**{f'{field}__icontains': query})
+        materials = Materials.objects.filter(condition).order_by('material_title', 'material_id')
+        return list(materials.values_list('material_id', flat=True)[offset:offset + limit])
+
+    search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+    ranked = Materials.objects.filter(search_vector=search_query).annotate(
+        rank=SearchRank(F('search_vector'), search_query)
+    ).order_by('-rank', 'material_id')
+    material_ids = list(ranked.values_list('material_id', flat=True)[offset:offset + limit])
+    if material_ids or (offset and ranked.exists()):
+        return material_ids
+
+    # Nothing matched exactly: look for similar words (typos, partial codes)
+    condition = Q()
+    for field in TRIGRAM_FIELDS:
+        condition |= Q(**{f'{field}__trigram_similar': query})
+    similar = Materials.objects.filter(condition).annotate(
+        similarity=Greatest(*[TrigramSimilarity(field, query) for field in TRIGRAM_FIELDS])
+    ).filter(similarity__gte=TRIGRAM_THRESHOLD).order_by('-similarity', 'material_id')
+    return list(similar.values_list('material_id', flat=True)[offset:offset + limit])
@@ -3,6 +3,40 @@ from django.contrib.sessions.models import Session
 from django.contrib.auth import get_user_model
 from Gazostheque.custom_exception import *
 from django.utils import timezone
+from django.conf import settings
+from importlib import import_module
+from Gazostheque.controllers.user_controller import get_cached_user
+
+def load_session(session_token):
+    """
+    Function to load the data of a session given a session_token, through the configured session engine.
+    With the cached_db engine (shared Redis cache) this is a cache hit, the database is only queried on a miss.
+
+    Args:
+        session_token (str): A unique identifier for a user's session.
+
+    Returns:
+        session_data (dict): The data of the session.
+
+    Raises:
+        SessionNotFoundError: If the session token does not exist.
+        SessionExpiredError: If the session has expired.
+    """
+    SessionStore = import_module(settings.SESSION_ENGINE).SessionStore
+    session_data = SessionStore(session_key=session_token).load()
+    if session_data:
+        # The engine never returns an expired session
+        return session_data
+
+    # Rare path: tell an expired session from an unknown one
+    expire_date = Session.objects.filter(session_key=session_token).values_list('expire_date', flat=True).first()
+    if expire_date is None:
+        raise SessionNotFoundError("Session not found or invalid")
+    if timezone.now() > expire_date:
+        raise SessionExpiredError("Session expired")
+    # The session exists but holds no data
+    return session_data
+
 
 def get_user_from_session_token(session_token):
     """
@@ -20,21 +54,14 @@ def get_user_from_session_token(session_token):
         SessionExpiredError: If the session key error occurs.
     """
     try: #catches the exceptions if any
-        # Retrieve the session object from the database using the session token
-        session = Session.objects.get(session_key=session_token)
-        
         # Get the session data
-        session_data = session.get_decoded()
+        session_data = load_session(session_token)
         
         # Get the user ID stored in the session data
         user_id = session_data['_auth_user_id']
         
-        # Retrieve the user object using th0e user ID
-        user = get_user_model().objects.get(pk=user_id)
-        
-        return user
-    except Session.DoesNotExist:
-        raise SessionNotFoundError("Session not found or invalid")
+        # Retrieve the user object using the user ID, from the cache when possible
+        return get_cached_user(user_id)
     except get_user_model().DoesNotExist:
         raise UserNotFoundError("No user found under the session token")
     except KeyError:
@@ -49,33 +76,30 @@ def is_session_expired(session_token):
         session_token (str): A unique identifier for a user's session.
     
     Returns:
-        bool: True if the session has expired, False otherwise.
+        bool: False if the session has not expired.
     
     Raises:
         SessionNotFoundError: If the session token does not exist.
-        InvalidExpirationTimeError: If the expiration time format is invalid.
+        SessionExpiredError: If the session has expired.
     """
-    try:
-        # Retrieve the session object from the database using the session token
-        session = Session.objects.get(session_key=session_token)
-        
-        # Get the expiration date of the session
-        expire_date = timezone.localtime(session.expire_date) #!important
-        
-        if expire_date:
-            # Get current time
-            current_time = timezone.now()
-            
-            # Check if session has expired
-            if current_time > expire_date:
-                raise SessionExpiredError("Session expired")
-            else:
-                return False  # Session not expired yet
-        else:
-            return False  # Session not expired yet
-    except Session.DoesNotExist:
-        # Session with the given token does not exist
-        raise SessionNotFoundError("Session not found or invalid")
-    except ValueError:
-        # Invalid expiration time format
-        raise InvalidExpirationTimeError("Invalid expiration time format")
\ No newline at end of file
+    load_session(session_token)
+    return False  # Session not expired yet
+
+
+def clear_expired_sessions(batch_size=1000):
+    """
+    Function to delete the expired sessions by batches, to keep each delete short.
+
+    Args:
+        batch_size (int): The number of sessions deleted per query.
+
+    Returns:
+        count (int): The number of deleted sessions.
+    """
+    count = 0
+    now = timezone.now()
+    while True:
+        session_keys = list(Session.objects.filter(expire_date__lt=now).values_list('session_key', flat=True)[:batch_size])
+        if not session_keys:
+            return count
+        count += Session.objects.filter(session_key__in=session_keys).delete()[0]
@@ -0,0 +1,153 @@
+# This file is for managing the dashboard statistics
+from collections import Counter
+from datetime import timedelta
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from Gazostheque.models.material_model import Materials, LAB_CHOICES
+from Gazostheque.models.stats_model import MaterialStats
+
+
+def get_stat_keys(created_at, lab_destination):
+    """
+    Function to list the statistics buckets a material is counted in.
+
+    Args:
+        created_at (datetime): the creation date of the material
+        lab_destination (str): the lab destination of the material
+
+    Returns:
+        list of tuple: the (kind, key) pairs of the buckets.
+    """
+    # Months and years are those of the local time zone, as displayed on the dashboard
+    created_at = timezone.localtime(created_at)
+    year = str(created_at.year)
+    return [
+        (MaterialStats.TOTAL, ''),
+        (MaterialStats.LAB, lab_destination or ''),
+        (MaterialStats.YEAR, year),
+        (MaterialStats.MONTH, created_at.strftime('%Y-%m')),
+        (MaterialStats.YEAR_LAB, f'{year}|{lab_destination or ""}'),
+    ]
+
+
+def adjust_material_stats(stat_keys, delta):
+    """
+    Function to add delta to the count of some statistics buckets.
+
+    This is a single upsert: the missing buckets (first material of a new month /
+    year / lab) are created and the existing ones incremented atomically, so that
+    concurrent transactions never lose a count.
+
+    Args:
+        stat_keys (list of tuple): the (kind, key) pairs returned by get_stat_keys
+        delta (int): +1 when a material enters the buckets, -1 when it leaves them
+    """
+    # Sorted so that concurrent upserts lock the rows in the same order
+    stat_keys = sorted(set(stat_keys))
+    if not stat_keys:
+        return
+
+    table = connection.ops.quote_name(MaterialStats._meta.db_table)
+    rows = ', '.join(['(%s, %s, %s)'] * len(stat_keys))
+    params = [value for kind, key in stat_keys for value in (kind, key, delta)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ("kind", "key", "count") VALUES {rows} '
+            f'ON CONFLICT ("kind", "key") DO UPDATE SET "count" = {table}."count" + EXCLUDED."count"',
+            params,
+        )
+
+
+def rebuild_material_stats():
+    """
+    Function to recompute every statistics bucket from the Materials table.
+
+    Returns:
+        int: the number of buckets written.
+    """
+    counts = Counter()
+    rows = Materials.objects.values_list('created_at', 'lab_destination').iterator(chunk_size=2000)
+    for created_at, lab_destination in rows:
+        counts.update(get_stat_keys(created_at, lab_destination))
+    # The total row always exists, even for an empty inventory
+    counts[(MaterialStats.TOTAL, '')] += 0
+
+    with transaction.atomic():
+        MaterialStats.objects.all().delete()
+        MaterialStats.objects.bulk_create(
+            MaterialStats(kind=kind, key=key, count=count) for (kind, key), count in counts.items()
+        )
+    return len(counts)
+
+
+def get_dashboard_stats():
+    """
+    Function to return every dashboard payload, read from the statistics table in one query.
+
+    Returns:
+        dict: the 'total', 'by_lab' and 'by_year_and_lab' payloads, in the same
+        format as the /materials/count/, /materials/count-by-lab and
+        /materials/bar-chart endpoints.
+    """
+    current = timezone.localtime()
+    last_month = current.replace(day=1) - timedelta(days=1)
+    current_key, last_key = current.strftime('%Y-%m'), last_month.strftime('%Y-%m')
+
+    stats = MaterialStats.objects.filter(
+        Q(kind__in=[MaterialStats.TOTAL, MaterialStats.LAB, MaterialStats.YEAR_LAB]) |
+        Q(kind=MaterialStats.MONTH, key__in=[current_key, last_key])
+    ).values_list('kind', 'key', 'count')
+    counts = {(kind, key): count for kind, key, count in stats}
+
+    return {
+        'total': get_total_payload(
+            counts.get((MaterialStats.TOTAL, ''), 0),
+            counts.get((MaterialStats.MONTH, current_key), 0),
+            counts.get((MaterialStats.MONTH, last_key), 0),
+        ),
+        'by_lab': {lab: counts.get((MaterialStats.LAB, lab), 0) for lab, _ in LAB_CHOICES},
+        'by_year_and_lab': get_year_and_lab_payload(
+            (int(key.split('|')[0]), key.split('|', 1)[1], count)
+            for (kind, key), count in counts.items() if kind == MaterialStats.YEAR_LAB and count
+        ),
+    }
+
+
+def get_total_payload(total_count, current_month_count, last_month_count):
+    """
+    Function to build the total count payload with the month over month evolution.
+    """
+    # Calculate percentage difference
+    if last_month_count > 0:
+        percentage_diff = ((current_month_count - last_month_count) / last_month_count) * 100
+    else:
+        percentage_diff = 0
+
+    return {
+        'total_count': total_count,
+        'current_month_count': current_month_count,
+        'percentage_diff': round(percentage_diff, 1),
+        'is_positive': percentage_diff >= 0
+    }
+
+
+def get_year_and_lab_payload(rows):
+    """
+    Function to pivot (year, lab, count) rows into the bar chart payload.
+
+    Returns:
+        dict: {'years': [...], 'series': [{'name': lab, 'data': [count per year]}]}
+    """
+    counts = {}
+    for year, lab, count in rows:
+        counts[(year, lab)] = counts.get((year, lab), 0) + count
+
+    years = sorted({year for year, _ in counts})
+    labs = sorted({lab for _, lab in counts if lab})
+    return {
+        'years': years,
+        'series': [{'name': lab, 'data': [counts.get((year, lab), 0) for year in years]} for lab in labs],
+    }
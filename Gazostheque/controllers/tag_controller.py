@@ -0,0 +1,174 @@
+# This file is for managing the in-memory tag index used by the tag search
+import threading
+
+from django.contrib.contenttypes.models import ContentType
+from taggit.models import Tag, TaggedItem
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.controllers.invalidation_controller import register_handler
+
+# Topic of the invalidation bus carrying the changes of the tag index
+TAG_INDEX_TOPIC = 'tag_index'
+
+
+def bitmap_to_ids(bitmap):
+    """
+    Function to list the material ids whose bit is set in a bitmap.
+    """
+    # bin() and str.find run in C, which is much faster than shifting a big int bit by bit
+    bits = bin(bitmap)[:1:-1]
+    ids = []
+    index = bits.find('1')
+    while index != -1:
+        ids.append(index)
+        index = bits.find('1', index + 1)
+    return ids
+
+
+class TagIndex:
+    """
+    Inverted index from each tag to the materials carrying it, held by each worker.
+
+    Each posting list is a Python int used as a bitmap (bit n set = material n
+    has the tag), so AND / OR / NOT queries are bitwise operations and facet
+    counts are popcounts, instead of one SQL join per searched tag.
+    The index is loaded on first use and then updated by the tag signals.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = None   # lower-cased tag name -> bitmap
+        self._names = {}        # lower-cased tag name -> tag name as stored
+        self._materials = 0     # bitmap of every material, for NOT queries
+
+    def _load(self):
+        content_type = ContentType.objects.get_for_model(Materials)
+        postings, names, materials = {}, {}, 0
+        rows = TaggedItem.objects.filter(content_type=content_type).values_list('tag__name', 'object_id')
+        for name, material_id in rows.iterator(chunk_size=5000):
+            key = name.lower()
+            names.setdefault(key, name)
+            postings[key] = postings.get(key, 0) | (1 << material_id)
+        for material_id in Materials.objects.values_list('material_id', flat=True).iterator(chunk_size=5000):
+            materials |= 1 << material_id
+        self._postings, self._names, self._materials = postings, names, materials
+
+    def _snapshot(self):
+        # Loads the index if needed and returns a copy of it, safe to read while other threads update it
+        with self._lock:
+            if self._postings is None:
+                self._load()
+            return dict(self._postings), self._names, self._materials
+
+    def reset(self):
+        """
+        Function to drop the index, which is loaded again on next use.
+        """
+        with self._lock:
+            self._postings = None
+
+    def add_material(self, material_id, tag_names=()):
+        """
+        Function to register a material, optionally with some of its tags.
+        """
+        with self._lock:
+            if self._postings is None:
+                return
+            self._materials |= 1 << material_id
+            for name in tag_names:
+                key = name.lower()
+                self._names.setdefault(key, name)
+                self._postings[key] = self._postings.get(key, 0) | (1 << material_id)
+
+    def remove_tags(self, material_id, tag_names=None):
+        """
+        Function to remove some tags (all of them if tag_names is None) from a material.
+        """
+        with self._lock:
+            if self._postings is None:
+                return
+            keys = list(self._postings) if tag_names is None else [name.lower() for name in tag_names]
+            for key in keys:
+                if key in self._postings:
+                    self._postings[key] &= ~(1 << material_id)
+
+    def remove_material(self, material_id):
+        """
+        Function to forget a deleted material.
+        """
+        self.remove_tags(material_id)
+        with self._lock:
+            if self._postings is not None:
+                self._materials &= ~(1 << material_id)
+
+    def tag_names(self):
+        """
+        Function to return the names of the tags used by at least one material.
+        """
+        postings, names, _ = self._snapshot()
+        return [names[key] for key, bitmap in postings.items() if bitmap]
+
+    def search(self, all_tags=(), any_tags=(), excluded_tags=()):
+        """
+        Function to find the materials matching a tag query.
+
+        Args:
+            all_tags (list of str): tags the materials must all carry (AND)
+            any_tags (list of str): tags the materials must carry at least one of (OR)
+            excluded_tags (list of str): tags the materials must not carry (NOT)
+
+        Returns:
+            (list of int, dict): the matching material ids and, for each tag
+            present in the result, the number of matching materials carrying it.
+        """
+        postings, names, result = self._snapshot()
+
+        for name in all_tags:
+            result &= postings.get(name.lower(), 0)
+        if any_tags:
+            union = 0
+            for name in any_tags:
+                union |= postings.get(name.lower(), 0)
+            result &= union
+        for name in excluded_tags:
+            result &= ~postings.get(name.lower(), 0)
+
+        facets = {}
+        if result:
+            for key, bitmap in postings.items():
+                count = (bitmap & result).bit_count()
+                if count:
+                    facets[names[key]] = count
+        return bitmap_to_ids(result), facets
+
+
+# The index of the current worker
+tag_index = TagIndex()
+
+
+def apply_tag_event(event):
+    """
+    Function to apply a change of the tag index, made by this worker or received from another one.
+
+    Args:
+        event (dict): {'op': 'add' | 'remove' | 'delete', 'material_id': int, 'tags': list of names or None},
+            or None to drop the whole index
+    """
+    if event is None:
+        tag_index.reset()
+    elif event['op'] == 'add':
+        tag_index.add_material(event['material_id'], event.get('tags') or ())
+    elif event['op'] == 'remove':
+        tag_index.remove_tags(event['material_id'], event.get('tags'))
+    elif event['op'] == 'delete':
+        tag_index.remove_material(event['material_id'])
+
+
+register_handler(TAG_INDEX_TOPIC, apply_tag_event)
+
+
+def get_tag_names(tag_ids):
+    """
+    Function to return the names of some tags given their primary keys.
+    """
+    return list(Tag.objects.filter(pk__in=tag_ids).values_list('name', flat=True))
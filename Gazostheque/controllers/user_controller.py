@@ -1,10 +1,27 @@
 from Gazostheque.controllers.owner_controller import get_owner_by_user
+from Gazostheque.controllers.cache_controller import get_or_build, user_key, USER
 
 from django.db import connection
 from django.db.models import Count
 from django.db.models.functions import ExtractYear
 from django.contrib.auth import get_user_model
 
+def get_cached_user(user_id):
+    """
+    Function to get a user instance from the cache, loading it from the database on a miss.
+    The entry is deleted by signals whenever the user is saved or deleted.
+
+    Args:
+        user_id (int): The primary key of the user.
+
+    Returns:
+        user (obj): The user instance.
+
+    Raises:
+        DoesNotExist: If no user has this primary key.
+    """
+    return get_or_build(user_key(user_id), lambda: get_user_model().objects.get(pk=user_id), family=USER)
+
 def get_formatted_user(user):
     """
     This function takes a user object as input and returns a dictionary 
@@ -17,8 +34,11 @@ def get_formatted_user(user):
     Returns:
         user_details (dict): A dictionary containing the user's details.
     """
-    # Get the owner object associated with the user
-    owner = get_owner_by_user(user.user_id)
+    # Get the owner object associated with the user (reusing the one loaded by select_related if any)
+    if type(user).owner_profile.is_cached(user):
+        owner = getattr(user, 'owner_profile', None)
+    else:
+        owner = get_owner_by_user(user.user_id)
     
     # Initialize a dictionary to store the user's details
     user_details = {
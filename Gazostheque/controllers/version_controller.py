@@ -0,0 +1,89 @@
+# This file is for managing the resource versions used for conditional GET requests
+from functools import wraps
+
+from django.db import connection
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from Gazostheque.models.version_model import ResourceVersions
+
+INVENTORY = 'inventory'
+TAGS = 'tags'
+OWNERS = 'owners'
+
+
+def material_key(pk):
+    """
+    Function to return the version key of a material.
+    """
+    return f'material:{pk}' if pk is not None else None
+
+
+def owner_key(pk):
+    """
+    Function to return the version key of the material list of an owner.
+    """
+    return f'owner:{pk}' if pk is not None else None
+
+
+def bump_versions(keys):
+    """
+    Function to record a write on some resources.
+
+    This is a single upsert, creating the missing versions and incrementing the
+    existing ones atomically, so that concurrent writes never lose a bump.
+
+    Args:
+        keys (iterable of str): the keys of the modified resources
+    """
+    # Sorted so that concurrent upserts lock the rows in the same order
+    keys = sorted({key for key in keys if key})
+    if not keys:
+        return
+
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    table = connection.ops.quote_name(ResourceVersions._meta.db_table)
+    rows = ', '.join(['(%s, 1, %s)'] * len(keys))
+    params = [value for key in keys for value in (key, now)]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ("key", "version", "updated_at") VALUES {rows} '
+            f'ON CONFLICT ("key") DO UPDATE SET "version" = {table}."version" + 1, "updated_at" = EXCLUDED."updated_at"',
+            params,
+        )
+
+
+def conditional_on_versions(get_keys):
+    """
+    Decorator answering GET requests with 304 Not Modified when the client
+    already holds the current version of the resources the view depends on.
+
+    Args:
+        get_keys (callable): returns the version keys of the view given its (request, *args, **kwargs)
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+
+            keys = get_keys(request, *args, **kwargs)
+            rows = ResourceVersions.objects.filter(key__in=keys).values_list('key', 'version', 'updated_at')
+            versions = {key: (version, updated_at) for key, version, updated_at in rows}
+            etag = quote_etag('-'.join(f'{key}.{versions[key][0] if key in versions else 0}' for key in keys))
+            dates = [updated_at for _, updated_at in versions.values()]
+            last_modified = int(max(dates).timestamp()) if dates else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code == 200:
+                    response.headers.setdefault('ETag', etag)
+                    if last_modified:
+                        response.headers.setdefault('Last-Modified', http_date(last_modified))
+                    # Browsers must revalidate, which is cheap thanks to the versions
+                    response.headers.setdefault('Cache-Control', 'private, no-cache')
+            return response
+        return wrapper
+    return decorator
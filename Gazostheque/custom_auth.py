@@ -2,6 +2,7 @@
 
 from django.contrib.auth.backends import BaseBackend
 from Gazostheque.models.user_model import CustomUsers
+from Gazostheque.controllers.user_controller import get_cached_user
 
 # A custom definition of the authentication logic using the custom user table
 class CustomAuth(BaseBackend):
@@ -14,8 +15,9 @@ class CustomAuth(BaseBackend):
             return None
 
     # A function that returns the user from the custom made table
+    # Called on every authenticated request, so the user is served from the cache
     def get_user(self, user_id):
         try:
-            return CustomUsers.objects.get(pk=user_id)
+            return get_cached_user(user_id)
         except CustomUsers.DoesNotExist:
             return None
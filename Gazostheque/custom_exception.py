@@ -25,4 +25,12 @@ class SessionNotFoundError(Exception):
 
 class InvalidExpirationTimeError(Exception):
     """Exception raised when the session's expiration time is in an invalid format."""
-    pass
\ No newline at end of file
+    pass
+
+class InvalidCursorError(Exception):
+    """Exception raised when a pagination cursor cannot be decoded."""
+    pass
+
+class InvalidPictureError(Exception):
+    """Exception raised when an uploaded picture is not a supported image."""
+    pass
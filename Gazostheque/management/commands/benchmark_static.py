@@ -0,0 +1,64 @@
+# Command measuring the bytes sent for the collected static files through StaticFilesMiddleware,
+# without compression, with gzip and with brotli (run after collectstatic)
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.http import HttpResponse
+from django.test import RequestFactory
+
+from Gazostheque.middleware import StaticFilesMiddleware
+
+ACCEPT_ENCODINGS = (
+    ('identity', 'identity'),
+    ('gzip', 'gzip'),
+    ('br', 'br, gzip'),
+)
+
+
+def get_response_size(response):
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return size
+
+
+class Command(BaseCommand):
+    help = "Compare the bytes on the wire for the collected static files with and without the precompressed variants."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help="Number of largest files detailed.")
+
+    def handle(self, *args, **options):
+        root = settings.STATIC_ROOT
+        if not root or not os.path.isdir(root):
+            raise CommandError("STATIC_ROOT does not exist, run collectstatic first.")
+
+        middleware = StaticFilesMiddleware(lambda request: HttpResponse(status=404))
+        factory = RequestFactory()
+        prefix = '/' + settings.STATIC_URL.strip('/') + '/'
+        totals = {label: 0 for label, _ in ACCEPT_ENCODINGS}
+        files = []
+        for directory, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(('.gz', '.br')):
+                    continue
+                url = prefix + os.path.relpath(os.path.join(directory, name), root).replace(os.sep, '/')
+                sizes = {}
+                for label, accept_encoding in ACCEPT_ENCODINGS:
+                    response = middleware(factory.get(url, HTTP_ACCEPT_ENCODING=accept_encoding))
+                    sizes[label] = get_response_size(response)
+                    totals[label] += sizes[label]
+                files.append((url, sizes))
+
+        if not totals['identity']:
+            self.stdout.write("No static file to serve.")
+            return
+        files.sort(key=lambda item: item[1]['identity'], reverse=True)
+        for url, sizes in files[:options['top']]:
+            self.stdout.write(f"{url}: " + ", ".join(f"{label} {size}" for label, size in sizes.items()))
+        for label, total in totals.items():
+            saved = 100 * (1 - total / totals['identity'])
+            self.stdout.write(self.style.SUCCESS(f"{label}: {total} bytes for {len(files)} file(s), {saved:.1f}% saved"))
@@ -0,0 +1,16 @@
+# Command deleting the expired sessions by batches, to be run periodically (e.g. from cron)
+# so the django_session table does not grow without bound
+from django.core.management.base import BaseCommand
+
+from Gazostheque.controllers.session_controller import clear_expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete the expired sessions from the database, by batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Sessions deleted per query.")
+
+    def handle(self, *args, **options):
+        count = clear_expired_sessions(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"{count} expired session(s) deleted."))
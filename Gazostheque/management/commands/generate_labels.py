@@ -0,0 +1,30 @@
+# Command pre-rendering the qrcode labels of all or selected materials in parallel,
+# so that the label sheets requested afterwards are only laid out
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.controllers.labels_controller import get_label_specs, get_rendered_labels
+
+
+class Command(BaseCommand):
+    help = "Render the missing qrcode labels of all or selected materials into the blob store."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Material ids (default: all materials).")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of rendering processes.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Number of materials rendered at a time.")
+
+    def handle(self, *args, **options):
+        material_ids = options['ids'] or list(Materials.objects.order_by('material_id').values_list('material_id', flat=True))
+        batch_size = options['batch_size']
+
+        # Label drawing is CPU bound: it is spread over a process pool, outside of any web worker
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for start in range(0, len(material_ids), batch_size):
+                get_rendered_labels(get_label_specs(material_ids[start:start + batch_size]), pool)
+                self.stdout.write(f"{min(start + batch_size, len(material_ids))}/{len(material_ids)} material(s) processed")
+
+        self.stdout.write(self.style.SUCCESS(f"Labels of {len(material_ids)} material(s) rendered."))
@@ -0,0 +1,46 @@
+# Command (re)generating material qrcodes in parallel, e.g. after bulk imports
+# or after a change of settings.QRCODE_BASE_URL
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.controllers.materials_controller import render_qrcode, store_qrcode, save_qrcode_urls, get_public_link
+
+
+class Command(BaseCommand):
+    help = "Pre-generate (or regenerate with --force) the qrcodes of all or selected materials."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Material ids (default: all materials).")
+        parser.add_argument('--force', action='store_true', help="Regenerate qrcodes that already exist.")
+        parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Number of rendering processes.")
+        parser.add_argument('--batch-size', type=int, default=200, help="Number of materials updated at a time.")
+
+    def handle(self, *args, **options):
+        materials = Materials.objects.all()
+        if options['ids']:
+            materials = materials.filter(pk__in=options['ids'])
+        if not options['force']:
+            materials = materials.filter(qrcode_url__isnull=True)
+
+        material_ids = list(materials.order_by('material_id').values_list('material_id', flat=True))
+        batch_size = options['batch_size']
+        generated = 0
+
+        # PNG encoding is CPU bound: it is spread over a process pool, while the
+        # parent process stores the images and updates the rows batch by batch
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            for start in range(0, len(material_ids), batch_size):
+                batch = material_ids[start:start + batch_size]
+                links = [get_public_link(material_id) for material_id in batch]
+                urls = {
+                    material_id: store_qrcode(png)
+                    for material_id, png in zip(batch, pool.map(render_qrcode, links, chunksize=16))
+                }
+                save_qrcode_urls(urls)
+                generated += len(urls)
+                self.stdout.write(f"{generated}/{len(material_ids)} qrcode(s) generated")
+
+        self.stdout.write(self.style.SUCCESS(f"{generated} qrcode(s) generated."))
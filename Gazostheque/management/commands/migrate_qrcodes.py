@@ -0,0 +1,33 @@
+# Command moving the legacy base64 qrcodes stored in the Materials rows to the blob store
+import base64, binascii
+
+from django.core.management.base import BaseCommand
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.controllers.materials_controller import store_qrcode
+
+
+class Command(BaseCommand):
+    help = "Move base64 qrcodes out of the Materials table into the content-addressed blob store."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Number of rows read at a time.")
+
+    def handle(self, *args, **options):
+        legacy = Materials.objects.exclude(qrcode__isnull=True).exclude(qrcode='')
+        moved = failed = 0
+
+        # Only the two needed columns are read, one chunk at a time
+        rows = legacy.values_list('material_id', 'qrcode').iterator(chunk_size=options['batch_size'])
+        for material_id, encoded in rows:
+            try:
+                image = base64.b64decode(encoded, validate=True)
+            except (binascii.Error, ValueError):
+                self.stderr.write(f"Material {material_id}: invalid base64 qrcode, skipped")
+                failed += 1
+                continue
+            url = store_qrcode(image)
+            Materials.objects.filter(pk=material_id).update(qrcode_url=url, qrcode=None)
+            moved += 1
+
+        self.stdout.write(self.style.SUCCESS(f"{moved} qrcode(s) moved to the blob store, {failed} skipped."))
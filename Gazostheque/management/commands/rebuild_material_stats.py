@@ -0,0 +1,13 @@
+# Command recomputing the dashboard statistics from the Materials table,
+# e.g. after a bulk import done with update()/bulk_create() (which send no signals)
+from django.core.management.base import BaseCommand
+
+from Gazostheque.controllers.stats_controller import rebuild_material_stats
+
+
+class Command(BaseCommand):
+    help = "Rebuild the MaterialStats table from the Materials table."
+
+    def handle(self, *args, **options):
+        buckets = rebuild_material_stats()
+        self.stdout.write(self.style.SUCCESS(f"{buckets} statistics bucket(s) rebuilt."))
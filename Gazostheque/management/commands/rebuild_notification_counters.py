@@ -0,0 +1,16 @@
+# Command recomputing the notification counters from the Notifications table,
+# e.g. after notifications were changed with update()/bulk_create() (which send no signals)
+from django.core.management.base import BaseCommand
+
+from Gazostheque.controllers.notification_controller import rebuild_notification_counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild the NotificationCounters table from the Notifications table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', nargs='*', type=int, help="Only rebuild the counters of these users.")
+
+    def handle(self, *args, **options):
+        count = rebuild_notification_counters(options['users'] or None)
+        self.stdout.write(self.style.SUCCESS(f"{count} counters row(s) rebuilt."))
@@ -0,0 +1,22 @@
+# Command creating the PostgreSQL search indexes and recomputing every search vector
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Gazostheque.models.material_model import Materials
+from Gazostheque.controllers.search_controller import is_full_text_available, refresh_search_vectors, SEARCH_INDEXES_SQL
+
+
+class Command(BaseCommand):
+    help = "Create the full-text / trigram indexes (PostgreSQL) and rebuild the materials search vectors."
+
+    def handle(self, *args, **options):
+        if not is_full_text_available():
+            self.stdout.write("Full-text search needs PostgreSQL, nothing to do.")
+            return
+
+        with connection.cursor() as cursor:
+            for statement in SEARCH_INDEXES_SQL:
+                cursor.execute(statement)
+
+        refresh_search_vectors(Materials.objects.all())
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt for {Materials.objects.count()} material(s)."))
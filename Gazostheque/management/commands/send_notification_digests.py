@@ -0,0 +1,31 @@
+# Command queuing for each user a digest of their unread notifications, either once (e.g. from cron)
+# or forever with --loop, hourly or daily; the digests are sent by `send_outbound_emails`
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from Gazostheque.controllers.emails_controller import send_notification_digests, DIGEST_BATCH_SIZE
+
+PERIODS = {
+    'hourly': 60 * 60,
+    'daily': 24 * 60 * 60,
+}
+
+
+class Command(BaseCommand):
+    help = "Queue for each user a digest of the notifications not emailed yet, sent by the outbox worker."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run forever, once per --period.")
+        parser.add_argument('--period', choices=PERIODS, default='daily', help="Frequency of the digests with --loop.")
+        parser.add_argument('--batch-size', type=int, default=DIGEST_BATCH_SIZE, help="Digests queued per transaction.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            queued = send_notification_digests(options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{queued} digest(s) queued."))
+            if not options['loop']:
+                return
+            time.sleep(PERIODS[options['period']])
@@ -0,0 +1,29 @@
+# Command sending the queued emails (see outbox_controller), either once (e.g. from cron)
+# or as a background worker with --loop
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from Gazostheque.controllers.outbox_controller import send_pending_emails, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Send the pending emails of the outbox, retrying the failed ones with a backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run forever, polling every --interval seconds.")
+        parser.add_argument('--interval', type=int, default=5, help="Seconds between two polls with --loop.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Emails sent per SMTP connection.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            sent, failed = send_pending_emails(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"{sent} email(s) sent, {failed} failed attempt(s)."))
+            if not options['loop']:
+                return
+            # A full batch means more emails are due: do not wait
+            if sent + failed < options['batch_size']:
+                time.sleep(options['interval'])
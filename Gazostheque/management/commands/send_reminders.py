@@ -0,0 +1,26 @@
+# Command reminding the owners of their upcoming material departures / arrivals (see REMINDER_LEAD_DAYS),
+# either once (e.g. from cron) or forever with --loop
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from Gazostheque.controllers.reminder_controller import send_due_reminders, BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Create the reminder notifications of the upcoming departures and arrivals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Run forever, every --interval seconds.")
+        parser.add_argument('--interval', type=int, default=300, help="Seconds between two runs with --loop.")
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Notifications inserted per query.")
+
+    def handle(self, *args, **options):
+        while True:
+            close_old_connections()
+            created = send_due_reminders(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"{created} reminder(s) created."))
+            if not options['loop']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,180 @@
+# File that defines the middleware serving the static and media files from the Django process
+# Static files: precompressed variants picked by Accept-Encoding, immutable cache headers for
+# fingerprinted names. Media files: only the public folders (PUBLIC_MEDIA_PREFIXES), with
+# conditional requests and byte ranges.
+import mimetypes, os, re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+# One year, the maximum recommended
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=0, must-revalidate'
+# Static names that change with the content: manifest hashes (name.0123456789ab.ext),
+# Next.js hashes (103-c4fc3e6619552383.js, 229.e4da87b05440a128.js) and the Next.js chunks folder
+STATIC_FINGERPRINTED = re.compile(r'(^chunks/|\.[0-9a-f]{12}\.[^/.]+$|[-.][0-9a-f]{16}\.[^/.]+$)')
+# Media names that change with the content: blob store digests
+MEDIA_FINGERPRINTED = re.compile(r'^blobs/[^/]+/[0-9a-f]{2}/[0-9a-f]{64}\.[^/.]+$')
+# Accept-Encoding token -> (suffix of the precompressed file, Content-Encoding), by preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+def _url_prefix(url):
+    return '/' + url.strip('/') + '/'
+
+
+def accepts_encoding(accept_encoding, encoding):
+    """
+    Function to check whether an Accept-Encoding header allows an encoding (q=0 refuses it).
+    """
+    for token in accept_encoding.split(','):
+        name, _, params = token.strip().partition(';')
+        if name.strip().lower() == encoding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def parse_range(header, size):
+    """
+    Function to read a single byte range.
+
+    Returns:
+        (start, end): the inclusive bounds, None if the header is unsupported (the whole file is sent),
+        or False if the range cannot be satisfied.
+    """
+    match = RANGE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as source:
+        source.seek(start)
+        while length > 0:
+            chunk = source.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+class StaticFilesMiddleware:
+    """
+    Serves STATIC_URL from STATIC_ROOT, and MEDIA_URL from the PUBLIC_MEDIA_PREFIXES folders of
+    MEDIA_ROOT, before any other middleware (no session nor authentication is involved).
+    Requests for missing or private files go on to the rest of the stack.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        # (url prefix, root, allowed folders or None for all, fingerprinted names)
+        self.roots = (
+            (_url_prefix(settings.STATIC_URL), settings.STATIC_ROOT, None, STATIC_FINGERPRINTED),
+            (_url_prefix(settings.MEDIA_URL), settings.MEDIA_ROOT, tuple(settings.PUBLIC_MEDIA_PREFIXES), MEDIA_FINGERPRINTED),
+        )
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD'):
+            for prefix, root, public_prefixes, fingerprinted in self.roots:
+                if root and request.path.startswith(prefix):
+                    response = self.serve(request, root, request.path[len(prefix):], public_prefixes, fingerprinted)
+                    if response is not None:
+                        return response
+        return self.get_response(request)
+
+    def serve(self, request, root, name, public_prefixes=None, fingerprinted=STATIC_FINGERPRINTED):
+        try:
+            path = safe_join(root, name)
+        except SuspiciousFileOperation:
+            return None
+        # Checked on the normalized name, so that 'public/../private' is refused
+        name = os.path.relpath(path, root).replace(os.sep, '/')
+        if public_prefixes is not None and not name.startswith(public_prefixes):
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        content_type, _ = mimetypes.guess_type(path)
+        content_type = content_type or 'application/octet-stream'
+        filename = os.path.basename(path)
+
+        # Precompressed variant written by collectstatic, if the client accepts it (media files have none,
+        # their byte ranges refer to the stored file)
+        encoding = None
+        if public_prefixes is None:
+            accept_encoding = request.headers.get('Accept-Encoding', '')
+            for token, suffix in ENCODINGS:
+                if accepts_encoding(accept_encoding, token) and os.path.isfile(path + suffix):
+                    path, encoding = path + suffix, token
+                    break
+
+        # Validators of the representation actually sent: each encoding has its own ETag
+        stat = os.stat(path)
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+        headers = {
+            'Cache-Control': IMMUTABLE_CACHE_CONTROL if fingerprinted.search(name) else REVALIDATE_CACHE_CONTROL,
+            'Last-Modified': http_date(stat.st_mtime),
+            'ETag': etag,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if request.headers.get('If-None-Match') == etag or (
+            'If-None-Match' not in request.headers
+            and (parse_http_date_safe(request.headers.get('If-Modified-Since', '')) or 0) >= int(stat.st_mtime)
+        ):
+            response = HttpResponseNotModified()
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        if public_prefixes is not None:
+            response = self.serve_range(request, path, stat.st_size, content_type)
+            if response is not None:
+                for header, value in headers.items():
+                    response[header] = value
+                return response
+
+        response = FileResponse(open(path, 'rb'), content_type=content_type, filename=filename)
+        if encoding:
+            response['Content-Encoding'] = encoding
+        if public_prefixes is not None:
+            response['Accept-Ranges'] = 'bytes'
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def serve_range(self, request, path, size, content_type):
+        header = request.headers.get('Range')
+        if not header:
+            return None
+        byte_range = parse_range(header, size)
+        if byte_range is None:
+            return None
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end - start + 1), status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+        response['Accept-Ranges'] = 'bytes'
+        return response
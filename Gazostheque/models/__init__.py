@@ -1 +1,5 @@
-from .user_model import CustomUsers
\ No newline at end of file
+from .user_model import CustomUsers
+from .stats_model import MaterialStats
+from .version_model import ResourceVersions
+from .notification_counters_model import NotificationCounters
+from .outbound_email_model import OutboundEmail
@@ -1,4 +1,5 @@
 from django.db import models
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 from datetime import timedelta
 
@@ -16,11 +17,15 @@ class Materials(models.Model):
     material_id = models.AutoField(primary_key=True, serialize=False, verbose_name='ID')
     material_title = models.CharField(max_length=100)
     team = models.CharField(max_length=100, null=True, blank=True)
+    # Legacy base64 qrcode, emptied by the `migrate_qrcodes` command
     qrcode = models.TextField(null=True, blank=True)
+    # The url of the qrcode image in the blob store
+    qrcode_url = models.CharField(max_length=255, null=True, blank=True)
     origin = models.CharField(max_length=100, null=True)
     owner = models.ForeignKey('Owners', on_delete=models.CASCADE, null=True, related_name='owner_materials')
-    codeCommande = models.CharField(max_length=100, null=True)
-    codeBarres = models.CharField(max_length=100, null=True)
+    # Order code and barcode, indexed for the scanner lookups
+    codeCommande = models.CharField(max_length=100, null=True, db_index=True)
+    codeBarres = models.CharField(max_length=100, null=True, db_index=True)
     size = models.CharField(max_length=200, null=True)
     levRisk = models.CharField(max_length=200, null=True)
 
@@ -29,14 +34,18 @@ class Materials(models.Model):
         blank=True, 
         choices=LAB_CHOICES,
     )
-    date_arrivee = models.DateTimeField(null=True, blank=True)
-    date_depart = models.DateTimeField(null=True, blank=True)
+    # Indexed for the range scans of the reminder engine
+    date_arrivee = models.DateTimeField(null=True, blank=True, db_index=True)
+    date_depart = models.DateTimeField(null=True, blank=True, db_index=True)
 
     # The date and time when the material was created.
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(default=timezone.now)
 
     tags = TaggableManager()
+
+    # The full-text search document, maintained by signals (PostgreSQL only)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     USERNAME_FIELD = 'material_title'
 
@@ -46,6 +55,10 @@ class Materials(models.Model):
         """
         db_table = 'Materials'
         verbose_name_plural = "Materials"
+        indexes = [
+            # Keyset pagination / streaming order of the inventory listing
+            models.Index(fields=['created_at', 'material_id'], name='materials_created_keyset_idx'),
+        ]
     
     def __str__(self):
         return self.material_title
\ No newline at end of file
@@ -0,0 +1,26 @@
+from django.db import models
+
+class NotificationCounters(models.Model):
+    """
+    This model holds the per-user notification counts shown on the notification badge.
+    Rows are kept up to date by the Notifications signals (see signals.py), and are
+    rebuilt from the Notifications table when missing or inconsistent.
+    """
+    # The user the counts belong to.
+    user = models.OneToOneField('CustomUsers', on_delete=models.CASCADE, primary_key=True, related_name='notification_counters')
+    
+    # The number of notifications not read yet.
+    unread = models.IntegerField(default=0)
+    
+    # The number of unresolved High / Critical notifications.
+    important = models.IntegerField(default=0)
+
+    class Meta:
+        """
+        This is the metadata for the NotificationCounters model.
+        """
+        db_table = 'NotificationCounters'
+        verbose_name_plural = "Notification counters"
+
+    def __str__(self):
+        return f'{self.user_id}: {self.unread} unread, {self.important} important'
@@ -49,20 +49,32 @@ class Notifications(models.Model):
     # The user who received the notification.
     user = models.ForeignKey('CustomUsers', on_delete=models.CASCADE, related_name='user_notifications')
     
+    # The material the notification is about, if any.
+    material = models.ForeignKey(Materials, on_delete=models.SET_NULL, null=True, blank=True, related_name='material_notifications')
+    
+    # The date and time when the notification was sent in an email digest.
+    emailed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    
+    # Identifies the event notified (e.g. 'departure:<material>:<date>'), so a user gets it only once.
+    dedupe_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    
+    # Identifies the create_notifications() call that inserted the notification.
+    batch_id = models.UUIDField(null=True, blank=True, editable=False)
+    
     
     def mark_as_read(self):
         """
         This function marks the notification as read.
         """
         self.read_flag = True
-        self.save()
+        self.save(update_fields=['read_flag', 'updated_at'])
         
     def mark_as_resolved(self):
         """
         This function marks the notification as resolved.
         """
         self.resolved_flag = True
-        self.save()
+        self.save(update_fields=['resolved_flag', 'updated_at'])
 
     class Meta:
         """
@@ -70,4 +82,20 @@ class Notifications(models.Model):
         """
         db_table = 'Notifications'
         verbose_name_plural = "Notifications"
-        ordering = ['-created_at']
\ No newline at end of file
+        ordering = ['-created_at']
+        indexes = [
+            # Serves the per-user feed, paginated by (created_at, notif_id)
+            models.Index(fields=['user', '-created_at', '-notif_id'], name='notif_user_feed_idx'),
+            # Partial index holding only the unresolved High / Critical notifications
+            models.Index(
+                fields=['user', '-created_at', '-notif_id'],
+                name='notif_user_important_idx',
+                condition=models.Q(resolved_flag=False, priority__in=['High', 'Critical']),
+            ),
+            # Partial index holding only the notifications waiting for the email digest
+            models.Index(fields=['user', 'created_at'], name='notif_pending_digest_idx', condition=models.Q(emailed_at__isnull=True)),
+        ]
+        constraints = [
+            # Rows without dedupe_key (NULL) never conflict
+            models.UniqueConstraint(fields=['user', 'dedupe_key'], name='notif_user_dedupe_key_unique'),
+        ]
\ No newline at end of file
@@ -0,0 +1,57 @@
+from django.db import models
+from django.utils import timezone
+
+class OutboundEmail(models.Model):
+    """
+    This model represents an email waiting to be sent (the outbox).
+    Requests only insert rows; the `send_outbound_emails` worker sends them,
+    retrying with an exponential backoff when the SMTP server fails.
+    """
+    PENDING = 'pending'
+    SENT = 'sent'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),   # waiting for its (next) attempt
+        (SENT, 'Sent'),
+        (FAILED, 'Failed'),     # gave up after too many attempts
+    )
+
+    email_id = models.AutoField(primary_key=True, serialize=False, verbose_name='ID')
+    
+    # The subject of the email.
+    subject = models.CharField(max_length=255)
+    
+    # The plain text body, and the optional HTML alternative.
+    body = models.TextField()
+    html_body = models.TextField(null=True, blank=True)
+    
+    # The sender and the list of recipients.
+    from_email = models.CharField(max_length=255, null=True, blank=True)
+    to = models.JSONField(default=list)
+    
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    
+    # The number of failed attempts, and the error of the last one.
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    
+    # The date from which the email can be (re)tried.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    
+    created_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        """
+        This is the metadata for the OutboundEmail model.
+        """
+        db_table = 'OutboundEmails'
+        verbose_name_plural = "Outbound emails"
+        indexes = [
+            # Serves the polling of the worker
+            models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.to)} ({self.status})'
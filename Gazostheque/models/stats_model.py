@@ -0,0 +1,43 @@
+from django.db import models
+
+class MaterialStats(models.Model):
+    """
+    This model holds the pre-aggregated material counts shown on the dashboard.
+    Rows are kept up to date by the Materials signals (see signals.py) and can
+    be rebuilt from scratch with the `rebuild_material_stats` command.
+    """
+    TOTAL = 'total'
+    LAB = 'lab'
+    YEAR = 'year'
+    MONTH = 'month'
+    YEAR_LAB = 'year_lab'
+
+    # The dimension a row is counting over.
+    KIND_CHOICES = (
+        (TOTAL, 'Total'),         # single row with an empty key
+        (LAB, 'Lab'),             # key: lab destination
+        (YEAR, 'Year'),           # key: 'YYYY'
+        (MONTH, 'Month'),         # key: 'YYYY-MM'
+        (YEAR_LAB, 'Year & lab'), # key: 'YYYY|lab destination'
+    )
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    
+    # The value of the dimension.
+    key = models.CharField(max_length=120, blank=True, default='')
+    
+    # The number of materials in that bucket.
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        """
+        This is the metadata for the MaterialStats model.
+        """
+        db_table = 'MaterialStats'
+        verbose_name_plural = "Material stats"
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'key'], name='material_stats_kind_key_unique'),
+        ]
+
+    def __str__(self):
+        return f'{self.kind}:{self.key} = {self.count}'
@@ -0,0 +1,29 @@
+from django.db import models
+from django.utils import timezone
+
+class ResourceVersions(models.Model):
+    """
+    This model holds a version counter per API resource, bumped by signals on
+    every write, so that conditional GET requests can be answered from this
+    small table alone.
+
+    Keys: 'inventory', 'tags', 'owners', 'material:<pk>' and 'owner:<pk>'.
+    """
+    # The resource the version belongs to.
+    key = models.CharField(max_length=50, primary_key=True)
+    
+    # The number of writes the resource went through.
+    version = models.BigIntegerField(default=1)
+    
+    # The date and time of the last write.
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        """
+        This is the metadata for the ResourceVersions model.
+        """
+        db_table = 'ResourceVersions'
+        verbose_name_plural = "Resource versions"
+
+    def __str__(self):
+        return f'{self.key} v{self.version}'
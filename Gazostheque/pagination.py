@@ -0,0 +1,94 @@
+# File that defines the keyset (cursor) pagination used by the list endpoints
+import base64, binascii, json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from Gazostheque.custom_exception import InvalidCursorError
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+
+def encode_cursor(created_at, pk):
+    """
+    Function to build an opaque cursor from the last row of a page.
+
+    Args:
+        created_at (datetime): the creation date of the last row
+        pk (int): the primary key of the last row
+
+    Returns:
+        str: an url-safe token to pass back as `?cursor=`.
+    """
+    payload = json.dumps([created_at.isoformat(), pk])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Function to read back the (created_at, pk) pair stored in a cursor.
+
+    Raises:
+        InvalidCursorError: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        created_at, pk = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, TypeError, UnicodeError, binascii.Error):
+        raise InvalidCursorError("Invalid pagination cursor")
+    if created_at is None:
+        raise InvalidCursorError("Invalid pagination cursor")
+    return created_at, pk
+
+
+def get_page_size(value, default=DEFAULT_PAGE_SIZE):
+    """
+    Function to turn the `?limit=` query parameter into a bounded page size.
+    """
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def paginate_by_keyset(queryset, pk_field, cursor=None, limit=DEFAULT_PAGE_SIZE, date_field='created_at', descending=False):
+    """
+    Function to return one page of a `values()` queryset ordered by (date_field, pk_field).
+
+    Unlike OFFSET pagination, the cost of a page does not depend on how far
+    the client has scrolled: each page is a single range scan starting right
+    after the last row of the previous one.
+
+    Args:
+        queryset (QuerySet): a `values()` queryset containing date_field and pk_field
+        pk_field (str): the name of the primary key column, used as tie-breaker
+        cursor (str): (optional) the cursor returned with the previous page
+        limit (int): the maximum number of rows to return
+        descending (bool): (optional) newest rows first, e.g. for a feed
+
+    Returns:
+        (rows, next_cursor): the rows of the page and the cursor of the next page (None on the last page).
+    """
+    if descending:
+        queryset = queryset.order_by(f'-{date_field}', f'-{pk_field}')
+        after = 'lt'
+    else:
+        queryset = queryset.order_by(date_field, pk_field)
+        after = 'gt'
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{date_field}__{after}': created_at}) |
+            Q(**{date_field: created_at, f'{pk_field}__{after}': pk})
+        )
+
+    # Fetching one extra row tells us whether another page exists
+    rows = list(queryset[:limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][date_field], rows[-1][pk_field])
+    return rows, next_cursor
@@ -1,4 +1,5 @@
 from rest_framework import serializers 
+from django.urls import reverse
 from Gazostheque.models.material_model import Materials
 from Gazostheque.models.owner_model import Owners
 from Gazostheque.models.user_model import CustomUsers
@@ -11,10 +12,15 @@ from taggit.serializers import TagListSerializerField
 
 class MaterialSerializer(serializers.ModelSerializer):
     tags = TagListSerializerField(required=False)
+    qrcode_url = serializers.SerializerMethodField()
 
     class Meta:
         model = Materials
-        fields = '__all__'
+        exclude = ('qrcode', 'search_vector') # the image itself is served from qrcode_url
+
+    def get_qrcode_url(self, obj):
+        # Until the qrcode is generated, point to the endpoint generating it on demand
+        return obj.qrcode_url or reverse('material_qrcode', args=[obj.pk])
 
     def create(self, validated_data):
         tags = validated_data.pop('tags', [])
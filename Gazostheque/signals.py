@@ -2,26 +2,238 @@
 # File where we define tasks to be performed when receiving signals from a specific model
 # on a record update
 ### Can be combined but better separated for clarity
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_init, post_delete, m2m_changed, post_migrate
+from django.db.migrations.operations import AddField, CreateModel
 from django.dispatch import receiver
 from Gazostheque.models.notification_model import Notifications
 from Gazostheque.models.material_model import Materials
+from Gazostheque.controllers.stats_controller import get_stat_keys, adjust_material_stats, rebuild_material_stats
+from Gazostheque.controllers.tag_controller import get_tag_names, TAG_INDEX_TOPIC
+from Gazostheque.controllers.invalidation_controller import broadcast
+from Gazostheque.controllers.push_controller import get_notification_event, NOTIFICATION_TOPIC
+from Gazostheque.controllers.notification_controller import get_counter_contribution, adjust_notification_counters, notify_departures
+from Gazostheque.controllers.emails_controller import start_notification_digests
+from Gazostheque.controllers.search_controller import refresh_search_vectors, get_search_document, SEARCH_DOCUMENT_FIELDS
+from Gazostheque.controllers.version_controller import bump_versions, material_key, owner_key, INVENTORY, TAGS, OWNERS
+from Gazostheque.controllers.cache_controller import invalidate, material_detail_key, user_key, MATERIAL_LIST, OWNER_LITE_LIST, TAG_LIST, DASHBOARD
+from Gazostheque.models.user_model import CustomUsers
+from Gazostheque.models.owner_model import Owners
+from taggit.models import TaggedItem
 from django.utils import timezone
+from django.db import transaction
 
 
-# Function to send a notification to material owner when a material is updated for departure
+# Functions notifying the material owner when a material gets (a new) departure date
+@receiver(post_init, sender=Materials)
+def remember_material_departure(sender, instance, **kwargs):
+    if instance.pk is not None and 'date_depart' not in instance.get_deferred_fields():
+        instance._loaded_date_depart = instance.date_depart
+
 @receiver(post_save, sender=Materials)
 def notify_owner_on_material_departure(sender, instance, created, **kwargs):
-    if not created:
-        # Define the condition for "departure" here. Adjust as needed.
-        if instance.date_depart:  # assuming departure_ready is a boolean
-            Notifications.objects.create(
-                type="Event",
-                title="Material Ready for Departure",
-                priority="Medium",
-                description=f"The material '{instance.material_title}' is marked ready for departure.",
-                user=instance.owner  # assuming the material has an 'owner' field
-            )
+    # Only an actual change of the date is notified, not every save of the material
+    if instance.date_depart and (created or instance.date_depart != getattr(instance, '_loaded_date_depart', None)):
+        notify_departures([instance])
+    instance._loaded_date_depart = instance.date_depart
+
+# Functions keeping the dashboard statistics (MaterialStats) up to date
+@receiver(post_init, sender=Materials)
+def remember_material_stat_keys(sender, instance, **kwargs):
+    # Remember the buckets of a loaded material, to move it if its date or lab changes.
+    # Deferred fields are skipped to avoid a query (they cannot be changed by save() anyway)
+    deferred = instance.get_deferred_fields()
+    if instance.pk is not None and not deferred & {'created_at', 'lab_destination'}:
+        instance._stat_keys = get_stat_keys(instance.created_at, instance.lab_destination)
+
+@receiver(post_save, sender=Materials)
+def update_stats_on_material_save(sender, instance, created, **kwargs):
+    stat_keys = get_stat_keys(instance.created_at, instance.lab_destination)
+    if created:
+        adjust_material_stats(stat_keys, 1)
+    else:
+        previous_keys = getattr(instance, '_stat_keys', stat_keys)
+        if previous_keys != stat_keys:
+            adjust_material_stats([key for key in previous_keys if key not in stat_keys], -1)
+            adjust_material_stats([key for key in stat_keys if key not in previous_keys], 1)
+    instance._stat_keys = stat_keys
+
+@receiver(post_delete, sender=Materials)
+def update_stats_on_material_delete(sender, instance, **kwargs):
+    adjust_material_stats(get_stat_keys(instance.created_at, instance.lab_destination), -1)
+
+# Functions keeping the in-memory tag index of every worker up to date, once the change is committed
+def broadcast_tag_event(event):
+    transaction.on_commit(lambda: broadcast(TAG_INDEX_TOPIC, event))
+
+@receiver(post_save, sender=Materials)
+def index_material_on_create(sender, instance, created, **kwargs):
+    if created:
+        broadcast_tag_event({'op': 'add', 'material_id': instance.material_id})
+
+@receiver(post_delete, sender=Materials)
+def unindex_material_on_delete(sender, instance, **kwargs):
+    broadcast_tag_event({'op': 'delete', 'material_id': instance.material_id})
+
+@receiver(m2m_changed, sender=TaggedItem)
+def update_tag_index_on_tags_change(sender, instance, action, pk_set, **kwargs):
+    if not isinstance(instance, Materials):
+        return
+    if action == 'post_add' and pk_set:
+        broadcast_tag_event({'op': 'add', 'material_id': instance.material_id, 'tags': get_tag_names(pk_set)})
+    elif action == 'post_remove' and pk_set:
+        broadcast_tag_event({'op': 'remove', 'material_id': instance.material_id, 'tags': get_tag_names(pk_set)})
+    elif action == 'post_clear':
+        broadcast_tag_event({'op': 'remove', 'material_id': instance.material_id, 'tags': None})
+
+# Functions keeping the full-text search vectors up to date
+@receiver(post_init, sender=Materials)
+def remember_material_search_document(sender, instance, **kwargs):
+    if instance.pk is not None and not instance.get_deferred_fields() & set(SEARCH_DOCUMENT_FIELDS):
+        instance._search_document = get_search_document(instance)
+
+@receiver(post_save, sender=Materials)
+def refresh_search_vector_on_material_save(sender, instance, created, **kwargs):
+    # Saves not touching the searched fields (dates, flags...) keep their vector
+    search_document = get_search_document(instance)
+    if created or search_document != getattr(instance, '_search_document', None):
+        refresh_search_vectors(Materials.objects.filter(pk=instance.pk))
+    instance._search_document = search_document
+
+@receiver(post_save, sender=CustomUsers)
+def refresh_search_vectors_on_owner_rename(sender, instance, update_fields=None, **kwargs):
+    # Owner names are part of the search document of their materials
+    if update_fields is None or {'first_name', 'last_name'} & set(update_fields):
+        refresh_search_vectors(Materials.objects.filter(owner__user=instance))
+
+# Functions bumping the resource versions used by the conditional GET requests
+@receiver(post_init, sender=Materials)
+def remember_material_owner(sender, instance, **kwargs):
+    # Remember the owner of a loaded material, whose list also changes if the material moves to another owner
+    if instance.pk is not None and 'owner_id' not in instance.get_deferred_fields():
+        instance._loaded_owner_id = instance.owner_id
+
+@receiver(post_save, sender=Materials)
+def bump_versions_on_material_save(sender, instance, **kwargs):
+    bump_versions([
+        INVENTORY,
+        material_key(instance.pk),
+        owner_key(instance.owner_id),
+        owner_key(getattr(instance, '_loaded_owner_id', None)),
+    ])
+    instance._loaded_owner_id = instance.owner_id
+
+@receiver(post_delete, sender=Materials)
+def bump_versions_on_material_delete(sender, instance, **kwargs):
+    bump_versions([INVENTORY, TAGS, material_key(instance.pk), owner_key(instance.owner_id)])
+
+@receiver(m2m_changed, sender=TaggedItem)
+def bump_versions_on_tags_change(sender, instance, action, **kwargs):
+    if isinstance(instance, Materials) and action in ('post_add', 'post_remove', 'post_clear'):
+        bump_versions([INVENTORY, TAGS, material_key(instance.pk), owner_key(instance.owner_id)])
+
+@receiver(post_save, sender=Owners)
+@receiver(post_delete, sender=Owners)
+def bump_versions_on_owner_change(sender, instance, **kwargs):
+    bump_versions([OWNERS])
+
+@receiver(post_save, sender=CustomUsers)
+def bump_versions_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Owner names and pictures are part of the listings, the login date is not
+    if update_fields is None or not set(update_fields) <= {'last_login'}:
+        bump_versions([OWNERS])
+
+# Functions deleting the cached payloads built from the modified rows
+@receiver(post_save, sender=Materials)
+@receiver(post_delete, sender=Materials)
+def invalidate_cache_on_material_change(sender, instance, **kwargs):
+    invalidate(MATERIAL_LIST, DASHBOARD, TAG_LIST, material_detail_key(instance.pk))
+
+@receiver(post_save, sender=TaggedItem)
+@receiver(post_delete, sender=TaggedItem)
+def invalidate_cache_on_tag_change(sender, instance, **kwargs):
+    invalidate(MATERIAL_LIST, TAG_LIST, material_detail_key(instance.object_id))
+
+@receiver(post_save, sender=Owners)
+@receiver(post_delete, sender=Owners)
+def invalidate_cache_on_owner_change(sender, instance, **kwargs):
+    material_ids = Materials.objects.filter(owner=instance.pk).values_list('material_id', flat=True)
+    invalidate(OWNER_LITE_LIST, MATERIAL_LIST, *[material_detail_key(pk) for pk in material_ids])
+
+@receiver(post_save, sender=CustomUsers)
+def invalidate_cache_on_user_change(sender, instance, update_fields=None, **kwargs):
+    # Names, pictures and staff flags are part of the cached payloads, the login date is not
+    if update_fields is None or not set(update_fields) <= {'last_login'}:
+        material_ids = Materials.objects.filter(owner__user=instance.pk).values_list('material_id', flat=True)
+        invalidate(OWNER_LITE_LIST, MATERIAL_LIST, *[material_detail_key(pk) for pk in material_ids])
+
+@receiver(post_save, sender=CustomUsers)
+@receiver(post_delete, sender=CustomUsers)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # The user resolved from the session must reflect any change (roles, staff flag, password)
+    invalidate(user_key(instance.pk))
+
+# Functions keeping the notification counters (NotificationCounters) up to date
+@receiver(post_init, sender=Notifications)
+def remember_notification_contribution(sender, instance, **kwargs):
+    # Remember what a loaded notification counts for, to adjust the counters when it changes
+    if instance.pk is not None and not instance.get_deferred_fields() & {'user_id', 'read_flag', 'resolved_flag', 'priority'}:
+        instance._counted = (instance.user_id, get_counter_contribution(instance))
+
+@receiver(pre_save, sender=Notifications)
+def load_notification_contribution(sender, instance, **kwargs):
+    # Saved without having been loaded (built with its pk, or with deferred fields): the previous state is read from its row
+    if instance.pk is not None and (instance._state.adding or not hasattr(instance, '_counted')):
+        previous = Notifications.objects.filter(pk=instance.pk).only('user_id', 'read_flag', 'resolved_flag', 'priority').first()
+        if previous is not None:
+            instance._counted = (previous.user_id, get_counter_contribution(previous))
+
+@receiver(post_save, sender=Notifications)
+def update_counters_on_notification_save(sender, instance, created, **kwargs):
+    unread, important = get_counter_contribution(instance)
+    previous = getattr(instance, '_counted', None)
+    if created or previous is None:
+        adjust_notification_counters(instance.user_id, unread, important)
+    elif previous[0] != instance.user_id:
+        adjust_notification_counters(previous[0], -previous[1][0], -previous[1][1])
+        adjust_notification_counters(instance.user_id, unread, important)
+    else:
+        adjust_notification_counters(instance.user_id, unread - previous[1][0], important - previous[1][1])
+    instance._counted = (instance.user_id, (unread, important))
+
+@receiver(post_delete, sender=Notifications)
+def update_counters_on_notification_delete(sender, instance, **kwargs):
+    unread, important = get_counter_contribution(instance)
+    adjust_notification_counters(instance.user_id, -unread, -important, rebuild_missing=False)
+
+# Function pushing the new notifications to the open streams of their user, in every worker
+@receiver(post_save, sender=Notifications)
+def push_new_notification(sender, instance, created, **kwargs):
+    if created:
+        event = get_notification_event(instance)
+        transaction.on_commit(lambda: broadcast(NOTIFICATION_TOPIC, event))
+
+# Functions initializing the data of new features when the migration adding them is applied
+def get_applied_operations(plan):
+    # The operations a migrate run applied forwards
+    return [operation for migration, backwards in plan or [] if not backwards for operation in migration.operations]
+
+@receiver(post_migrate)
+def start_digests_on_emailed_at_added(sender, plan=None, **kwargs):
+    # The notifications existing before the digests were deployed are not emailed
+    if sender.name == 'Gazostheque' and any(
+        isinstance(operation, AddField) and operation.model_name_lower == 'notifications' and operation.name == 'emailed_at'
+        for operation in get_applied_operations(plan)
+    ):
+        start_notification_digests()
+
+@receiver(post_migrate)
+def backfill_stats_on_material_stats_created(sender, plan=None, **kwargs):
+    # The signals only count the materials saved from now on: the existing ones are counted once
+    if sender.name == 'Gazostheque' and any(
+        isinstance(operation, CreateModel) and operation.name_lower == 'materialstats'
+        for operation in get_applied_operations(plan)
+    ):
+        rebuild_material_stats()
 
 # @receiver(post_save, sender=Materials)
 # def notify_owner_on_departure_date_change(sender, instance, **kwargs):
@@ -0,0 +1,65 @@
+# File that defines the storage of the static files
+# collectstatic fingerprints every file (name.<hash>.ext) and writes gzip / brotli
+# variants next to the compressible ones, served by StaticFilesMiddleware.
+import gzip, os
+from urllib.parse import unquote, urlsplit
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+import brotli
+
+# Extensions worth compressing (images and fonts are already compressed)
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.map', '.svg', '.txt', '.html', '.xml', '.ico', '.ttf', '.eot')
+# Smaller files do not gain anything from compression
+MIN_COMPRESS_SIZE = 1024
+
+
+def get_compressed_variants(data):
+    """
+    Function to compress some content with the supported encodings.
+
+    Returns:
+        dict: file suffix -> compressed bytes, only for the encodings making the content smaller.
+    """
+    variants = {
+        '.gz': gzip.compress(data, compresslevel=9, mtime=0),
+        '.br': brotli.compress(data, quality=11),
+    }
+    return {suffix: content for suffix, content in variants.items() if len(content) < len(data)}
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage also writing the compressed variants of the collected files.
+    """
+    # Names missing from the manifest are hashed on the fly at runtime instead of raising
+    manifest_strict = False
+
+    def hashed_name(self, name, content=None, filename=None):
+        try:
+            return super().hashed_name(name, content, filename)
+        except ValueError:
+            if content is not None:
+                raise
+            # A file referenced by a collected file but missing from the build (e.g. a source map
+            # of the Next.js bundles): the reference keeps its name instead of failing collectstatic
+            return urlsplit(unquote(filename or name)).path.strip()
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in names:
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress(name)
+
+    def compress(self, name):
+        path = self.path(name)
+        if os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            return
+        with open(path, 'rb') as source:
+            data = source.read()
+        for suffix, content in get_compressed_variants(data).items():
+            with open(path + suffix, 'wb') as destination:
+                destination.write(content)
@@ -1,8 +1,125 @@
 # File to test the correct implementation of the database and models
 # Irrelevant for the whole project - just for test purpose
 
+import asyncio
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+from importlib import import_module
+import threading
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+import brotli
+from asgiref.sync import async_to_sync, sync_to_async
+from PIL import Image
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.apps import apps
+from django.db import connection, transaction, IntegrityError, migrations, models
+from django.db.models.signals import post_migrate
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.mail.backends.base import BaseEmailBackend
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from Gazostheque.controllers.materials_controller import render_qrcode, store_qrcode, lookup_materials_by_codes
+from Gazostheque.controllers.analytics_controller import get_grouped_analytics, parse_period
+from Gazostheque.controllers.tag_controller import tag_index, TAG_INDEX_TOPIC
+from Gazostheque.controllers.invalidation_controller import dispatch_notification, get_origin
+from Gazostheque.controllers.cache_controller import get_cache_stats, MATERIAL_DETAIL
+from Gazostheque.controllers.search_controller import search_material_ids
+from Gazostheque.controllers.stats_controller import get_dashboard_stats, rebuild_material_stats, adjust_material_stats
+from Gazostheque.controllers.version_controller import bump_versions
+from Gazostheque.controllers.notification_controller import get_notification_counts, notify_departures, delete_resolved_notifications
+from Gazostheque.controllers.reminder_controller import send_due_reminders
+from Gazostheque.controllers.outbox_controller import enqueue_email, send_pending_emails, claim_due_emails, MAX_ATTEMPTS, CLAIM_DURATION
+from Gazostheque.controllers.cas_controller import validate_ticket, provision_user
+from Gazostheque.controllers.user_controller import get_formatted_user
+from Gazostheque.controllers.emails_controller import send_registration_email, send_notification_digests
+from Gazostheque.controllers.push_controller import notification_events, broker
+from Gazostheque.controllers.session_controller import get_user_from_session_token, is_session_expired, clear_expired_sessions
+from Gazostheque.middleware import StaticFilesMiddleware
+from Gazostheque.asgi_handler import StreamingASGIHandler
+from Gazostheque.controllers.picture_controller import store_original_picture
+from Gazostheque.controllers.labels_controller import LABEL_COLUMNS, LABEL_ROWS, LABEL_SIZE, PAGE_MARGIN, PAGE_SIZE, MAX_LABELS_PER_SHEET
+from Gazostheque.upload_handlers import HashingFileUploadHandler, is_upload_too_large
+from Gazostheque.custom_exception import InvalidCursorError, SessionNotFoundError
+from Gazostheque.models.material_model import Materials
+from Gazostheque.models.notification_model import Notifications
+from Gazostheque.models.notification_counters_model import NotificationCounters
+from Gazostheque.models.outbound_email_model import OutboundEmail
+from Gazostheque.models.owner_model import Owners
+from Gazostheque.models.stats_model import MaterialStats
+from Gazostheque.models.version_model import ResourceVersions
+from Gazostheque.pagination import paginate_by_keyset, encode_cursor, decode_cursor
+
+def send_post_migrate(*operations):
+    """
+    Emit post_migrate as after applying a (deploy generated) migration of the app with these operations.
+    """
+    migration = migrations.Migration('0002_deploy', 'Gazostheque')
+    migration.operations = list(operations)
+    app_config = apps.get_app_config('Gazostheque')
+    post_migrate.send(sender=app_config, app_config=app_config, verbosity=0, interactive=False, using='default', apps=apps, plan=[(migration, False)])
+
+class FailingEmailBackend(BaseEmailBackend):
+    """
+    Email backend standing for an SMTP server refusing every message.
+    """
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError("SMTP server unavailable")
+
+
+class CountingEmailBackend(locmem.EmailBackend):
+    """
+    In-memory email backend counting the connections opened.
+    """
+    opened = 0
+
+    def open(self):
+        CountingEmailBackend.opened += 1
+        return True
+
+
+class FakeCasHandler(BaseHTTPRequestHandler):
+    """
+    Local CAS server validating the tickets starting with 'ST-valid'.
+    """
+    requests = []
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        FakeCasHandler.requests.append(query['ticket'][0])
+        if query['ticket'][0].startswith('ST-valid'):
+            body = (
+                '<cas:serviceResponse xmlns:cas="http://www.yale.edu/tp/cas"><cas:authenticationSuccess>'
+                '<cas:user>mcurie</cas:user><cas:attributes><cas:mail>Marie.Curie@univ.fr</cas:mail>'
+                '<cas:givenName>Marie</cas:givenName><cas:sn>Curie</cas:sn></cas:attributes>'
+                '</cas:authenticationSuccess></cas:serviceResponse>'
+            )
+        else:
+            body = '<cas:serviceResponse xmlns:cas="http://www.yale.edu/tp/cas"><cas:authenticationFailure code="INVALID_TICKET"/></cas:serviceResponse>'
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/xml')
+        self.end_headers()
+        self.wfile.write(body.encode('utf-8'))
+
+    def log_message(self, *args):
+        pass
+
 
 class UsersManagersTests(TestCase):
 
@@ -42,3 +159,926 @@ class UsersManagersTests(TestCase):
         with self.assertRaises(ValueError):
             User.objects.create_superuser(
                 email="super@user.com", password="foo", is_superuser=False)
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        created_at = timezone.now()
+        # Two materials share the same creation date to exercise the pk tie-breaker
+        for index in range(5):
+            Materials.objects.create(
+                material_title=f"Cylinder {index}",
+                created_at=created_at + timedelta(minutes=index // 2),
+            )
+
+    def test_pages_cover_every_row_once(self):
+        queryset = Materials.objects.values('material_id', 'created_at')
+        seen, cursor = [], None
+        while True:
+            rows, cursor = paginate_by_keyset(queryset, 'material_id', cursor=cursor, limit=2)
+            seen.extend(row['material_id'] for row in rows)
+            if cursor is None:
+                break
+        self.assertEqual(seen, list(Materials.objects.order_by('created_at', 'material_id').values_list('material_id', flat=True)))
+
+    def test_cursor_round_trip(self):
+        created_at = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor(created_at, 42)), (created_at, 42))
+        with self.assertRaises(InvalidCursorError):
+            decode_cursor("not-a-cursor")
+
+
+class QrcodeBlobStoreTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def test_identical_images_share_one_immutable_url(self):
+        url = store_qrcode(render_qrcode("https://example.org/gazostheque/public/1"))
+        self.assertEqual(url, store_qrcode(render_qrcode("https://example.org/gazostheque/public/1")))
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertIn('immutable', response['Cache-Control'])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_qrcode_is_generated_on_first_request(self):
+        material = Materials.objects.create(material_title="Cylinder")
+        self.assertIsNone(material.qrcode_url)
+
+        response = self.client.get(f'/api/materials/{material.pk}/qrcode/')
+        material.refresh_from_db()
+        self.assertRedirects(response, material.qrcode_url, fetch_redirect_response=False)
+        self.assertEqual(self.client.get(material.qrcode_url).status_code, 200)
+
+    def test_regenerated_qrcodes_are_not_served_stale(self):
+        user = get_user_model().objects.create_user(email="owner@user.com", password="foo")
+        material = Materials.objects.create(material_title="Cylinder", owner=Owners.objects.create(user=user))
+        self.client.force_login(user)
+        self.addCleanup(cache.clear)
+        urls = [f'/api/materials/{material.pk}/', f'/api/materials/owner/{material.owner_id}/']
+        self.client.get(f'/api/materials/{material.pk}/qrcode/')
+        etags = [self.client.get(url)['ETag'] for url in urls]
+
+        with override_settings(QRCODE_BASE_URL="https://new.example.org/gazostheque/public/"):
+            call_command('generate_qrcodes', '--force', '--workers', '1', stdout=io.StringIO())
+        material.refresh_from_db()
+        for url, etag in zip(urls, etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(material.qrcode_url, response.content.decode())
+
+
+class LabelSheetTests(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = get_user_model().objects.create_superuser(email="admin@user.com", password="foo")
+        self.client.force_login(self.user)
+        self.ids = [Materials.objects.create(material_title=f"Cylinder {index}").pk for index in range(LABEL_COLUMNS * LABEL_ROWS + 1)]
+
+    def test_sheets_are_rendered_as_pdf_or_single_png_page(self):
+        response = self.client.post('/api/materials/labels', {'ids': self.ids}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertEqual(response['X-Page-Count'], '2')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+        # Out of range pages are clamped to the last one
+        response = self.client.post('/api/materials/labels', {'ids': self.ids, 'format': 'png', 'page': 9}, content_type='application/json')
+        self.assertEqual(response['Content-Type'], 'image/png')
+        with Image.open(io.BytesIO(response.content)) as page:
+            self.assertEqual(page.size, PAGE_SIZE)
+            # Only the first label slot of the second page is filled
+            self.assertNotEqual(page.getpixel((PAGE_MARGIN + 1, PAGE_MARGIN + 1)), (255, 255, 255))
+            self.assertEqual(page.getpixel((PAGE_MARGIN + LABEL_SIZE[0] + 1, PAGE_MARGIN + 1)), (255, 255, 255))
+
+    def test_invalid_label_requests_are_refused(self):
+        for data, message in (
+            ({'ids': ['a']}, 'Material ids must be integers'),
+            ({'ids': '12'}, '`ids` must be a list of material ids'),
+            ({'ids': self.ids, 'format': 'png', 'page': 'last'}, '`page` must be an integer'),
+            ({'ids': self.ids, 'format': 'gif'}, 'Unsupported sheet format'),
+            ({'ids': []}, f'Between 1 and {MAX_LABELS_PER_SHEET} materials can be printed at once'),
+            ({'ids': list(range(MAX_LABELS_PER_SHEET + 1))}, f'Between 1 and {MAX_LABELS_PER_SHEET} materials can be printed at once'),
+        ):
+            response = self.client.post('/api/materials/labels', data, content_type='application/json')
+            self.assertEqual((response.status_code, response.json()['message']), (400, message))
+
+    def test_admin_action_prints_the_selected_materials(self):
+        response = self.client.post('/admin/Gazostheque/materials/', {'action': 'print_labels', '_selected_action': self.ids[:2]})
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+
+
+class MaterialStatsTests(TestCase):
+
+    def stats(self):
+        return dict(((kind, key), count) for kind, key, count in MaterialStats.objects.values_list('kind', 'key', 'count'))
+
+    def test_signals_keep_stats_in_sync(self):
+        liphy = Materials.objects.create(material_title="Argon", lab_destination='LIPhy')
+        Materials.objects.create(material_title="Helium", lab_destination='IGE')
+        Materials.objects.create(material_title="Old", lab_destination='IGE', created_at=timezone.now() - timedelta(days=800))
+
+        liphy = Materials.objects.get(pk=liphy.pk)
+        liphy.lab_destination = 'IGE'
+        liphy.save()
+        Materials.objects.get(material_title="Helium").delete()
+
+        dashboard = get_dashboard_stats()
+        self.assertEqual(dashboard['total']['total_count'], 2)
+        self.assertEqual(dashboard['by_lab'], {'LIPhy': 0, 'IGE': 2})
+        self.assertEqual(dashboard['by_year_and_lab']['series'], [{'name': 'IGE', 'data': [1, 1]}])
+
+        incremental = {key: count for key, count in self.stats().items() if count}
+        rebuild_material_stats()
+        self.assertEqual(incremental, {key: count for key, count in self.stats().items() if count})
+
+
+    def test_existing_materials_are_counted_when_the_table_is_created(self):
+        Materials.objects.create(material_title="Argon", lab_destination='LIPhy')
+        Materials.objects.create(material_title="Helium", lab_destination='IGE')
+        # Materials created before the statistics were deployed
+        MaterialStats.objects.all().delete()
+
+        send_post_migrate(migrations.CreateModel('MaterialStats', fields=[('id', models.AutoField(primary_key=True))]))
+        self.assertEqual(get_dashboard_stats()['by_lab'], {'LIPhy': 1, 'IGE': 1})
+
+    def test_new_buckets_created_concurrently_keep_every_count(self):
+        # A concurrent transaction committed the bucket after this one found it missing
+        MaterialStats.objects.create(kind=MaterialStats.MONTH, key='2031-01', count=1)
+        adjust_material_stats([(MaterialStats.MONTH, '2031-01'), (MaterialStats.YEAR, '2031')], 1)
+        adjust_material_stats([(MaterialStats.YEAR, '2031')], 1)
+        self.assertEqual(self.stats()[(MaterialStats.MONTH, '2031-01')], 2)
+        self.assertEqual(self.stats()[(MaterialStats.YEAR, '2031')], 2)
+
+class GroupedAnalyticsTests(TestCase):
+
+    def test_groups_buckets_and_previous_period(self):
+        period_start, period_end = parse_period('2024-01-01', '2024-12-31')
+        for created_at, lab in [('2024-03-10', 'LIPhy'), ('2024-03-20', 'LIPhy'), ('2024-07-01', 'IGE'), ('2023-05-05', 'IGE')]:
+            Materials.objects.create(
+                material_title="Cylinder",
+                lab_destination=lab,
+                created_at=timezone.make_aware(datetime.fromisoformat(created_at + 'T12:00')),
+            )
+
+        result = get_grouped_analytics('lab_destination', 'month', period_start, period_end, compare=True)
+        self.assertEqual(result['buckets'], ['2024-03-01', '2024-07-01'])
+        self.assertEqual(result['series'], [
+            {'name': 'IGE', 'data': [0, 1], 'total': 1},
+            {'name': 'LIPhy', 'data': [2, 0], 'total': 2},
+        ])
+        self.assertEqual(result['previous']['total'], 1)
+        self.assertEqual(result['percentage_diff'], 200.0)
+
+
+class TagIndexTests(TestCase):
+
+    def setUp(self):
+        # The index lives in the worker memory, outside of the test transaction
+        tag_index.reset()
+        self.addCleanup(tag_index.reset)
+        self.argon = Materials.objects.create(material_title="Argon")
+        self.argon.tags.add('gas', 'inert')
+        self.oxygen = Materials.objects.create(material_title="Oxygen")
+        self.oxygen.tags.add('gas', 'oxidizer')
+
+    def test_boolean_queries_and_facets(self):
+        ids, facets = tag_index.search(all_tags=['GAS'])
+        self.assertEqual(ids, [self.argon.pk, self.oxygen.pk])
+        self.assertEqual(facets, {'gas': 2, 'inert': 1, 'oxidizer': 1})
+
+        self.assertEqual(tag_index.search(any_tags=['inert', 'oxidizer'])[0], [self.argon.pk, self.oxygen.pk])
+        self.assertEqual(tag_index.search(all_tags=['gas'], excluded_tags=['inert'])[0], [self.oxygen.pk])
+        self.assertEqual(tag_index.search(all_tags=['unknown']), ([], {}))
+
+    def test_index_follows_tag_changes(self):
+        tag_index.search(all_tags=['gas'])  # loads the index
+        with self.captureOnCommitCallbacks(execute=True):
+            helium = Materials.objects.create(material_title="Helium")
+            helium.tags.add('gas')
+            self.argon.tags.remove('gas')
+            self.oxygen.delete()
+
+        self.assertEqual(tag_index.search(all_tags=['gas'])[0], [helium.pk])
+        self.assertEqual(tag_index.search(excluded_tags=['gas'])[0], [self.argon.pk])
+
+    def test_rolled_back_changes_are_not_indexed(self):
+        tag_index.search(all_tags=['gas'])  # loads the index
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Materials.objects.create(material_title="Helium").tags.add('gas')
+                    self.argon.tags.remove('gas')
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+
+        self.assertEqual(tag_index.search(all_tags=['gas'])[0], [self.argon.pk, self.oxygen.pk])
+
+    def test_events_of_other_workers_are_applied(self):
+        tag_index.search(all_tags=['gas'])  # loads the index
+        event = {'topic': TAG_INDEX_TOPIC, 'payload': {'op': 'remove', 'material_id': self.argon.pk, 'tags': ['gas']}}
+
+        # Events sent by this worker were already applied locally
+        dispatch_notification(json.dumps({**event, 'origin': get_origin()}))
+        self.assertEqual(tag_index.search(all_tags=['gas'])[0], [self.argon.pk, self.oxygen.pk])
+
+        dispatch_notification(json.dumps({**event, 'origin': 'other-host:1'}))
+        self.assertEqual(tag_index.search(all_tags=['gas'])[0], [self.oxygen.pk])
+
+
+class MaterialSearchTests(TestCase):
+
+    def test_search_matches_titles_codes_and_owner_names(self):
+        user = get_user_model().objects.create_user(email="marie@user.com", password="foo", first_name="Marie", last_name="Curie")
+        owner = Owners.objects.create(user=user)
+        argon = Materials.objects.create(material_title="Argon", codeBarres="AR-1234", owner=owner)
+        Materials.objects.create(material_title="Helium", codeBarres="HE-5678")
+
+        self.assertEqual(search_material_ids("argon", 10), [argon.pk])
+        self.assertEqual(search_material_ids("Curie", 10), [argon.pk])
+
+    def test_vectors_are_only_refreshed_when_searched_fields_change(self):
+        material = Materials.objects.create(material_title="Argon")
+        with mock.patch('Gazostheque.signals.refresh_search_vectors') as refresh:
+            material = Materials.objects.get(pk=material.pk)
+            material.date_depart = timezone.now()
+            material.save()
+            refresh.assert_not_called()
+
+            material.codeBarres = "AR-1234"
+            material.save()
+            refresh.assert_called_once()
+
+
+class CodeLookupTests(TestCase):
+
+    def test_codes_resolve_on_barcode_or_order_code(self):
+        argon = Materials.objects.create(material_title="Argon", codeBarres="3760001", codeCommande="CMD-1")
+        helium = Materials.objects.create(material_title="Helium", codeBarres="3760002", codeCommande="CMD-1")
+
+        matches = lookup_materials_by_codes(["3760001", "CMD-1", "unknown"])
+        self.assertEqual([row['material_id'] for row in matches["3760001"]], [argon.pk])
+        self.assertEqual([row['material_id'] for row in matches["CMD-1"]], [argon.pk, helium.pk])
+        self.assertEqual(matches["unknown"], [])
+        self.assertNotIn('qrcode', matches["3760001"][0])
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        user = get_user_model().objects.create_user(email="owner@user.com", password="foo")
+        self.owner = Owners.objects.create(user=user)
+        self.material = Materials.objects.create(material_title="Argon", owner=self.owner)
+        self.client.force_login(user)
+        self.url = f'/api/materials/owner/{self.owner.pk}/'
+
+    def test_not_modified_until_the_owner_materials_change(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Materials of other owners do not invalidate the list
+        Materials.objects.create(material_title="Helium")
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.material.material_title = "Argon 5.0"
+        self.material.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+    def test_missing_versions_are_created_without_losing_bumps(self):
+        ResourceVersions.objects.create(key='tags', version=4)
+        bump_versions(['tags', 'material:999'])
+        bump_versions(['material:999'])
+        versions = dict(ResourceVersions.objects.filter(key__in=['tags', 'material:999']).values_list('key', 'version'))
+        self.assertEqual(versions, {'tags': 5, 'material:999': 2})
+
+# Shared Redis cache configuration, where sessions are also cached
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+class QueryCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        user = get_user_model().objects.create_user(email="owner@user.com", password="foo", first_name="Marie")
+        self.owner = Owners.objects.create(user=user)
+        self.material = Materials.objects.create(material_title="Argon", owner=self.owner)
+        self.client.force_login(user)
+        self.url = f'/api/materials/{self.material.pk}/'
+
+    def test_detail_is_cached_until_a_related_row_changes(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # version lookup only: session, user and material come from the cache
+            self.assertEqual(self.client.get(self.url).json()['material_title'], "Argon")
+
+        self.material.material_title = "Argon 5.0"
+        self.material.save()
+        self.assertEqual(self.client.get(self.url).json()['material_title'], "Argon 5.0")
+
+        self.owner.user.first_name = "Pierre"
+        self.owner.user.save()
+        self.assertEqual(self.client.get(self.url).json()['owner_details']['first_name'], "Pierre")
+
+        self.assertEqual(get_cache_stats()[MATERIAL_DETAIL], {'hits': 1, 'misses': 3, 'hit_ratio': 0.25})
+
+
+class SessionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.user = get_user_model().objects.create_user(email="user@user.com", password="foo")
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cached_db')
+    def test_session_user_is_resolved_from_the_cache(self):
+        self.client.force_login(self.user)
+        session_key = self.client.session.session_key
+        get_user_from_session_token(session_key)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_user_from_session_token(session_key), self.user)
+            self.assertFalse(is_session_expired(session_key))
+
+        self.user.first_name = "Marie"
+        self.user.save()
+        self.assertEqual(get_user_from_session_token(session_key).first_name, "Marie")
+        with self.assertRaises(SessionNotFoundError):
+            is_session_expired('unknown')
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-1'},
+        'other_worker': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-2'},
+    })
+    def test_logout_on_another_worker_is_seen_without_shared_cache(self):
+        self.assertEqual(settings.SESSION_ENGINE, 'django.contrib.sessions.backends.db')
+        self.client.force_login(self.user)
+        session_key = self.client.session.session_key
+        self.assertEqual(get_user_from_session_token(session_key), self.user)
+
+        # Logout handled by another worker, with its own local cache
+        with override_settings(SESSION_CACHE_ALIAS='other_worker'):
+            import_module(settings.SESSION_ENGINE).SessionStore(session_key).delete()
+
+        with self.assertRaises(SessionNotFoundError):
+            get_user_from_session_token(session_key)
+
+    def test_expired_sessions_are_swept_by_batches(self):
+        expired = timezone.now() - timedelta(days=1)
+        Session.objects.bulk_create(Session(session_key=f'expired{i}', session_data='', expire_date=expired) for i in range(5))
+        Session.objects.create(session_key='valid', session_data='', expire_date=timezone.now() + timedelta(days=1))
+
+        self.assertEqual(clear_expired_sessions(batch_size=2), 5)
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), ['valid'])
+
+
+class NotificationFeedTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="user@user.com", password="foo")
+        material = Materials.objects.create(material_title="Argon")
+        start = timezone.now()
+        self.notifications = [
+            Notifications.objects.create(user=self.user, description=str(i), priority=priority, material=material, created_at=start + timedelta(minutes=i))
+            for i, priority in enumerate(['Low', 'High', 'Critical', 'High'])
+        ]
+        self.notifications[3].mark_as_resolved()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(self.user)
+
+    def test_feed_is_paginated_newest_first(self):
+        url = f'/api/notifications/{self.user.pk}/'
+        with self.assertNumQueries(3):  # session, user (not cached yet) and a single feed query joining the material
+            page = self.client.get(url, {'limit': 3}).json()
+        self.assertEqual([row['description'] for row in page['results']], ['3', '2', '1'])
+        self.assertEqual(page['results'][0]['material_title'], "Argon")
+
+        page = self.client.get(url, {'limit': 3, 'cursor': page['next_cursor']}).json()
+        self.assertEqual([row['description'] for row in page['results']], ['0'])
+        self.assertIsNone(page['next_cursor'])
+
+    def test_important_view_lists_unresolved_high_and_critical(self):
+        page = self.client.get(f'/api/notifications/important/{self.user.pk}/').json()
+        self.assertEqual([row['description'] for row in page['results']], ['2', '1'])
+
+
+class NotificationCountersTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="user@user.com", password="foo")
+
+    def test_counters_follow_notification_changes(self):
+        low = Notifications.objects.create(user=self.user, description="low")
+        critical = Notifications.objects.create(user=self.user, description="critical", priority='Critical')
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 2, 'important': 1})
+
+        Notifications.objects.get(pk=critical.pk).mark_as_read()
+        Notifications.objects.get(pk=critical.pk).mark_as_resolved()
+        low.delete()
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 0, 'important': 0})
+
+    def test_missing_or_inconsistent_counters_are_rebuilt(self):
+        Notifications.objects.create(user=self.user, description="high", priority='High')
+        NotificationCounters.objects.all().delete()
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 1, 'important': 1})
+
+        NotificationCounters.objects.update(unread=-3)
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 1, 'important': 1})
+
+    def test_saves_of_unloaded_notifications_adjust_the_counters(self):
+        high = Notifications.objects.create(user=self.user, description="high", priority='High')
+        with CaptureQueriesContext(connection) as queries:
+            Notifications(pk=high.pk, user=self.user, description="high", priority='High', read_flag=True).save()
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 0, 'important': 1})
+
+    def test_counts_are_only_readable_by_their_user_and_staff(self):
+        Notifications.objects.create(user=self.user, description="high", priority='High')
+        other = get_user_model().objects.create_user(email="other@user.com", password="foo")
+        url = f'/api/notifications/{self.user.pk}/counts'
+
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).json(), {'unread': 1, 'important': 1})
+        self.client.force_login(other)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(get_user_model().objects.create_superuser(email="admin@user.com", password="foo"))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_bulk_changes_run_as_single_statements(self):
+        other = get_user_model().objects.create_user(email="other@user.com", password="foo")
+        Notifications.objects.bulk_create(
+            Notifications(user=user, description=str(i), priority='High') for i in range(50) for user in (self.user, other)
+        )
+        url = f'/api/notifications/{self.user.pk}/bulk'
+        self.client.force_login(self.user)
+
+        response = self.client.post(url, {'action': 'resolve'}, content_type='application/json')
+        self.assertEqual(response.json(), {'updated': 50, 'counts': {'unread': 50, 'important': 0}})
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(url)
+        self.assertEqual(response.json()['deleted'], 50)
+        self.assertEqual(sum(query['sql'].startswith('DELETE') for query in queries), 1)
+        self.assertEqual(NotificationCounters.objects.get(user=self.user).unread, 0)
+        self.assertEqual(Notifications.objects.filter(user=other, resolved_flag=False).count(), 50)
+
+        self.assertEqual(self.client.delete(f'/api/notifications/{other.pk}/bulk').status_code, 403)
+
+    def test_deleting_many_notifications_does_not_run_per_row_queries(self):
+        Notifications.objects.bulk_create(
+            Notifications(user=self.user, description=str(i), resolved_flag=True) for i in range(250)
+        )
+        Notifications.objects.create(user=self.user, description="kept")
+        # One DELETE and one counters rebuild (an aggregate and an update_or_create), with their savepoints
+        with self.assertNumQueries(8):
+            self.assertEqual(delete_resolved_notifications(self.user.pk), 250)
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 1, 'important': 0})
+
+
+class NotificationPushTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="user@user.com", password="foo")
+        self.other = get_user_model().objects.create_user(email="other@user.com", password="foo")
+
+    def create_notification(self, user, description):
+        with self.captureOnCommitCallbacks(execute=True):
+            Notifications.objects.create(user=user, description=description)
+
+    def test_new_notifications_are_pushed_to_the_streams_of_their_user(self):
+        async def read_stream():
+            stream = notification_events(self.user.pk, heartbeat=1)
+            self.assertTrue((await stream.__anext__()).startswith('retry:'))  # subscribed
+            await sync_to_async(self.create_notification)(self.other, "not for me")
+            await sync_to_async(self.create_notification)(self.user, "hello")
+            event = await stream.__anext__()
+            keep_alive = await stream.__anext__()
+            await stream.aclose()
+            return event, keep_alive
+
+        event, keep_alive = async_to_sync(read_stream)()
+        self.assertTrue(event.startswith('event: notification\n'))
+        self.assertEqual(json.loads(event.split('data: ')[1])['description'], "hello")
+        self.assertEqual(keep_alive, ': keep-alive\n\n')
+        self.assertEqual(broker.stream_count(), 0)
+
+    def test_stream_requires_authentication(self):
+        self.assertEqual(self.client.get('/api/notifications/stream').status_code, 401)
+
+
+
+# The stream runs in the threads of the ASGI handler, which need the committed user and session
+class NotificationStreamTests(TransactionTestCase):
+
+    def test_disconnected_streams_release_their_subscription(self):
+        user = get_user_model().objects.create_user(email="user@user.com", password="foo")
+        self.client.force_login(user)
+        cookie = f'{settings.SESSION_COOKIE_NAME}={self.client.cookies[settings.SESSION_COOKIE_NAME].value}'
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': '/api/notifications/stream', 'raw_path': b'/api/notifications/stream', 'query_string': b'',
+            'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+
+        async def open_and_close_stream():
+            incoming = asyncio.Queue()
+            sent = []
+            first_event = asyncio.Event()
+
+            async def send(message):
+                sent.append(message)
+                if message.get('body'):
+                    first_event.set()
+
+            await incoming.put({'type': 'http.request', 'body': b'', 'more_body': False})
+            handler = asyncio.ensure_future(StreamingASGIHandler()(scope, incoming.get, send))
+            await asyncio.wait_for(first_event.wait(), 5)
+            streams = broker.stream_count()
+            await incoming.put({'type': 'http.disconnect'})
+            await asyncio.wait_for(handler, 5)
+            return sent, streams
+
+        sent, streams = async_to_sync(open_and_close_stream)()
+        self.assertEqual(sent[0]['status'], 200)
+        self.assertEqual(streams, 1)
+        self.assertEqual(broker.stream_count(), 0)
+
+class DepartureNotificationTests(TestCase):
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email="owner@user.com", password="foo")
+        self.owner = Owners.objects.create(user=self.user)
+
+    def test_departure_is_notified_once_per_date(self):
+        material = Materials.objects.create(material_title="Argon", owner=self.owner)
+        self.assertFalse(Notifications.objects.exists())
+
+        material.date_depart = timezone.now()
+        material.save()
+        material.material_title = "Argon 5.0"
+        material.save()
+        material = Materials.objects.get(pk=material.pk)
+        material.save()
+        self.assertEqual(Notifications.objects.filter(user=self.user, material=material).count(), 1)
+
+        material.date_depart += timedelta(days=1)
+        material.save()
+        self.assertEqual(Notifications.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 2, 'important': 0})
+
+    def test_departure_dates_with_other_offsets_are_the_same_departure(self):
+        departure = datetime(2026, 3, 2, 9, 30, tzinfo=dt_timezone.utc)
+        material = Materials.objects.create(material_title="Argon", owner=self.owner, date_depart=departure)
+        material.date_depart = departure.astimezone(dt_timezone(timedelta(hours=1)))
+        self.assertEqual(notify_departures([material]), [])
+        self.assertEqual(Notifications.objects.filter(user=self.user).count(), 1)
+
+    def test_bulk_departures_are_inserted_in_one_statement(self):
+        departure = timezone.now()
+        materials = [Materials.objects.create(material_title=str(i), owner=self.owner, date_depart=departure) for i in range(5)]
+        Notifications.objects.all().delete()
+
+        with CaptureQueriesContext(connection) as queries:
+            created = notify_departures(materials)
+        self.assertEqual(len(created), 5)
+        self.assertEqual(sum('INTO "Notifications"' in query['sql'] for query in queries), 1)
+        self.assertEqual(notify_departures(materials), [])
+
+    def test_only_the_rows_of_the_call_are_reported(self):
+        departure = timezone.now()
+        material = Materials.objects.create(material_title="Argon", owner=self.owner, date_depart=departure)
+        Notifications.objects.all().delete()
+        # Another notification of the user, created at the very same time
+        Notifications.objects.create(user=self.user, description="other", created_at=timezone.now())
+
+        with mock.patch('django.utils.timezone.now', return_value=Notifications.objects.get().created_at):
+            created = notify_departures([material])
+        self.assertEqual([notification.material_id for notification in created], [material.pk])
+        self.assertEqual(get_notification_counts(self.user.pk), {'unread': 2, 'important': 0})
+
+
+@override_settings(REMINDER_LEAD_DAYS={'default': {'departure': 3, 'arrival': 1}, 'IGE': {'departure': 10}})
+class ReminderTests(TestCase):
+
+    def test_due_reminders_are_created_once_per_lab_window(self):
+        owner = Owners.objects.create(user=get_user_model().objects.create_user(email="owner@user.com", password="foo"))
+        now = timezone.now()
+        soon = Materials.objects.create(material_title="Soon", owner=owner, lab_destination="LIPhy", date_arrivee=now + timedelta(hours=12))
+        Materials.objects.create(material_title="Later", owner=owner, lab_destination="LIPhy", date_arrivee=now + timedelta(days=5))
+        ige = Materials.objects.create(material_title="IGE", owner=owner, lab_destination="IGE", date_arrivee=now + timedelta(hours=1))
+        Notifications.objects.all().delete()
+        ige.date_depart = now + timedelta(days=7)
+        Materials.objects.filter(pk=ige.pk).update(date_depart=ige.date_depart)
+
+        self.assertEqual(send_due_reminders(now), 3)
+        self.assertEqual(send_due_reminders(now), 0)
+        self.assertEqual(
+            set(Notifications.objects.values_list('material', 'title')),
+            {(soon.pk, 'Upcoming Material Arrival'), (ige.pk, 'Upcoming Material Arrival'), (ige.pk, 'Upcoming Material Departure')},
+        )
+
+
+class OutboxTests(TestCase):
+
+    def test_queued_emails_are_sent_by_the_worker(self):
+        send_registration_email({'email': 'new@user.com', 'first_name': 'Marie'})
+        self.assertEqual(len(mail.outbox), 0)
+
+        self.assertEqual(send_pending_emails(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ['new@user.com'])
+        self.assertEqual(OutboundEmail.objects.get().status, OutboundEmail.SENT)
+        self.assertEqual(send_pending_emails(), (0, 0))
+
+    @override_settings(EMAIL_BACKEND='Gazostheque.tests.FailingEmailBackend')
+    def test_failed_emails_are_retried_with_backoff(self):
+        email = enqueue_email("Subject", "Body", ['user@user.com'])
+        now = timezone.now()
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            self.assertEqual(send_pending_emails(now=now), (0, 1))
+            email.refresh_from_db()
+            self.assertEqual(email.attempts, attempt)
+            # Not retried before its backoff delay
+            self.assertEqual(send_pending_emails(now=now), (0, 0))
+            now = email.next_attempt_at
+        self.assertEqual(email.status, OutboundEmail.FAILED)
+
+    def test_claimed_emails_are_skipped_by_other_workers(self):
+        enqueue_email("Subject", "Body", ['user@user.com'])
+        now = timezone.now()
+        self.assertEqual(len(claim_due_emails(10, now)), 1)
+        self.assertEqual(send_pending_emails(now=now), (0, 0))
+        # The claim of a crashed worker expires
+        self.assertEqual(send_pending_emails(now=now + CLAIM_DURATION), (1, 0))
+
+
+@override_settings(EMAIL_BACKEND='Gazostheque.tests.CountingEmailBackend')
+class NotificationDigestTests(TestCase):
+
+    def test_digests_are_queued_per_user_and_sent_over_one_connection(self):
+        users = [get_user_model().objects.create_user(email=f"user{i}@user.com", password="foo") for i in range(3)]
+        for user in users:
+            Notifications.objects.create(user=user, title="First", description="one")
+            Notifications.objects.create(user=user, title="Second", description="two")
+        Notifications.objects.create(user=users[0], title="Read", description="read", read_flag=True)
+        CountingEmailBackend.opened = 0
+
+        self.assertEqual(send_notification_digests(batch_size=2), 3)
+        self.assertEqual(CountingEmailBackend.opened, 0)
+        self.assertEqual(send_pending_emails(), (3, 0))
+        self.assertEqual(CountingEmailBackend.opened, 1)
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [user.email for user in users])
+        self.assertIn("Second", mail.outbox[0].body)
+        self.assertNotIn("Read", mail.outbox[0].body)
+
+        # Nothing pending: no digest queued and no SMTP connection opened
+        self.assertEqual(send_notification_digests(), 0)
+        self.assertEqual(send_pending_emails(), (0, 0))
+        self.assertEqual(CountingEmailBackend.opened, 1)
+
+    def test_first_digest_after_deploy_skips_existing_notifications(self):
+        user = get_user_model().objects.create_user(email="user@user.com", password="foo")
+        Notifications.objects.create(user=user, title="Old", description="before the digests")
+        send_post_migrate(migrations.AddField('notifications', 'emailed_at', models.DateTimeField(null=True, blank=True, editable=False)))
+        Notifications.objects.create(user=user, title="New", description="after the digests")
+
+        self.assertEqual(send_notification_digests(), 1)
+        send_pending_emails()
+        self.assertIn("New", mail.outbox[0].body)
+        self.assertNotIn("Old", mail.outbox[0].body)
+
+
+class CasValidationTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeCasHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        FakeCasHandler.requests = []
+        override = override_settings(CAS_SERVER_URL=f'http://127.0.0.1:{self.server.server_port}')
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_login_provisions_the_user_once(self):
+        response = self.client.get('/api/cas/validate/', {'ticket': 'ST-valid-1'})
+        self.assertRedirects(response, '/gazostheque/', fetch_redirect_response=False)
+        user = get_user_model().objects.get(email='marie.curie@univ.fr')
+        self.assertEqual((user.first_name, user.last_name), ("Marie", "Curie"))
+        self.assertTrue(self.client.session['new'])
+        self.assertEqual(OutboundEmail.objects.count(), 1)
+
+        Owners.objects.create(user=user, contact="0102")
+        with self.assertNumQueries(1):  # the user and its owner record
+            user, created = provision_user(validate_ticket('ST-valid-2', 'http://testserver/api/cas/validate/'))
+            self.assertEqual(get_formatted_user(user)['owner_contact'], "0102")
+        self.assertFalse(created)
+
+    def test_replayed_and_invalid_tickets_are_rejected(self):
+        service_url = 'http://testserver/api/cas/validate/'
+        self.assertEqual(validate_ticket('ST-valid-3', service_url)['mail'], 'Marie.Curie@univ.fr')
+        self.assertIsNone(validate_ticket('ST-valid-3', service_url))
+        self.assertIsNone(validate_ticket('ST-forged', service_url))
+        self.assertEqual(FakeCasHandler.requests, ['ST-valid-3', 'ST-forged'])
+
+        response = self.client.get('/api/cas/validate/', {'ticket': 'ST-forged'})
+        self.assertTrue(response['Location'].endswith('/cas/login?service=http://testserver/api/cas/validate/'))
+
+        # The callback url replayed by someone else does not log them in
+        self.client.get('/api/cas/validate/', {'ticket': 'ST-valid-4'})
+        self.client.logout()
+        response = self.client.get('/api/cas/validate/', {'ticket': 'ST-valid-4'})
+        self.assertTrue(response['Location'].endswith('/cas/login?service=http://testserver/api/cas/validate/'))
+        self.assertNotIn('_auth_user_id', self.client.session)
+
+
+@override_settings(PROFILE_PICTURE_WORKERS=0)
+class ProfilePictureTests(TestCase):
+
+    def setUp(self):
+        media_root, upload_dir = tempfile.TemporaryDirectory(), tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.addCleanup(upload_dir.cleanup)
+        self.settings_override = override_settings(MEDIA_ROOT=media_root.name, PROFILE_PICTURE_UPLOAD_DIR=upload_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.user = get_user_model().objects.create_user(email="user@user.com", password="foo")
+        self.client.force_login(self.user)
+        self.url = f'/api/users/upload_pictures/{self.user.pk}/'
+
+    def upload(self, content, name='picture.png'):
+        return self.client.post(self.url, {'image': SimpleUploadedFile(name, content)})
+
+    def test_upload_stores_hashed_square_variants(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), 'red').save(buffer, format='PNG')
+        self.assertEqual(self.upload(buffer.getvalue()).status_code, 202)
+
+        self.user.refresh_from_db()
+        paths = json.loads(self.user.profil_pic)
+        self.assertEqual(len(paths), 4)
+        self.assertTrue(paths[0].endswith('.webp'))
+        with Image.open(os.path.join(settings.MEDIA_ROOT, paths[0])) as display, Image.open(os.path.join(settings.MEDIA_ROOT, paths[3])) as thumbnail:
+            self.assertEqual((display.size, display.format), ((256, 256), 'WEBP'))
+            self.assertEqual((thumbnail.size, thumbnail.format), ((64, 64), 'JPEG'))
+
+        # Same picture, same immutable names, found by the hash of the upload without rendering it again
+        with mock.patch('Gazostheque.controllers.picture_controller.render_variants') as render_variants:
+            self.assertEqual(self.upload(buffer.getvalue()).status_code, 200)
+        render_variants.assert_not_called()
+        self.assertEqual(os.listdir(settings.PROFILE_PICTURE_UPLOAD_DIR), [])
+        self.user.refresh_from_db()
+        self.assertEqual(json.loads(self.user.profil_pic), paths)
+
+    def test_invalid_pictures_are_rejected(self):
+        self.assertEqual(self.upload(b'not an image', 'picture.jpg').status_code, 400)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.profil_pic)
+
+    def test_originals_and_their_metadata_are_not_kept(self):
+        exif = Image.Exif()
+        exif[0x8825] = {2: (45.0, 11.0, 0.0)}  # GPS latitude
+        buffer = io.BytesIO()
+        Image.new('RGB', (300, 300), 'blue').save(buffer, format='JPEG', exif=exif)
+        self.assertEqual(self.upload(buffer.getvalue(), 'photo.jpg').status_code, 202)
+
+        self.assertEqual(os.listdir(settings.PROFILE_PICTURE_UPLOAD_DIR), [])
+        self.user.refresh_from_db()
+        self.assertEqual(len(os.listdir(settings.MEDIA_ROOT)), 1)  # the blob store only
+        for path in json.loads(self.user.profil_pic):
+            self.assertTrue(path.startswith('blobs/avatars/'))
+            with Image.open(os.path.join(settings.MEDIA_ROOT, path)) as variant:
+                self.assertEqual(dict(variant.getexif()), {})
+
+    def test_streamed_originals_are_moved_not_copied(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (100, 100), 'green').save(buffer, format='PNG')
+        uploaded_file = TemporaryUploadedFile('picture.png', 'image/png', len(buffer.getvalue()), None)
+        self.addCleanup(uploaded_file.close)
+        uploaded_file.write(buffer.getvalue())
+        uploaded_file.seek(0)
+        temporary_path = uploaded_file.temporary_file_path()
+
+        path = store_original_picture(uploaded_file)
+        self.assertFalse(os.path.exists(temporary_path))
+        with open(path, 'rb') as original:
+            self.assertEqual(original.read(), buffer.getvalue())
+
+    def test_oversized_uploads_are_refused_early(self):
+        request = RequestFactory().post('/', {'image': SimpleUploadedFile('big.png', b'0' * 4096)})
+        request.upload_handlers = [HashingFileUploadHandler(request, max_size=1024)]
+        self.assertEqual(len(request.FILES), 0)
+        self.assertTrue(is_upload_too_large(request))
+
+        request = RequestFactory().post('/', {'image': SimpleUploadedFile('small.png', b'0' * 512)})
+        request.upload_handlers = [HashingFileUploadHandler(request, max_size=1024)]
+        self.assertEqual(request.FILES['image'].sha256, hashlib.sha256(b'0' * 512).hexdigest())
+        self.assertFalse(is_upload_too_large(request))
+
+
+class StaticFilesTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # collectstatic (with brotli at its highest level) runs once for the class
+        directories = [tempfile.TemporaryDirectory() for _ in range(3)]
+        for directory in directories:
+            cls.addClassCleanup(directory.cleanup)
+        source, static_root, media_root = (directory.name for directory in directories)
+        with open(os.path.join(source, 'app.js'), 'w') as script:
+            script.write('console.log("gazostheque");\n' * 200)
+        # A Next.js build chunk, collected under chunks/
+        os.makedirs(os.path.join(source, 'chunks'))
+        with open(os.path.join(source, 'chunks', '103-c4fc3e6619552383.js'), 'w') as chunk:
+            chunk.write('self.webpackChunk=[];\n' * 100)
+        # A bundle referencing a file missing from the build
+        with open(os.path.join(source, 'app.css'), 'w') as stylesheet:
+            stylesheet.write('body { background: url("media/missing.png"); }\n')
+        cls.video = os.path.join('blobs', 'avatars', 'ab', 'ab' * 32 + '.webm')
+        for name in (cls.video, os.path.join('blobs', 'uploads', 'cd', 'cd' * 32 + '.jpg')):
+            os.makedirs(os.path.dirname(os.path.join(media_root, name)))
+            with open(os.path.join(media_root, name), 'wb') as media:
+                media.write(bytes(range(256)) * 4)
+        cls.settings_override = override_settings(STATICFILES_DIRS=[source], STATIC_ROOT=static_root, MEDIA_ROOT=media_root)
+        cls.settings_override.enable()
+        cls.addClassCleanup(cls.settings_override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.hashed_name = staticfiles_storage.stored_name('app.js')
+
+    def test_collectstatic_serves_precompressed_fingerprinted_files(self):
+        for suffix in ('.gz', '.br'):
+            self.assertTrue(os.path.isfile(os.path.join(settings.STATIC_ROOT, self.hashed_name + suffix)))
+
+        response = self.client.get(f'/static/{self.hashed_name}', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(int(response['Content-Length']), os.path.getsize(os.path.join(settings.STATIC_ROOT, self.hashed_name + '.gz')))
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode(), 'console.log("gazostheque");\n' * 200)
+        gzip_etag = response['ETag']
+
+        response = self.client.get(f'/static/{self.hashed_name}', HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(b''.join(response.streaming_content)).decode(), 'console.log("gazostheque");\n' * 200)
+        # Each representation has its own validator
+        self.assertEqual(len({gzip_etag, response['ETag'], self.client.get(f'/static/{self.hashed_name}')['ETag']}), 3)
+        self.assertEqual(self.client.get(f'/static/{self.hashed_name}', HTTP_IF_NONE_MATCH=gzip_etag).status_code, 200)
+
+        response = self.client.get('/static/app.js', HTTP_ACCEPT_ENCODING='gzip;q=0')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertIn('must-revalidate', response['Cache-Control'])
+        self.assertEqual(self.client.get('/static/app.js', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_missing_references_keep_their_name(self):
+        with staticfiles_storage.open(staticfiles_storage.stored_name('app.css')) as stylesheet:
+            self.assertIn(b'url("media/missing.png")', stylesheet.read())
+
+    def test_next_chunks_are_immutable(self):
+        response = self.client.get('/static/chunks/103-c4fc3e6619552383.js')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_only_public_media_is_served_with_range_requests(self):
+        url = '/assets/' + self.video.replace(os.sep, '/')
+        response = self.client.get(url, HTTP_RANGE='bytes=256-511')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 256-511/1024')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(b''.join(response.streaming_content), bytes(range(256)))
+
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=-24')['Content-Range'], 'bytes 1000-1023/1024')
+        self.assertEqual(self.client.get(url, HTTP_RANGE='bytes=2048-').status_code, 416)
+
+        # Uploads and anything outside the public folders are not served
+        middleware = StaticFilesMiddleware(lambda request: None)
+        request = RequestFactory().get('/assets/')
+        public = tuple(settings.PUBLIC_MEDIA_PREFIXES)
+        self.assertIsNone(middleware.serve(request, settings.MEDIA_ROOT, 'blobs/uploads/cd/' + 'cd' * 32 + '.jpg', public))
+        self.assertIsNone(middleware.serve(request, settings.MEDIA_ROOT, 'blobs/avatars/../uploads/cd/' + 'cd' * 32 + '.jpg', public))
+        self.assertIsNone(middleware.serve(request, settings.MEDIA_ROOT, '../secret', public))
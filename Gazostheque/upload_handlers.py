@@ -0,0 +1,74 @@
+# File that defines how uploaded files are received
+# Uploads are streamed to a temporary file while being hashed, never held in memory,
+# and refused as soon as they exceed the size limit of the endpoint.
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler, StopUpload
+
+# Room left for the multipart headers and the other fields when checking the announced body size
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+class HashingFileUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler writing each file to a temporary file and computing its sha256 on the way.
+    The uploaded files get a `sha256` attribute, used to deduplicate them (see get_uploaded_digest).
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_size or settings.FILE_UPLOAD_MAX_SIZE
+        self.too_large = False
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # The announced size is enough to refuse the upload before reading it
+        self.too_large = content_length > self.max_size + MULTIPART_OVERHEAD
+
+    def new_file(self, *args, **kwargs):
+        if self.too_large:
+            self.reject()
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.reject()
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.sha256 = self.hasher.hexdigest()
+        return uploaded_file
+
+    def reject(self):
+        if self.request is not None:
+            self.request.upload_size_exceeded = True
+        # Stop reading the body, the files received so far are discarded
+        raise StopUpload(connection_reset=True)
+
+
+def limit_upload_size(max_size):
+    """
+    Decorator setting the maximum size of the files uploaded to a view.
+    Must be applied outside of @api_view, before the body gets parsed; the view then
+    answers 413 when `is_upload_too_large(request)`.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            request.upload_handlers = [HashingFileUploadHandler(request, max_size)]
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def is_upload_too_large(request):
+    """
+    Function to check whether an upload of the request was refused for its size.
+    """
+    return getattr(request, 'upload_size_exceeded', False)
@@ -1,10 +1,11 @@
 # File that links the api endpoint to their designated url path
-from django.urls import path 
+from django.urls import path, re_path
 
 from Gazostheque.views import user_views
 from Gazostheque.views import owner_views
 from Gazostheque.views import material_views
 from Gazostheque.views import notification_views
+from Gazostheque.views import cache_views
 
 urlpatterns = [
     # Endpoint for adding new bottle / cylinder
@@ -12,6 +13,8 @@ urlpatterns = [
     path('materials/', material_views.get_materials),
     path('materials/<int:pk>/', material_views.material_detail),
     path('materials/owner/<int:pk>/', material_views.material_list_per_owner),
+    path('materials/<int:pk>/qrcode/', material_views.material_qrcode, name='material_qrcode'),
+    path('materials/labels', material_views.material_labels),
 
     path('materials/latest/', material_views.latest_material),
     path('material/<int:pk>/events/', material_views.material_events_detail),
@@ -20,10 +23,20 @@ urlpatterns = [
 
     path('materials/count-by-lab', material_views.get_materials_by_lab),
     path('materials/bar-chart', material_views.get_materials_by_year_and_lab),
+    path('materials/dashboard', material_views.get_dashboard),
+    path('materials/analytics', material_views.get_analytics),
 
     # TAGS
     path('materials/tags', material_views.get_all_tags),
     path('materials/search-by-tags', material_views.search_tags),
+    path('materials/search', material_views.search_materials),
+
+    # SCANNERS
+    path('materials/by-code', material_views.materials_by_codes),
+    path('materials/by-code/<str:code>', material_views.material_by_code),
+
+    # QRCODES (content-addressed, immutable)
+    re_path(r'^qrcodes/(?P<digest>[0-9a-f]{64})\.png$', material_views.qrcode_image, name='qrcode_image'),
 
     
     path('owners/', owner_views.owner_list),
@@ -35,11 +48,16 @@ urlpatterns = [
     path('users/upload_pictures/<int:pk>/', user_views.upload_profile_pic),
 
     path('notifications/', notification_views.notification_operations),
+    path('notifications/stream', notification_views.notification_stream),
     path('notifications/<int:pk>/', notification_views.user_notification_list),
+    path('notifications/<int:pk>/counts', notification_views.user_notification_counts),
+    path('notifications/<int:pk>/bulk', notification_views.user_notification_bulk),
     path('notifications/important/<int:pk>/', notification_views.user_important_notification_list),
 
     path('cas/login/', user_views.cas_login, name='cas_ng_login'),
     path('cas/validate/', user_views.cas_validate, name='cas_validate'),
     path('cas/logout/', user_views.cas_logout, name='cas_logout'),
     path('session/', user_views.session_data, name='session_data'), 
+
+    path('cache/stats', cache_views.cache_stats),
 ]
@@ -0,0 +1,16 @@
+from django.http.response import JsonResponse
+from rest_framework import status
+from rest_framework.decorators import api_view
+from django.contrib.auth.decorators import login_required
+
+from Gazostheque.controllers.cache_controller import get_cache_stats
+
+@login_required
+@api_view(['GET'])
+def cache_stats(request):
+    """
+    Return the hits and misses of each cached entry family (staff only).
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'message': 'You do not have permission to see the cache statistics'}, status=status.HTTP_403_FORBIDDEN)
+    return JsonResponse(get_cache_stats())
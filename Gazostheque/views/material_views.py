@@ -1,10 +1,14 @@
 import  base64, json
 import os
-from django.db.models import Count, F
-from django.utils.timezone import now
+from datetime import timedelta
+from django.db.models import Count, F, Q
+from django.utils.timezone import now, get_current_timezone
 from django.conf import settings
-from django.shortcuts import render
-from django.http.response import JsonResponse
+from django.shortcuts import render, redirect
+from django.http import Http404
+from django.http.response import JsonResponse, StreamingHttpResponse, FileResponse, HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
 from django.contrib.auth.decorators import login_required
 
 from rest_framework.parsers import JSONParser 
@@ -12,9 +16,19 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
-from Gazostheque.models.material_model import Materials
+from Gazostheque.models.material_model import Materials, LAB_CHOICES
 from Gazostheque.serializers import MaterialSerializer
 from Gazostheque.controllers.materials_controller import *
+from Gazostheque.custom_exception import InvalidCursorError
+from Gazostheque.pagination import paginate_by_keyset, get_page_size
+from Gazostheque.controllers.blob_controller import get_blob_path
+from Gazostheque.controllers.tag_controller import tag_index
+from Gazostheque.controllers.cache_controller import get_or_build, material_detail_key, MATERIAL_LIST, MATERIAL_DETAIL, TAG_LIST, DASHBOARD
+from Gazostheque.controllers.version_controller import conditional_on_versions, material_key, owner_key, INVENTORY, TAGS, OWNERS
+from Gazostheque.controllers.search_controller import search_material_ids
+from Gazostheque.controllers.stats_controller import get_dashboard_stats, get_total_payload, get_year_and_lab_payload
+from Gazostheque.controllers.analytics_controller import get_grouped_analytics, parse_period, GROUP_BY_FIELDS, BUCKET_FUNCTIONS
+from Gazostheque.controllers.labels_controller import render_label_sheet, SHEET_FORMATS, MAX_LABELS_PER_SHEET
 
 from django.db.models.functions import ExtractYear
 from taggit.models import Tag
@@ -24,27 +38,37 @@ from django.contrib.postgres.aggregates import ArrayAgg
 
 @login_required
 @api_view(['GET'])
+@conditional_on_versions(lambda request: [INVENTORY, OWNERS])
 def get_materials(request):
-    # materials = Materials.objects.all()
-    materials = Materials.objects.all().prefetch_related('tags')
-    
-    selected_inventory = materials.values(
-        'material_id',
-        'material_title',
-        'team',
-        'origin',
-        'size',
-        'codeBarres',
-        'date_arrivee',
-        'date_depart',
-        owner_first_name=F('owner__user__first_name'),
-        owner_last_name=F('owner__user__last_name'),
-        owner_email=F('owner__user__email'),
-        owner_profil=F('owner__user__profil_pic')
-    ).annotate(
-        tags=ArrayAgg('tags__name', distinct=True)  # This adds all tag names as an array
-    )
-    return JsonResponse(list(selected_inventory), safe=False)
+    """
+    Return the inventory listing.
+
+    Without parameters the whole inventory is returned as a JSON array, as before.
+    `?limit=` and/or `?cursor=` return one page ordered by (created_at, material_id)
+    along with the cursor of the next page. `?stream=json|ndjson` streams every row
+    from a server-side cursor so memory stays bounded whatever the inventory size.
+    """
+    inventory = get_inventory_values(Materials.objects.all())
+
+    stream_format = request.GET.get('stream')
+    if stream_format:
+        if stream_format not in STREAM_FORMATS:
+            return JsonResponse({'message': 'Unsupported stream format'}, status=status.HTTP_400_BAD_REQUEST)
+        return StreamingHttpResponse(stream_inventory(inventory, stream_format), content_type=STREAM_FORMATS[stream_format])
+
+    if 'cursor' in request.GET or 'limit' in request.GET:
+        try:
+            rows, next_cursor = paginate_by_keyset(
+                inventory,
+                'material_id',
+                cursor=request.GET.get('cursor'),
+                limit=get_page_size(request.GET.get('limit')),
+            )
+        except InvalidCursorError as e:
+            return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({'results': rows, 'next_cursor': next_cursor})
+
+    return JsonResponse(get_or_build(MATERIAL_LIST, lambda: list(inventory)), safe=False)
 
 # @login_required
 # @api_view(['POST'])
@@ -62,68 +86,170 @@ def create_material(request):
         return on_create_material(request)
 
 @api_view(['GET'])
+@conditional_on_versions(lambda request: [TAGS])
 def get_all_tags(request):
     """
     Return all distinct tags used in Materials.
     """
-    tags = Tag.objects.filter(materials__isnull=False).values_list('name', flat=True).distinct()
-    return Response({'tags': list(tags)})
+    return Response({'tags': get_or_build(TAG_LIST, tag_index.tag_names)})
 
 @api_view(['GET'])
 def search_tags(request):
     """
-    Filter materials by selected tags (must match all).
+    Filter materials by tags, using the in-memory tag index.
+
+    `tags` lists the tags the materials must all match, `any` tags of which at
+    least one must match and `exclude` tags that must not match (all comma
+    separated). The response also counts, for each tag, the matching materials carrying it.
     """
-    tags = request.GET.get('tags', '')
-    if not tags:
+    def get_tag_list(param):
+        return [tag.strip() for tag in request.GET.get(param, '').split(',') if tag.strip()]
+
+    tag_list = get_tag_list('tags')
+    any_list = get_tag_list('any')
+    excluded_list = get_tag_list('exclude')
+    if not (tag_list or any_list or excluded_list):
         return Response({'results': []})
 
-    tag_list = [tag.strip() for tag in tags.split(',') if tag.strip()]
-    materials = Materials.objects.all().prefetch_related('tags')
-
-    # Filter by tags - must match ALL tags
-    for tag in tag_list:
-        materials = materials.filter(tags__name=tag)
-
-    inventory = materials.values(
-        'material_id',
-        'material_title',
-        'team',
-        'origin',
-        'size',
-        'codeBarres',
-        'date_arrivee',
-        'date_depart',
-        'tags',
-        owner_first_name=F('owner__user__first_name'),
-        owner_last_name=F('owner__user__last_name'),
-        owner_email=F('owner__user__email'),
-        owner_profil=F('owner__user__profil_pic')
-    ).annotate(
-        tags=ArrayAgg('tags__name', distinct=True)
-    )
-    return Response({'results': list(inventory), 'searched_tags': tag_list})
+    material_ids, facets = tag_index.search(tag_list, any_list, excluded_list)
+    inventory = get_inventory_values(Materials.objects.filter(pk__in=material_ids))
+    return Response({'results': list(inventory), 'searched_tags': tag_list, 'facets': facets})
+
+@login_required
+@api_view(['GET'])
+def search_materials(request):
+    """
+    Search materials by title, team, origin, order code, barcode and owner names.
+    Results are ranked by relevance and paginated with `page` and `limit`.
+    """
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return JsonResponse({'results': [], 'page': 1, 'has_next': False})
+
+    limit = get_page_size(request.GET.get('limit'), default=20)
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+
+    # One extra id tells whether a next page exists
+    material_ids = search_material_ids(query, limit + 1, (page - 1) * limit)
+    has_next = len(material_ids) > limit
+    material_ids = material_ids[:limit]
+
+    rows = {row['material_id']: row for row in get_inventory_values(Materials.objects.filter(pk__in=material_ids))}
+    return JsonResponse({
+        'results': [rows[pk] for pk in material_ids if pk in rows],
+        'page': page,
+        'has_next': has_next,
+    })
+
+@login_required
+@api_view(['GET'])
+def material_by_code(request, code):
+    """
+    Return the materials whose barcode or order code is the scanned code.
+    """
+    materials = lookup_materials_by_codes([code])[code]
+    if not materials:
+        return JsonResponse({'message': 'No material found for this code'}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(materials, safe=False)
+
+@login_required
+@api_view(['POST'])
+def materials_by_codes(request):
+    """
+    Resolve a batch of scanned codes at once. Expects {"codes": [...]}.
+    """
+    codes = request.data.get('codes', [])
+    if not isinstance(codes, list) or len(codes) > MAX_CODES_PER_LOOKUP:
+        return JsonResponse({'message': f'Expected a list of at most {MAX_CODES_PER_LOOKUP} codes'}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches = lookup_materials_by_codes([str(code).strip() for code in codes])
+    return JsonResponse({
+        'results': {code: materials for code, materials in matches.items() if materials},
+        'not_found': [code for code, materials in matches.items() if not materials],
+    })
+
+@api_view(['GET'])
+def material_qrcode(request, pk):
+    """
+    Redirect to the qrcode image of a material, generating it on first request.
+    """
+    try:
+        material = Materials.objects.only('material_id', 'qrcode_url').get(pk=pk)
+    except Materials.DoesNotExist:
+        return JsonResponse({'message': 'The material does not exist'}, status=status.HTTP_404_NOT_FOUND)
+    return redirect(get_material_qrcode_url(material))
+
+@condition(etag_func=lambda request, digest: digest)
+def qrcode_image(request, digest):
+    """
+    Serve a qrcode from the blob store.
+    The url embeds the hash of the image, so the response can be cached forever.
+    """
+    path = get_blob_path(QRCODE_NAMESPACE, digest, 'png')
+    if request.method not in ('GET', 'HEAD') or not os.path.exists(path):
+        raise Http404('The qrcode does not exist')
+
+    response = FileResponse(open(path, 'rb'), content_type='image/png')
+    patch_cache_control(response, public=True, max_age=31536000, immutable=True)
+    return response
+
+
+@login_required
+@api_view(['POST'])
+def material_labels(request):
+    """
+    Return a printable sheet with the qrcode labels of a list of materials.
+    Expects {"ids": [...], "format": "pdf" | "png", "page": n (png only)}.
+    """
+    data = request.data if isinstance(request.data, dict) else {}
+    ids = data.get('ids', [])
+    if not isinstance(ids, list):
+        return JsonResponse({'message': '`ids` must be a list of material ids'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        material_ids = [int(pk) for pk in ids]
+    except (TypeError, ValueError):
+        return JsonResponse({'message': 'Material ids must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        page = int(data.get('page', 1))
+    except (TypeError, ValueError):
+        return JsonResponse({'message': '`page` must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
 
+    sheet_format = data.get('format', 'pdf')
+    if sheet_format not in SHEET_FORMATS:
+        return JsonResponse({'message': 'Unsupported sheet format'}, status=status.HTTP_400_BAD_REQUEST)
+    if not material_ids or len(material_ids) > MAX_LABELS_PER_SHEET:
+        return JsonResponse({'message': f'Between 1 and {MAX_LABELS_PER_SHEET} materials can be printed at once'}, status=status.HTTP_400_BAD_REQUEST)
 
+    sheet, page_count = render_label_sheet(material_ids, sheet_format, page)
+    response = HttpResponse(sheet, content_type=SHEET_FORMATS[sheet_format])
+    response['Content-Disposition'] = f'attachment; filename="labels.{sheet_format}"'
+    response['X-Page-Count'] = page_count
+    return response
 
 @api_view(['GET', 'PUT', 'DELETE'])
+@conditional_on_versions(lambda request, pk: [material_key(pk), OWNERS])
 def material_detail(request, pk):
     """
     Retrieve, update or delete a material instance.
     """
-    try: 
-        material = get_material(pk)
-    except Materials.DoesNotExist: 
-        return JsonResponse({'message': 'The material does not exist'}, status=status.HTTP_404_NOT_FOUND) 
-
     if request.method == 'GET': 
         try:
-            details_data = get_detailed_material(pk)
+            details_data = get_or_build(material_detail_key(pk), lambda: get_detailed_material(pk), MATERIAL_DETAIL)
             return JsonResponse(details_data)
+        except Http404:
+            return JsonResponse({'message': 'The material does not exist'}, status=status.HTTP_404_NOT_FOUND) 
         except Exception as e:
             return JsonResponse({'message': 'Error fetching material details!'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-    elif request.method == 'PUT': 
+    try: 
+        material = get_material(pk)
+    except Materials.DoesNotExist: 
+        return JsonResponse({'message': 'The material does not exist'}, status=status.HTTP_404_NOT_FOUND) 
+
+    if request.method == 'PUT': 
         # Check if user is admin or owner
         user = request.user
         is_admin = user.is_staff or user.role == 'admin'
@@ -154,6 +280,7 @@ def material_detail(request, pk):
    
 @login_required
 @api_view(['GET'])
+@conditional_on_versions(lambda request, pk: [owner_key(pk)])
 def material_list_per_owner(request, pk):
     materials = Materials.objects.filter(owner=pk)
         
@@ -186,52 +313,27 @@ def material_events_lite(request, pk):
 @login_required
 @api_view(['GET'])
 def get_total_count(request):
-    # Total materials count
-    materials_count = Materials.objects.count()
-    
-    # Current month/year for monthly comparison
-    current_month = now().month
-    current_year = now().year
-    
-    # Materials added this month
-    materials_added_this_month = Materials.objects.filter(
-        created_at__month=current_month,
-        created_at__year=current_year
-    ).count()
-    
-    # Materials added last month
-    last_month = current_month - 1 if current_month > 1 else 12
-    last_month_year = current_year if current_month > 1 else current_year - 1
-    materials_added_last_month = Materials.objects.filter(
-        created_at__month=last_month,
-        created_at__year=last_month_year
-    ).count()
-    
-    # Calculate percentage difference
-    if materials_added_last_month > 0:
-        percentage_diff = ((materials_added_this_month - materials_added_last_month) / 
-                         materials_added_last_month) * 100
-    else:
-        percentage_diff = 0
-    
-    return JsonResponse({
-        'total_count': materials_count,
-        'current_month_count': materials_added_this_month,
-        'percentage_diff': round(percentage_diff, 1),
-        'is_positive': percentage_diff >= 0
-    })
+    # Month boundaries in the local time zone, compared as a range so that the created_at index is usable
+    month_start = now().astimezone(get_current_timezone()).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    last_month_start = (month_start - timedelta(days=1)).replace(day=1)
+    next_month_start = (month_start + timedelta(days=32)).replace(day=1)
+
+    # Total, this month and last month counts in a single query
+    counts = Materials.objects.aggregate(
+        total=Count('material_id'),
+        current_month=Count('material_id', filter=Q(created_at__gte=month_start, created_at__lt=next_month_start)),
+        last_month=Count('material_id', filter=Q(created_at__gte=last_month_start, created_at__lt=month_start)),
+    )
+    return JsonResponse(get_total_payload(counts['total'], counts['current_month'], counts['last_month']))
 
 @login_required
 @api_view(['GET'])
 def get_materials_by_lab(request):
-    # Get count of materials for each lab
-    liphy_count = Materials.objects.filter(lab_destination='LIPhy').count()
-    ige_count = Materials.objects.filter(lab_destination='IGE').count()
-    
-    return JsonResponse({
-        'LIPhy': liphy_count,
-        'IGE': ige_count
-    })
+    # Get count of materials for each lab in a single GROUP BY
+    counts = dict(
+        Materials.objects.values_list('lab_destination').annotate(count=Count('material_id')).order_by()
+    )
+    return JsonResponse({lab: counts.get(lab, 0) for lab, _ in LAB_CHOICES})
 
 
 @login_required
@@ -247,39 +349,42 @@ def get_materials_by_year_and_lab(request):
         }]
     }
     """
-    # Execute the equivalent of your PostgreSQL query using Django ORM
     materials = Materials.objects.annotate(
         year=ExtractYear('created_at')
-    ).values('year', 'lab_destination').annotate(
+    ).values_list('year', 'lab_destination').annotate(
         count=Count('material_id')
-    ).order_by('year', 'lab_destination')
-    
-    # Get all unique years and labs from the query results
-    years = sorted({item['year'] for item in materials})
-    labs = sorted({item['lab_destination'] for item in materials if item['lab_destination']})
-    
-    # Initialize the result structure
-    result = {
-        'years': years,
-        'series': []
-    }
+    ).order_by()
     
-    # For each lab, create a data series with counts for each year
-    for lab in labs:
-        lab_data = {
-            'name': lab,
-            'data': []
-        }
-        
-        for year in years:
-            # Find the count for this lab/year combination
-            count = next(
-                (item['count'] for item in materials 
-                 if item['year'] == year and item['lab_destination'] == lab),
-                0  # Default to 0 if no entry exists
-            )
-            lab_data['data'].append(count)
-        
-        result['series'].append(lab_data)
-    
-    return JsonResponse(result)
\ No newline at end of file
+    return JsonResponse(get_year_and_lab_payload(materials))
+
+@login_required
+@api_view(['GET'])
+def get_analytics(request):
+    """
+    Count materials per group and per time bucket over a period.
+
+    Query parameters: group_by (lab_destination, team, origin, levRisk, owner),
+    bucket (day, week, month, year), start / end ('YYYY-MM-DD', last year by
+    default) and compare=true to add the totals of the previous period.
+    """
+    group_by = request.GET.get('group_by', 'lab_destination')
+    bucket = request.GET.get('bucket', 'month')
+    if group_by not in GROUP_BY_FIELDS or bucket not in BUCKET_FUNCTIONS:
+        return JsonResponse({'message': 'Unsupported group_by or bucket'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        period_start, period_end = parse_period(request.GET.get('start'), request.GET.get('end'))
+    except ValueError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    compare = request.GET.get('compare', '').lower() in ('1', 'true', 'yes')
+    return JsonResponse(get_grouped_analytics(group_by, bucket, period_start, period_end, compare))
+
+@login_required
+@api_view(['GET'])
+def get_dashboard(request):
+    """
+    Return the payloads of /materials/count/, /materials/count-by-lab and
+    /materials/bar-chart at once, read from the pre-aggregated statistics.
+    """
+    return JsonResponse(get_or_build(DASHBOARD, get_dashboard_stats))
@@ -10,15 +10,39 @@ from django.contrib.auth.decorators import login_required
 
 from Gazostheque.models.notification_model import Notifications
 from Gazostheque.serializers import NotificationSerializer
+from Gazostheque.controllers.notification_controller import *
+from Gazostheque.controllers.user_controller import get_cached_user
+from Gazostheque.controllers.push_controller import notification_events, get_stream_user_id
+from django.contrib.auth import get_user_model
+from django.utils.dateparse import parse_datetime
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from Gazostheque.custom_exception import InvalidCursorError
+from Gazostheque.pagination import paginate_by_keyset, get_page_size
+
+
+def paginated_notifications(request, notifications):
+    """
+    Function to return one page of notifications, newest first.
+    `?cursor=` is the next_cursor of the previous page, `?limit=` the page size.
+    """
+    try:
+        rows, next_cursor = paginate_by_keyset(
+            get_notification_values(notifications),
+            'notif_id',
+            cursor=request.GET.get('cursor'),
+            limit=get_page_size(request.GET.get('limit')),
+            descending=True,
+        )
+    except InvalidCursorError as e:
+        return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({'results': rows, 'next_cursor': next_cursor})
 
 @login_required
 @api_view(['GET', 'POST', 'DELETE'])
 def notification_operations(request):
     if request.method == 'GET':
-        notifications = Notifications.objects.all().order_by('-created_at')
-        notification_serializer = NotificationSerializer(notifications, many=True)
-        serialized_data = notification_serializer.data
-        return JsonResponse(serialized_data, safe=False)
+        return paginated_notifications(request, Notifications.objects.all())
  
     elif request.method == 'POST':
         notification_data = request.data
@@ -36,40 +60,74 @@ def notification_operations(request):
 @login_required
 @api_view(['GET'])
 def user_notification_list(request, pk):
-    notifications = Notifications.objects.filter(user=pk)
-    if notifications is not None:
-        try: 
-            detailed_notifications = notifications.values(
-                'notif_id',
-                'type',
-                'priority',
-                'description',
-                'title',
-                'resolved_flag', 
-                'read_flag', 
-                'created_at', 
-                'updated_at', 
-                'user',
-                material_title=F('material__material_title'),
-            )
-            detailed_notifications = detailed_notifications.order_by('-created_at')
-            if request.method == 'GET': 
-                return JsonResponse(list(detailed_notifications), safe=False)
-        except Exception as e:
-            print(e)
+    return paginated_notifications(request, Notifications.objects.filter(user=pk))
 
 @login_required
 @api_view(['GET'])
 def user_important_notification_list(request, pk):
-    user_notifications = Notifications.objects.filter(user=pk)
-    unresolved_notifications = user_notifications.filter(resolved_flag=False)
-    critical_or_high_priority_notifications = unresolved_notifications.filter(
-        Q(priority='Critical') | Q(priority='High')
-    )
-    
-    if critical_or_high_priority_notifications is not None:
-        notifications = critical_or_high_priority_notifications.order_by('-created_at')
-        
-    if request.method == 'GET': 
-        notifications_serializer = NotificationSerializer(notifications, many=True)
-        return JsonResponse(notifications_serializer.data, safe=False)
\ No newline at end of file
+    return paginated_notifications(request, get_important_notifications(pk))
+
+@login_required
+@api_view(['GET'])
+def user_notification_counts(request, pk):
+    """
+    Cheap endpoint for the notification badge: the unread and important counts of a user.
+    """
+    if request.user.pk != pk and not request.user.is_staff:
+        return JsonResponse({'message': 'Not allowed to read the notifications of another user'}, status=status.HTTP_403_FORBIDDEN)
+
+    try:
+        get_cached_user(pk)
+    except get_user_model().DoesNotExist:
+        return JsonResponse({'message': 'User not found!'}, status=status.HTTP_404_NOT_FOUND)
+    return JsonResponse(get_notification_counts(pk))
+
+@login_required
+@api_view(['POST', 'DELETE'])
+def user_notification_bulk(request, pk):
+    """
+    Endpoint changing many notifications of a user at once, each request being a single statement.
+
+    POST {"action": "read" | "resolve", "ids": [...], "before": "<iso date>"} flags the
+    selected notifications; DELETE (same optional `ids` / `before`) deletes the resolved ones.
+    Without `ids` nor `before`, every notification of the user is concerned.
+    """
+    if request.user.pk != pk and not request.user.is_staff:
+        return JsonResponse({'message': 'Not allowed to change the notifications of another user'}, status=status.HTTP_403_FORBIDDEN)
+
+    data = request.data if isinstance(request.data, dict) else {}
+    ids = data.get('ids')
+    before = data.get('before')
+    if ids is not None and (not isinstance(ids, list) or not all(isinstance(notif_id, int) for notif_id in ids)):
+        return JsonResponse({'message': '`ids` must be a list of notification ids'}, status=status.HTTP_400_BAD_REQUEST)
+    if before is not None:
+        before = parse_datetime(str(before))
+        if before is None:
+            return JsonResponse({'message': '`before` must be an ISO 8601 date'}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.method == 'POST':
+        action = data.get('action')
+        if action not in BULK_ACTIONS:
+            return JsonResponse({'message': f"`action` must be one of {', '.join(BULK_ACTIONS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        count = bulk_flag_notifications(pk, action, ids, before)
+        return JsonResponse({'updated': count, 'counts': get_notification_counts(pk)})
+
+    elif request.method == 'DELETE':
+        count = delete_resolved_notifications(pk, ids, before)
+        return JsonResponse({'deleted': count, 'counts': get_notification_counts(pk)})
+
+async def notification_stream(request):
+    """
+    Server-Sent Events stream pushing the new notifications of the logged-in user.
+    Served by the ASGI server (GazosthequeRestApis.asgi): the stream stays open until the client disconnects.
+    """
+    # login_required and DRF are not async-aware in Django 4.2
+    user_id = await sync_to_async(get_stream_user_id)(request)
+    if user_id is None:
+        return JsonResponse({'message': 'Authentication required'}, status=status.HTTP_401_UNAUTHORIZED)
+
+    response = StreamingHttpResponse(notification_events(user_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Tells nginx not to buffer the events
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -9,6 +9,8 @@ from Gazostheque.models.owner_model import Owners
 from Gazostheque.serializers import OwnerSerializer
 from rest_framework.decorators import api_view
 from Gazostheque.controllers.owner_controller import *
+from Gazostheque.controllers.version_controller import conditional_on_versions, OWNERS
+from Gazostheque.controllers.cache_controller import get_or_build, OWNER_LITE_LIST
 
 @login_required
 @api_view(['GET', 'POST', 'DELETE'])
@@ -60,7 +62,8 @@ def owner_detail(request, pk):
 
 @login_required 
 @api_view(['GET'])
+@conditional_on_versions(lambda request: [OWNERS])
 def active_owners_lite(request):
-    owners = Owners.objects.filter(is_active=True)
-    data = get_lite_owners(owners)
+    owners = Owners.objects.filter(is_active=True).select_related('user')
+    data = get_or_build(OWNER_LITE_LIST, lambda: get_lite_owners(owners))
     return JsonResponse(data, safe=False)
\ No newline at end of file
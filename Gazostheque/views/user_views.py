@@ -6,18 +6,21 @@ from django.contrib.auth.hashers import make_password, check_password
 from django.contrib.auth.decorators import login_required
 from django.conf import settings
 from django.shortcuts import redirect
-import requests
 
 from rest_framework.parsers import JSONParser 
 from rest_framework import status
 from rest_framework.decorators import api_view
-from xml.etree import ElementTree
 
 from Gazostheque.serializers import UserSerializer
 from Gazostheque.controllers.emails_controller import send_registration_email
 from Gazostheque.controllers.user_controller import *
 from Gazostheque.controllers.owner_controller import update_owner, generate_owner_record
 from Gazostheque.controllers.session_controller import *
+from Gazostheque.controllers.cas_controller import validate_ticket, provision_user
+from Gazostheque.controllers.picture_controller import schedule_profile_picture, store_original_picture, find_stored_variants, set_profile_picture
+from Gazostheque.controllers.blob_controller import get_uploaded_digest
+from Gazostheque.upload_handlers import limit_upload_size, is_upload_too_large
+from Gazostheque.controllers.notification_controller import get_notification_counts
 from Gazostheque.custom_exception import *
 
 from Gazostheque.models.user_model import CustomUsers
@@ -79,52 +82,37 @@ def user_detail(request, pk):
         return JsonResponse({'message': 'User was deleted successfully!'}, status=status.HTTP_204_NO_CONTENT)
 
 @login_required
+@limit_upload_size(settings.PROFILE_PICTURE_MAX_SIZE)
 @api_view(['POST'])
 def upload_profile_pic(request, pk):
+    """
+    Endpoint uploading a profile picture. The display and thumbnail variants are rendered
+    in the background, profil_pic is updated once they are stored (202 Accepted).
+    A picture uploaded before is found by its hash and set at once (200 OK).
+    """
     if request.method == 'POST': 
-        user =  get_user_model().objects.get(pk=pk) 
-        if user is None:
+        if not get_user_model().objects.filter(pk=pk).exists():
             return JsonResponse({'message': 'User not found!'}, status=status.HTTP_400_BAD_REQUEST) 
         
-        response_data =  None
+        # Parses the body, streaming the files to disk
+        files = request.FILES
+        if is_upload_too_large(request):
+            return JsonResponse({'message': 'Picture too large'}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        if not files:
+            return JsonResponse({'message': 'No picture uploaded'}, status=status.HTTP_400_BAD_REQUEST)
         
-        if request.FILES: 
-            
-            picture = request.FILES
-            
-            uploaded_images = []
-            folder_path = os.path.join(settings.MEDIA_ROOT, 'images/users/')
-            # Create the folder if it doesn't exist
-            if not os.path.exists(folder_path):
-                os.makedirs(folder_path)
-            # Iterate over the request.POST keys to find keys starting with 'image_image_'
-            for key, uploaded_file in picture.items():
-                # Generate a unique filename for the image
-                filename = f'user{pk}_{key}.jpg'  # You can adjust the extension as needed
-                # Construct the full file path
-                file_path = os.path.join(folder_path, filename)
-                # Check if the file already exists and delete it
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                # Save the uploaded file as an image to the specified folder
-                with open(file_path, 'wb') as destination:
-                    # Iterate over the file chunks and write them to the destination
-                    for chunk in uploaded_file.chunks():
-                        destination.write(chunk)
-                        
-                uploaded_images.append(f'images/users/{filename}')
-            
-            response_data = json.dumps(uploaded_images) if len(uploaded_images) > 0 else None
-        
-        if response_data is not None:
-            try:
-                user.profil_pic =  response_data
-                user.save()
-                return JsonResponse({'message': 'Profile picture updated successfully'}, status=status.HTTP_200_OK)
-            except Exception as e:
-                return JsonResponse({'message': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        
-        return JsonResponse({'message': 'Error occured when trying to upload pictures'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)   
+        # A single picture is kept, the first file uploaded
+        uploaded_file = next(iter(files.values()))
+        digest = get_uploaded_digest(uploaded_file)
+        paths = find_stored_variants(digest)
+        if paths is not None:
+            set_profile_picture(pk, paths)
+            return JsonResponse({'message': 'Profile picture updated'}, status=status.HTTP_200_OK)
+        try:
+            schedule_profile_picture(pk, store_original_picture(uploaded_file), digest)
+        except InvalidPictureError as e:
+            return JsonResponse({'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return JsonResponse({'message': 'Profile picture is being updated'}, status=status.HTTP_202_ACCEPTED)
         
 def cas_login(request):
     service_url = request.build_absolute_uri('/api/cas/validate/')
@@ -134,43 +122,26 @@ def cas_login(request):
 def cas_validate(request):
     ticket = request.GET.get('ticket')
     service_url = request.build_absolute_uri('/api/cas/validate/')
-    validate_url = f'{settings.CAS_SERVER_URL}/p3/serviceValidate'
-    params = {'ticket': ticket, 'service': service_url}
-    response = requests.get(validate_url, params=params)
+    attributes = validate_ticket(ticket, service_url)
     
-    if response.status_code == 200:
-        tree = ElementTree.fromstring(response.content)
-        if tree.find('.//cas:authenticationSuccess', namespaces={'cas': 'http://www.yale.edu/tp/cas'}):
-            email = tree.find('.//cas:mail', namespaces={'cas': 'http://www.yale.edu/tp/cas'}).text
-            cas_attributes = tree.findall('.//cas:attributes/*', namespaces={'cas': 'http://www.yale.edu/tp/cas'})
+    if attributes is not None:
+        user, created = provision_user(attributes)
+        user_data = get_formatted_user(user)
+        user.backend = 'Gazostheque.custom_auth.CustomAuth' # resolves the user of each request from the cache
+        login(request, user)
         
-            attributes_dict = {}
-            for attribute in cas_attributes:
-                tag_parts = attribute.tag.split('}')
-                local_tag = tag_parts[-1]
-                if local_tag in ['sn', 'givenName', 'mail']:
-                    attributes_dict[local_tag] = attribute.text
-            
-            normalized_email = email.lower()
-            user, created = get_user_model().objects.get_or_create(email=normalized_email, 
-                                                                   defaults={'first_name': attributes_dict['givenName'], 'last_name': attributes_dict['sn']})
-            user_data = get_formatted_user(user) if user is not None else {}
-            user.backend = 'django.contrib.auth.backends.ModelBackend' 
-            login(request, user)
-            
-            #storing session data
-            request.session['authenticated'] = True
-            request.session['user'] = user_data
-            request.session['new'] = created
-            
-            #sending email
-            if created:
-                user_serializer = UserSerializer(user)
-                send_registration_email(user_serializer.data)
-            
-            return redirect('/gazostheque/')
+        #storing session data
+        request.session['authenticated'] = True
+        request.session['user'] = user_data
+        request.session['new'] = created
+        
+        #sending email
+        if created:
+            user_serializer = UserSerializer(user)
+            send_registration_email(user_serializer.data)
+        
+        return redirect('/gazostheque/')
     #temporary if error authenticating
-    service_url = request.build_absolute_uri('/api/cas/validate/')
     login_url = settings.LOGIN_URL.format(service_url)
     return redirect(login_url) #need to change to back to authentication if error
 
@@ -185,12 +156,15 @@ def session_data(request):
             user =  request.session.get('user', {})
             new =  request.session.get('new', False)
             sessionKey = request.session.session_key
+            # Saves the frontend a request for the notification badge
+            notification_counts = get_notification_counts(request.user.pk) if request.user.is_authenticated else None
 
             return JsonResponse({
                 'authenticated': authenticated,
                 'user' : user,
                 'new' : new,
-                'session_key': sessionKey
+                'session_key': sessionKey,
+                'notification_counts': notification_counts,
             })
     except Exception as e:
         return JsonResponse({
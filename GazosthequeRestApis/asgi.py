@@ -2,6 +2,7 @@
 ASGI config for GazosthequeRestApis project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+It serves the notification streams (see gunicorn-gazostheque-stream.py).
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
@@ -9,8 +10,16 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'GazosthequeRestApis.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+# Ends the streams of the clients that disconnect, which Django 4.2 does not do
+from Gazostheque.asgi_handler import StreamingASGIHandler
+application = StreamingASGIHandler()
+
+# Relays the cache invalidations and new notifications published by the other workers
+from Gazostheque.controllers.invalidation_controller import start_listener
+start_listener()
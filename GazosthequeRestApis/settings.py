@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     'django_cas_ng',
     'corsheaders',
@@ -60,6 +61,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'Gazostheque.middleware.StaticFilesMiddleware',  # static / media files, before sessions and auth
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS should be early
     'django.middleware.common.CommonMiddleware',  # Common middleware should be before CSRF
@@ -74,6 +76,8 @@ MIDDLEWARE = [
 ]
 
 SESSION_COOKIE_AGE = 10800 #3600 is 1 hour in seconds, set to 3 hours for now
+# The session engine is chosen with the cache below
+# Expired rows are removed by the clear_expired_sessions command
 TIME_ZONE = 'Europe/Paris'
 USE_TZ = True
 
@@ -114,6 +118,8 @@ ROOT_URLCONF = 'GazosthequeRestApis.urls'
 # From here on Email settings:
 # Set the email backend to use
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Seconds before a blocking SMTP operation fails, so a hung server cannot stall the email workers
+EMAIL_TIMEOUT = 10
 
 # Check if DJANGO_ENV environment variable is set to 'production'
 # SMTP configuration for a remote server
@@ -169,6 +175,29 @@ DATABASES = {
     }
 }
 
+# Cache
+# Shared Redis cache when REDIS_URL is set (e.g. redis://localhost:6379/1),
+# otherwise a per-process memory cache (development and tests)
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ.get('REDIS_URL'),
+            'KEY_PREFIX': 'gazostheque',
+        }
+    }
+    # Sessions are read from the shared cache and written through to the database
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'gazostheque',
+        }
+    }
+    # A per-process cache would keep serving the sessions logged out on other workers
+    SESSION_ENGINE = 'django.contrib.sessions.backends.db'
+
 AUTH_USER_MODEL = "Gazostheque.CustomUsers"
 
 AUTHENTICATION_BACKENDS = [
@@ -213,15 +242,50 @@ USE_I18N = True
 # https://docs.djangoproject.com/en/4.2/howto/static-files/
 
 STATIC_URL = 'static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'assets/')
+# Collected static files, apart from the media files (everything below is public)
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'frontheque/.next/static'),
 ]
 
-DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    # Fingerprinted names and gzip / brotli variants, served by Gazostheque.middleware.StaticFilesMiddleware
+    'staticfiles': {
+        'BACKEND': 'Gazostheque.storage.CompressedManifestStaticFilesStorage',
+    },
+}
 MEDIA_ROOT = os.path.join(BASE_DIR, 'assets')
 MEDIA_URL = '/assets/' #locally yet
-DATA_UPLOAD_MAX_MEMORY_SIZE = 52428800
-FILE_UPLOAD_MAX_MEMORY_SIZE = 52428800
+# The only MEDIA_ROOT folders served publicly by StaticFilesMiddleware (app images, rendered avatars);
+# the other media (labels, legacy uploads) stay behind the authenticated views
+PUBLIC_MEDIA_PREFIXES = ['images/app/', 'blobs/avatars/']
+# Uploads: files are streamed to disk by HashingFileUploadHandler and refused above
+# FILE_UPLOAD_MAX_SIZE (or the limit of the endpoint); only the other fields are held in memory
+DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2621440
+FILE_UPLOAD_MAX_SIZE = 52428800
+FILE_UPLOAD_HANDLERS = ['Gazostheque.upload_handlers.HashingFileUploadHandler']
+
+TAGGIT_CASE_INSENSITIVE = True
+
+# Qrcodes: the public page encoded in each material qrcode (regenerate them with
+# `manage.py generate_qrcodes --force` after changing it) and the number of
+# rendered images kept in memory by each worker
+QRCODE_BASE_URL = 'https://liphy-gazotheque.univ-grenoble-alpes.fr/gazostheque/public/'
+QRCODE_CACHE_SIZE = 256
+
+# Reminders: how many days before a departure / arrival the owners are reminded,
+# per lab destination ('default' applies to the labs not listed)
+REMINDER_LEAD_DAYS = {
+    'default': {'departure': 3, 'arrival': 1},
+}
 
-TAGGIT_CASE_INSENSITIVE = True
\ No newline at end of file
+# Profile pictures: threads of each worker rendering the picture variants (0 renders them inline)
+# and maximum size of an uploaded picture
+PROFILE_PICTURE_WORKERS = 2
+PROFILE_PICTURE_MAX_SIZE = 10 * 1024 * 1024
+# Uploaded originals wait for their variants here, outside MEDIA_ROOT (never served), then are deleted
+PROFILE_PICTURE_UPLOAD_DIR = os.path.join(BASE_DIR, 'uploads')
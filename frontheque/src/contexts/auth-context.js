@@ -165,6 +165,7 @@ export const AuthProvider = (props) => {
         type: HANDLERS.UPDATE,
         payload: { user: data, session_key: sessionKey }
       });
+      return data;
     } catch (error) {
       console.error('Error fetching user data:', error);
       throw error;
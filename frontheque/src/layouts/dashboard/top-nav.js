@@ -1,3 +1,4 @@
+import { useEffect, useState } from 'react';
 import PropTypes from 'prop-types';
 import BellIcon from '@heroicons/react/24/solid/BellIcon';
 import Bars3Icon from '@heroicons/react/24/solid/Bars3Icon';
@@ -16,6 +17,7 @@ import { usePopover } from 'src/hooks/use-popover';
 import { AccountPopover } from './account-popover';
 // import { NotificationPopover } from './notification-popover';
 import { useAuth } from 'src/hooks/use-auth';
+import config from 'src/utils/config';
 
 const SIDE_NAV_WIDTH = 280;
 const TOP_NAV_HEIGHT = 64;
@@ -28,6 +30,22 @@ export const TopNav = (props) => {
   const user = useAuth().user;
   const image = user.profil_pic;
   const image_path = image? `${process.env.NEXT_PUBLIC_ASSETS}/${image[0]}` : '';
+  const [unreadCount, setUnreadCount] = useState(0);
+
+  useEffect(() => {
+    // Only the counters are fetched, not the notifications themselves
+    const loadCounts = () => fetch(`${config.apiUrl}/notifications/${user.user_id}/counts`)
+      .then(response => response.ok ? response.json() : null)
+      .then(counts => counts && setUnreadCount(counts.unread))
+      .catch(error => console.error('Error fetching notification counts:', error));
+    loadCounts();
+
+    // New notifications are pushed by the server, no polling needed
+    const events = new EventSource(`${config.apiUrl}/notifications/stream`, { withCredentials: true });
+    events.addEventListener('notification', () => setUnreadCount(count => count + 1));
+    events.addEventListener('resync', loadCounts);
+    return () => events.close();
+  }, [user.user_id]);
 
   return (
     <>
@@ -78,7 +96,7 @@ export const TopNav = (props) => {
             <Tooltip title="Notifications">
               <IconButton>
                 <Badge
-                  badgeContent={4}
+                  badgeContent={unreadCount}
                   color="success"
                   variant="dot"
                 >
@@ -1,6 +1,6 @@
 import React, { useCallback, useMemo, useState, useEffect } from 'react';
 import Head from 'next/head';
-import { Box, Container, Stack, SvgIcon, Typography, Grid } from '@mui/material';
+import { Box, Button, Container, Stack, SvgIcon, Typography, Grid } from '@mui/material';
 import { Layout as DashboardLayout } from 'src/layouts/dashboard/layout';
 import { NotificationItem } from 'src/sections/notification/notification-item';
 import config from '../utils/config';
@@ -8,10 +8,15 @@ import { useAuth } from 'src/hooks/use-auth';
 
 const Page = () => {
   const [notificationsList, setNotificationsList] = useState(null);
+  // Cursor of the next (older) page, null once every notification is loaded
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
   const user = useAuth().user;
 
-  useEffect(() => {
-    fetch(`${config.apiUrl}/notifications/${user.user_id}/`)
+  const loadPage = useCallback((cursor) => {
+    setLoading(true);
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+    fetch(`${config.apiUrl}/notifications/${user.user_id}/${query}`)
       .then(response => {
         if (!response.ok) {
           throw new Error('Network response was not ok');
@@ -19,13 +24,20 @@ const Page = () => {
           return response.json();
         })
           .then(data => {
-            setNotificationsList(data);
+            setNotificationsList(previous => (cursor && previous ? [...previous, ...data.results] : data.results));
+            setNextCursor(data.next_cursor);
           })
           .catch(error => {
             console.error('Error fetching data:', error);
-          }
-        );
-    }, []);
+          })
+          .finally(() => {
+            setLoading(false);
+          });
+    }, [user.user_id]);
+
+  useEffect(() => {
+    loadPage(null);
+    }, [loadPage]);
 
     return (
       <>
@@ -71,6 +83,16 @@ const Page = () => {
                         Aucune notification n'est encore disponible
                       </Typography>
                     )}
+                  {nextCursor && (
+                    <Button
+                      variant="outlined"
+                      disabled={loading}
+                      onClick={() => loadPage(nextCursor)}
+                      sx={{ alignSelf: 'center' }}
+                    >
+                      Charger plus de notifications
+                    </Button>
+                  )}
                 </Stack>
 
               </Stack>
@@ -16,6 +16,13 @@ import ArrowUpOnSquareIcon from '@heroicons/react/24/solid/ArrowUpOnSquareIcon';
 import CheckCircleIcon from '@heroicons/react/24/solid/CheckCircleIcon';
 import { width } from '@mui/system';
 
+// The variants of an uploaded picture are rendered in the background: the user is
+// reloaded until its picture changes
+const PICTURE_POLL_INTERVAL = 1000;
+const PICTURE_POLL_ATTEMPTS = 20;
+
+const wait = (delay) => new Promise((resolve) => setTimeout(resolve, delay));
+
 export const AccountProfile = (user_data) => {
   const auth = useAuth();
   const user = {
@@ -62,10 +69,24 @@ export const AccountProfile = (user_data) => {
         const errorMessage = await response.text();
         let decodeResponse = JSON.parse(errorMessage);
         toast.error(decodeResponse.message, { autoClose: false });
-      } else {
-        toast.success("Image téléchargée avec succès", { autoClose: false });
-        await auth.updateUser(user_data.user_id);
+      } else if (response.status === 200) {
+        // Picture already uploaded before: its variants were set at once
+        toast.success("Photo de profil mise à jour", { autoClose: false });
         window.location.reload();
+      } else {
+        const processing = toast.info("Image reçue, préparation de la photo de profil...", { autoClose: false });
+        for (let attempt = 0; attempt < PICTURE_POLL_ATTEMPTS; attempt++) {
+          await wait(PICTURE_POLL_INTERVAL);
+          const updatedUser = await auth.updateUser(user_data.user_id);
+          if (updatedUser.profil_pic && updatedUser.profil_pic !== user_data.profil_pic) {
+            toast.dismiss(processing);
+            toast.success("Photo de profil mise à jour", { autoClose: false });
+            window.location.reload();
+            return;
+          }
+        }
+        toast.dismiss(processing);
+        toast.warning("La photo est encore en cours de traitement, elle apparaîtra sous peu", { autoClose: false });
       }
     } catch (error) {
       toast.error(`Erreur lors du téléchargement de l'image: ${error}`, { autoClose: false });
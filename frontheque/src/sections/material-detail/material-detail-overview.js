@@ -14,11 +14,13 @@ import {
     Stack, 
 } from '@mui/material';
 import { SeverityPill } from 'src/components/severity-pill';
+import config from 'src/utils/config';
 
 
 export const MaterialDetailOverview = (props) => {
   const data = props.data
   const material_number = `Gazotheque-${data?.material_id.toString().padStart(3, '0')}`;
+  const qrcode_src = data?.qrcode_url ? new URL(data.qrcode_url, config.apiUrl).href : '';
 
   const printQRCodeAndMaterialNumber = useCallback(() => {
     const printWindow = window.open('', '_blank');
@@ -34,7 +36,7 @@ export const MaterialDetailOverview = (props) => {
             </style>
           </head>
           <body>
-            <img src="data:image/png;base64,${data.qrcode}" alt="QRCode" style="width: 250px; height: 250px; object-fit: cover;"/>
+            <img src="${qrcode_src}" alt="QRCode" style="width: 250px; height: 250px; object-fit: cover;"/>
             <h5> ${material_number} </h5>
             <p style="font-size: 10px; margin-top: -15px;">Responsable: <strong>${data.owner_details.first_name} ${data.owner_details.last_name}</strong></p>
             <p style="font-size: 10px; margin-top: -5px;"><em>N'oubliez pas de mettre à jour lors d'un</em> 
@@ -46,7 +48,7 @@ export const MaterialDetailOverview = (props) => {
       `);
       printWindow.document.close();
     }
-  }, [data, material_number]);
+  }, [data, material_number, qrcode_src]);
   
   return data ? (
     <Card>
@@ -78,7 +80,7 @@ export const MaterialDetailOverview = (props) => {
               }}
             >
               <img
-                src={`data:image/png;base64,${data.qrcode}`}
+                src={qrcode_src}
                 alt="QRCode"
                 style={{ width: '100%', height: '100%', objectFit: 'cover' }}
               />
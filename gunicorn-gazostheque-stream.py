@@ -0,0 +1,16 @@
+import multiprocessing
+
+# ASGI server of the notification streams (/api/notifications/stream), proxied apart
+# from the API: each open stream waits on the event loop instead of pinning a thread
+bind = "0.0.0.0:8006"
+wsgi_app = "GazosthequeRestApis.asgi:application"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = multiprocessing.cpu_count()
+timeout = 60
+
+#logging
+accesslog = '/home/vikhram/Gazostheque_App/logs/stream-access.log'
+errorlog = '/home/vikhram/Gazostheque_App/logs/stream-error.log'
+
+loglevel = 'info'
+capture_output = True
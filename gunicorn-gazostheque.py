@@ -1,10 +1,18 @@
 import multiprocessing
 
 bind = "0.0.0.0:8005"
+# Threaded WSGI workers for the API; the notification streams are served by
+# gunicorn-gazostheque-stream.py
+wsgi_app = "GazosthequeRestApis.wsgi:application"
 workers = multiprocessing.cpu_count() * 2 + 1
 threads = multiprocessing.cpu_count() * 2
 timeout = 60
 
+# Each worker listens to the invalidation bus to keep its in-memory caches fresh
+def post_worker_init(worker):
+    from Gazostheque.controllers.invalidation_controller import start_listener
+    start_listener()
+
 #logging
 accesslog = '/home/vikhram/Gazostheque_App/logs/access.log'
 errorlog = '/home/vikhram/Gazostheque_App/logs/error.log'